@@ -0,0 +1,13 @@
+"""Бенчмарки Admissions Agent.
+
+Запускаются из корня репозитория как модули, например:
+    python -m benchmarks.db_concurrency
+"""
+
+import sys
+from pathlib import Path
+
+# Код приложения импортирует пакеты как `app.*`, поэтому добавляем src в путь
+_SRC_DIR = str(Path(__file__).resolve().parent.parent / "src")
+if _SRC_DIR not in sys.path:
+    sys.path.insert(0, _SRC_DIR)
@@ -0,0 +1,137 @@
+"""Конкурентный бенчмарк чтения/записи SQLite для профилей движка.
+
+Имитирует API и бота как отдельные процессы: половина процессов пишет
+взаимодействия, половина читает историю кандидатов. Для каждого профиля
+создаётся свежая база; результат печатается в JSON.
+
+Запуск из корня репозитория:
+    python -m benchmarks.db_concurrency --processes 4 --tasks 8 --duration 5
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, select
+
+from app import models
+from app.config import Settings
+from app.db import create_engine_from_settings
+
+from .common import percentile
+
+
+async def _worker(role: str, url: str, profile: str, tasks: int, duration: float) -> Dict[str, Any]:
+    engine = create_engine_from_settings(Settings(DATABASE_URL=url), profile=profile)
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def write_loop():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(insert(models.Interaction).values(
+                        candidate_id=random.randint(1, 100),
+                        user_message="Сколько стоит обучение?",
+                        bot_response="Стоимость обучения — 250 000 рублей." * 10,
+                        contexts_json="[]",
+                    ))
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    async def read_loop():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                async with engine.connect() as conn:
+                    result = await conn.execute(
+                        select(models.Interaction.id, models.Interaction.user_message)
+                        .filter(models.Interaction.candidate_id == random.randint(1, 100))
+                        .order_by(models.Interaction.id.desc())
+                        .limit(20)
+                    )
+                    result.all()
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    loop_fn = write_loop if role == "write" else read_loop
+    await asyncio.gather(*(loop_fn() for _ in range(tasks)))
+    await engine.dispose()
+    return {"role": role, "latencies": latencies, "errors": errors}
+
+
+def _run_process(role: str, url: str, profile: str, tasks: int, duration: float, results) -> None:
+    results.put(asyncio.run(_worker(role, url, profile, tasks, duration)))
+
+
+async def _prepare(url: str, profile: str) -> None:
+    engine = create_engine_from_settings(Settings(DATABASE_URL=url), profile=profile)
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    await engine.dispose()
+
+
+def run_profile(profile: str, processes: int, tasks: int, duration: float) -> Dict[str, Any]:
+    """Запускает бенчмарк для одного профиля и возвращает агрегированную статистику."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = "sqlite+aiosqlite:///" + os.path.join(tmp_dir, "bench.db")
+        asyncio.run(_prepare(url, profile))
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        roles = ["write" if i % 2 == 0 else "read" for i in range(processes)]
+        procs = [
+            ctx.Process(target=_run_process, args=(role, url, profile, tasks, duration, results))
+            for role in roles
+        ]
+        for p in procs:
+            p.start()
+        outputs = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    report: Dict[str, Any] = {"profile": profile}
+    for role in ("write", "read"):
+        latencies = [lat for o in outputs if o["role"] == role for lat in o["latencies"]]
+        report[role] = {
+            "ops": len(latencies),
+            "ops_per_sec": round(len(latencies) / duration, 1),
+            "errors": sum(o["errors"] for o in outputs if o["role"] == role),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="default,sqlite", help="Профили движка через запятую")
+    parser.add_argument("--processes", type=int, default=4, help="Количество процессов (пишущие/читающие поровну)")
+    parser.add_argument("--tasks", type=int, default=8, help="Конкурентных задач на процесс")
+    parser.add_argument("--duration", type=float, default=5.0, help="Длительность прогона, с")
+    args = parser.parse_args()
+
+    reports = [
+        run_profile(profile, args.processes, args.tasks, args.duration)
+        for profile in args.profiles.split(",")
+    ]
+    print(json.dumps({"benchmark": "db_concurrency", "results": reports}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Сквозной офлайн-бенчмарк RAG-пайплайна с детерминированным Gemini.
+
+Для каждого размера синтетического корпуса измеряет:
+
+* ingest — векторизацию через ``embed_texts`` и построение индекса (чанков/с);
+* retrieval — задержку ``retrieve_context`` (p50/p95/p99) и долю запросов,
+  в выдаче которых есть исходный чанк (recall@RAG_TOP_K);
+* memory — прирост RSS процесса на построение индекса.
+
+На первом размере дополнительно прогоняется ``rag_answer_handler`` с
+заданной конкурентностью (сообщений/с и задержка ответа). Сеть не нужна:
+клиент Gemini заменён на ``fake_genai.FakeGenAIClient``. Результат —
+JSON в stdout и, при ``--output``, в файл; поле ``commit`` позволяет
+сравнивать прогоны между коммитами.
+
+Запуск из корня репозитория:
+    python -m benchmarks.e2e --sizes 1000,10000,100000 --queries 500
+    python -m benchmarks.e2e --sizes 1000000 --skip-handler --output bench.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import random
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import models
+from app.answer_cache import answer_cache
+from app.config import settings
+from app.interaction_log import InteractionWriter
+
+from src.rag import retriever
+from src.rag.genai import embed_texts
+from src.rag.snapshot import SnapshotIndex
+
+from .common import git_commit, latency_summary, peak_rss_mb, rss_mb
+from .fake_genai import FakeGenAIClient, Latency, install
+
+# Темы синтетических чанков: слова, по которым их находят вопросы
+TOPICS = {
+    "cost": "стоимость обучения оплата рассрочка скидка договор семестр рублей",
+    "documents": "документы паспорт аттестат фотографии справка копия заявление оригинал",
+    "dates": "сроки приём начало окончание июнь июль август зачисление приказ",
+    "dorm": "общежитие проживание комната заселение иногородние оплата корпус",
+    "exams": "экзамены вступительные испытания баллы минимальные ЕГЭ результаты расписание",
+    "programs": "программа бакалавриат магистратура направление специальность профиль факультет",
+    "grants": "стипендия грант бюджетные места льготы олимпиада победители призёры",
+}
+FILLER_WORDS = 4000
+CHUNK_WORDS = 60
+QUERY_WORDS = 30  # Половина слов чанка: косинус с ним около 0.7, выше порога релевантности
+
+
+def synthetic_corpus(size: int, seed: int = 0) -> Tuple[List[str], List[str], List[str]]:
+    """``size`` чанков: слова темы вперемешку со словами-наполнителями."""
+    rng = random.Random(seed)
+    topics = list(TOPICS.items())
+    ids, documents, sources = [], [], []
+    for i in range(size):
+        topic, words = topics[i % len(topics)]
+        vocabulary = words.split()
+        text = [rng.choice(vocabulary) if rng.random() < 0.3 else f"термин{rng.randrange(FILLER_WORDS)}"
+                for _ in range(CHUNK_WORDS)]
+        ids.append(f"chunk_{i}")
+        documents.append(" ".join(text))
+        sources.append(f"{topic}_{i % 50}.txt")
+    return ids, documents, sources
+
+
+def synthetic_queries(documents: List[str], count: int, seed: int = 1) -> List[Tuple[str, int]]:
+    """Вопросы из случайных слов случайного чанка и номер этого чанка."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        target = rng.randrange(len(documents))
+        words = documents[target].split()
+        queries.append((" ".join(rng.sample(words, min(QUERY_WORDS, len(words)))), target))
+    return queries
+
+
+@contextmanager
+def use_index(backend: str, index) -> Iterator[None]:
+    """Направляет ``retriever`` на переданный индекс на время блока."""
+    saved = (settings.RAG_INDEX_BACKEND, retriever.snapshot_index, retriever.collection)
+    settings.RAG_INDEX_BACKEND = backend
+    if backend == "snapshot":
+        retriever.snapshot_index = index
+    else:
+        retriever.collection = index
+    try:
+        yield
+    finally:
+        settings.RAG_INDEX_BACKEND, retriever.snapshot_index, retriever.collection = saved
+
+
+def build_index(backend: str, ids: List[str], documents: List[str], sources: List[str]):
+    """Векторизует корпус через ``embed_texts`` и строит индекс; возвращает индекс и статистику."""
+    rss_before = rss_mb()
+    batch = settings.RAG_EMBED_BATCH_SIZE
+
+    started = time.perf_counter()
+    embeddings: List[List[float]] = []
+    for i in range(0, len(documents), batch):
+        embeddings.extend(embed_texts(documents[i:i + batch]))
+    embed_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if backend == "snapshot":
+        index = SnapshotIndex(np.asarray(embeddings, dtype=np.float32), ids, documents, sources, version="bench")
+    else:
+        import chromadb
+
+        index = chromadb.EphemeralClient().create_collection(f"bench_{len(ids)}_{time.time_ns()}")
+        step = 5000  # Ограничение ChromaDB на размер одной вставки
+        for i in range(0, len(ids), step):
+            index.add(
+                ids=ids[i:i + step], embeddings=embeddings[i:i + step], documents=documents[i:i + step],
+                metadatas=[{"source": s} for s in sources[i:i + step]],
+            )
+        index.modify(metadata={"index_version": "bench"})
+    index_seconds = time.perf_counter() - started
+    del embeddings
+    gc.collect()
+
+    total = embed_seconds + index_seconds
+    return index, {
+        "chunks": len(ids),
+        "embed_seconds": round(embed_seconds, 3),
+        "index_seconds": round(index_seconds, 3),
+        "chunks_per_sec": round(len(ids) / total, 1) if total else None,
+        "rss_delta_mb": round(rss_mb() - rss_before, 1),
+    }
+
+
+def bench_retrieval(queries: List[Tuple[str, int]]) -> Dict[str, Any]:
+    latencies, hits = [], 0
+    for query, target in queries:
+        started = time.perf_counter()
+        contexts = retriever.retrieve_context(query)
+        latencies.append(time.perf_counter() - started)
+        hits += any(c.chunk_id == f"chunk_{target}" for c in contexts)
+    return {
+        **latency_summary(latencies),
+        f"recall_at_{settings.RAG_TOP_K}": round(hits / len(queries), 3) if queries else None,
+    }
+
+
+class BenchMessage:
+    """Минимальный ``Message`` для прямого вызова обработчика."""
+
+    def __init__(self, text: str, user_id: int):
+        self.text = text
+        self.from_user = SimpleNamespace(id=user_id, full_name=f"Абитуриент {user_id}")
+        self.replies: List[str] = []
+
+    async def answer(self, text: str, **kwargs) -> "BenchMessage":
+        self.replies.append(text)
+        return BenchMessage(text, 0)
+
+    async def delete(self) -> None:
+        pass
+
+
+@asynccontextmanager
+async def temporary_interaction_writer() -> AsyncIterator[InteractionWriter]:
+    """Подменяет ``handlers.interaction_writer`` записью во временную БД.
+
+    Общий кэш ответов на это время тоже пишет во временную БД.
+    """
+    from src.bot import handlers
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_dir}/bench.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        writer = InteractionWriter(session_factory=session_factory, spill_path=f"{tmp_dir}/spill.jsonl")
+        saved_writer, handlers.interaction_writer = handlers.interaction_writer, writer
+        saved_cache_storage, answer_cache.session_factory = answer_cache.session_factory, session_factory
+        answer_cache.clear()
+        await writer.start()
+        try:
+            yield writer
+        finally:
+            await writer.stop()
+            await answer_cache.flush()
+            handlers.interaction_writer = saved_writer
+            answer_cache.session_factory = saved_cache_storage
+            answer_cache.clear()
+            await engine.dispose()
+
+
+async def bench_handler(queries: List[Tuple[str, int]], concurrency: int) -> Dict[str, Any]:
+    """Прогоняет ``rag_answer_handler`` с записью взаимодействий во временную БД."""
+    from src.bot import handlers
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int, query: str) -> None:
+        nonlocal errors
+        message = BenchMessage(query, user_id=100_000 + i)
+        async with semaphore:
+            started = time.perf_counter()
+            await handlers.rag_answer_handler(message)
+            latencies.append(time.perf_counter() - started)
+        errors += not message.replies or message.replies[-1].startswith("Извините")
+
+    async with temporary_interaction_writer():
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i, q) for i, (q, _) in enumerate(queries)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "messages": len(queries),
+        "concurrency": concurrency,
+        "messages_per_sec": round(len(queries) / elapsed, 1) if elapsed else None,
+        "errors": errors,
+        **latency_summary(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="Размеры корпусов через запятую (до 1000000)")
+    parser.add_argument("--backend", choices=("snapshot", "chroma"), default="snapshot", help="Индекс для поиска")
+    parser.add_argument("--queries", type=int, default=200, help="Вопросов на замер поиска")
+    parser.add_argument("--dim", type=int, default=256, help="Размерность фальшивых эмбеддингов")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Медиана задержки эмбеддингов")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Медиана задержки генерации")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="Разброс задержек (логнормальный)")
+    parser.add_argument("--handler-messages", type=int, default=200, help="Сообщений в замере обработчика")
+    parser.add_argument("--concurrency", type=int, default=32, help="Одновременных сообщений в замере обработчика")
+    parser.add_argument("--skip-handler", action="store_true", help="Не замерять обработчик бота")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Дополнительно записать JSON в файл")
+    args = parser.parse_args()
+
+    # Логи на каждый запрос искажают замеры
+    logging.disable(logging.INFO)
+    client = FakeGenAIClient(
+        dim=args.dim,
+        embed_latency=Latency(args.embed_latency_ms, args.latency_sigma, seed=args.seed),
+        llm_latency=Latency(args.llm_latency_ms, args.latency_sigma, seed=args.seed + 1),
+    )
+
+    results, handler = [], None
+    with install(client):
+        for n, size in enumerate(int(s) for s in args.sizes.split(",")):
+            ids, documents, sources = synthetic_corpus(size, seed=args.seed)
+            index, ingest = build_index(args.backend, ids, documents, sources)
+            queries = synthetic_queries(documents, args.queries, seed=args.seed + 1)
+            with use_index(args.backend, index):
+                retrieval = bench_retrieval(queries)
+                if n == 0 and not args.skip_handler:
+                    handler_queries = synthetic_queries(documents, args.handler_messages, seed=args.seed + 2)
+                    handler = asyncio.run(bench_handler(handler_queries, args.concurrency))
+            results.append({
+                "size": size,
+                "ingest": ingest,
+                "retrieval": retrieval,
+                "memory": {"rss_mb": rss_mb(), "peak_rss_mb": peak_rss_mb()},
+            })
+            del index, ids, documents, sources
+            gc.collect()
+
+    report = {
+        "benchmark": "e2e",
+        "commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+        "handler": handler,
+        "gemini_calls": client.calls,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
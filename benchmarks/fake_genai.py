@@ -0,0 +1,172 @@
+"""Детерминированная замена клиента Gemini для бенчмарков.
+
+``FakeGenAIClient`` повторяет ту часть интерфейса ``google.genai.Client``,
+которой пользуется ``src.rag.genai``: ``models.embed_content``,
+``models.generate_content`` и ``aio.models.generate_content_stream``.
+
+* Эмбеддинги — хэширование слов в ``dim`` координат со знаком: тексты с
+  общими словами близки, одинаковые тексты дают одинаковые векторы.
+* Задержки задаются медианой и разбросом логнормального распределения,
+  генератор случайных чисел инициализирован ``seed``.
+
+Подключение::
+
+    with install(FakeGenAIClient(llm_latency=Latency(800, 0.4))):
+        ...
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Iterator, List, Tuple, Union
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class Latency:
+    """Логнормальная задержка: ``median_ms`` и разброс ``sigma`` (0 — постоянная)."""
+
+    def __init__(self, median_ms: float = 0.0, sigma: float = 0.0, seed: int = 0):
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        if not self.sigma:
+            return self.median
+        with self._lock:
+            return self.median * math.exp(self.sigma * self._random.gauss(0.0, 1.0))
+
+
+@lru_cache(maxsize=1 << 18)
+def _word_slot(word: str, dim: int) -> Tuple[int, float]:
+    digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, 1.0 if digest >> 63 else -1.0
+
+
+def hash_embedding(text: str, dim: int = 256) -> List[float]:
+    """Нормированный вектор «мешка слов» с хэшированием признаков."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        index, sign = _word_slot(word, dim)
+        vector[index] += sign
+    norm = float(np.linalg.norm(vector))
+    if norm == 0.0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+
+def fake_answer(prompt: str, words: int = 80) -> str:
+    """Текст ответа, зависящий только от текста промпта."""
+    seed = hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).hexdigest()
+    return f"Ответ {seed}: " + " ".join(f"слово{i}" for i in range(words))
+
+
+def _prompt_text(contents: Union[str, list]) -> str:
+    return contents if isinstance(contents, str) else " ".join(map(str, contents))
+
+
+class FakeModels:
+    def __init__(self, client: "FakeGenAIClient"):
+        self._client = client
+
+    def embed_content(self, model: str, contents, config=None):
+        texts = [contents] if isinstance(contents, str) else list(contents)
+        self._client.count("embed_content")
+        time.sleep(self._client.embed_latency.sample())
+        return SimpleNamespace(
+            embeddings=[SimpleNamespace(values=hash_embedding(t, self._client.dim)) for t in texts]
+        )
+
+    def generate_content(self, model: str, contents, config=None):
+        self._client.count("generate_content")
+        time.sleep(self._client.llm_latency.sample())
+        return self._client.response(_prompt_text(contents))
+
+
+class FakeAsyncModels:
+    def __init__(self, client: "FakeGenAIClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents, config=None):
+        self._client.count("generate_content")
+        await asyncio.sleep(self._client.llm_latency.sample())
+        return self._client.response(_prompt_text(contents))
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        """Первая часть — через ``llm_latency``, остальные — через ``chunk_latency``."""
+        self._client.count("generate_content_stream")
+        response = self._client.response(_prompt_text(contents))
+        words = response.text.split(" ")
+        client = self._client
+
+        async def stream():
+            await asyncio.sleep(client.llm_latency.sample())
+            for i in range(0, len(words), client.words_per_chunk):
+                if i:
+                    await asyncio.sleep(client.chunk_latency.sample())
+                last = i + client.words_per_chunk >= len(words)
+                yield SimpleNamespace(
+                    text=" ".join(words[i:i + client.words_per_chunk]) + ("" if last else " "),
+                    usage_metadata=response.usage_metadata if last else None,
+                )
+
+        return stream()
+
+
+class FakeGenAIClient:
+    def __init__(
+        self,
+        dim: int = 256,
+        embed_latency: Latency = None,
+        llm_latency: Latency = None,
+        chunk_latency: Latency = None,
+        answer_words: int = 80,
+        words_per_chunk: int = 8,
+    ):
+        self.dim = dim
+        self.embed_latency = embed_latency or Latency()
+        self.llm_latency = llm_latency or Latency()
+        self.chunk_latency = chunk_latency or Latency()
+        self.answer_words = answer_words
+        self.words_per_chunk = words_per_chunk
+        self.calls = {"embed_content": 0, "generate_content": 0, "generate_content_stream": 0}
+        self._lock = threading.Lock()
+        self.models = FakeModels(self)
+        self.aio = SimpleNamespace(models=FakeAsyncModels(self))
+
+    def count(self, method: str) -> None:
+        with self._lock:
+            self.calls[method] += 1
+
+    def response(self, prompt: str):
+        """Ответ, зависящий только от текста промпта."""
+        text = fake_answer(prompt, self.answer_words)
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+@contextmanager
+def install(client: FakeGenAIClient) -> Iterator[FakeGenAIClient]:
+    """Подменяет клиент в ``src.rag.genai`` на время блока."""
+    from src.rag import genai
+
+    previous = genai.client
+    genai.client = client
+    try:
+        yield client
+    finally:
+        genai.client = previous
@@ -0,0 +1,287 @@
+"""Локальная замена Gemini API с настраиваемыми задержками и сбоями.
+
+Реализует часть REST API Gemini (v1beta), которой пользуется
+``src.rag.genai`` через ``google.genai.Client``:
+
+* ``POST /v1beta/models/{model}:generateContent``;
+* ``POST /v1beta/models/{model}:streamGenerateContent?alt=sse``;
+* ``POST /v1beta/models/{model}:batchEmbedContents`` и ``:embedContent``.
+
+В отличие от ``fake_genai.FakeGenAIClient``, запросы проходят через
+настоящий SDK и HTTP, поэтому проверяются таймауты, ответы 429/5xx,
+медленные и оборванные потоки. Сценарий (``Scenario``) задаёт:
+
+* логнормальные задержки эмбеддингов, первой части ответа и следующих частей;
+* долю ответов с ошибкой (``error_rate``, статус ``error_status``);
+* долю «зависших» запросов (``hang_rate``: ответ через ``hang_seconds``);
+* долю потоков, обрывающихся после первой части (``stream_break_rate``);
+* ограничение частоты на модель (``rpm``/``burst``): сверх него — 429 с
+  ``Retry-After``, как у квоты Gemini.
+
+Сценарий меняется на лету: ``POST /_control`` с JSON полей ``Scenario``;
+счётчики запросов — ``GET /_stats``. Тексты ответов и эмбеддинги
+детерминированы (те же, что у ``FakeGenAIClient``).
+
+Запуск из корня репозитория::
+
+    python -m benchmarks.gemini_server --port 8765 --llm-latency-ms 800 --error-rate 0.05 --rpm 60
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=local python -m src.bot.runner
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from aiohttp import web
+
+from .fake_genai import Latency, fake_answer, hash_embedding
+
+logger = logging.getLogger(__name__)
+
+# HTTP-статус -> статус ошибки Google API
+ERROR_STATUSES = {
+    400: "INVALID_ARGUMENT",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+
+@dataclass
+class Scenario:
+    embed_latency_ms: float = 0.0
+    llm_latency_ms: float = 0.0  # До первой части ответа (для потока) или до всего ответа
+    chunk_latency_ms: float = 0.0  # Между частями потока
+    latency_sigma: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    hang_rate: float = 0.0
+    hang_seconds: float = 60.0
+    stream_break_rate: float = 0.0
+    rpm: float = 0.0  # Запросов в минуту на модель (0 — без ограничения)
+    burst: int = 10
+    dim: int = 256
+    answer_words: int = 80
+    words_per_chunk: int = 8
+    seed: int = 0
+
+    def update(self, **changes: Any) -> None:
+        names = {f.name for f in fields(self)}
+        unknown = set(changes) - names
+        if unknown:
+            raise ValueError(f"Неизвестные поля сценария: {', '.join(sorted(unknown))}")
+        for name, value in changes.items():
+            setattr(self, name, type(getattr(self, name))(value))
+
+
+class GeminiStandIn:
+    """aiohttp-приложение, отвечающее как Gemini API по сценарию ``scenario``."""
+
+    def __init__(self, scenario: Optional[Scenario] = None):
+        self.scenario = scenario or Scenario()
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.base_url: Optional[str] = None
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._reset()
+
+        self.app = web.Application()
+        self.app.router.add_post("/{version}/models/{target}", self.handle)
+        self.app.router.add_post("/_control", self.control)
+        self.app.router.add_get("/_stats", self.stats_view)
+
+    def configure(self, **changes: Any) -> None:
+        """Меняет поля сценария; задержки и лимиты частоты начинаются заново."""
+        self.scenario.update(**changes)
+        self._reset()
+
+    def _reset(self) -> None:
+        s = self.scenario
+        self._random = random.Random(s.seed)
+        self.embed_latency = Latency(s.embed_latency_ms, s.latency_sigma, seed=s.seed)
+        self.llm_latency = Latency(s.llm_latency_ms, s.latency_sigma, seed=s.seed + 1)
+        self.chunk_latency = Latency(s.chunk_latency_ms, s.latency_sigma, seed=s.seed + 2)
+        self._buckets.clear()
+
+    # --- Управление ---
+
+    async def control(self, request: web.Request) -> web.Response:
+        try:
+            self.configure(**await request.json())
+        except (ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        logger.info(f"Сценарий изменён: {self.scenario}")
+        return web.json_response(asdict(self.scenario))
+
+    async def stats_view(self, request: web.Request) -> web.Response:
+        return web.json_response({"scenario": asdict(self.scenario), "stats": self.stats})
+
+    # --- Gemini API ---
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        model, _, method = request.match_info["target"].partition(":")
+        handlers = {
+            "generateContent": self.generate_content,
+            "streamGenerateContent": self.stream_generate_content,
+            "batchEmbedContents": self.batch_embed_contents,
+            "embedContent": self.embed_content,
+        }
+        if method not in handlers:
+            return self._error(404, f"Метод {method!r} не поддерживается заглушкой")
+        stats = self.stats[method]
+        stats["requests"] += 1
+
+        if not self._take_token(model):
+            stats["throttled"] += 1
+            retry_after = max(1, round(60 / self.scenario.rpm))
+            return self._error(429, "Resource has been exhausted (e.g. check quota).",
+                               headers={"Retry-After": str(retry_after)})
+        if self._random.random() < self.scenario.hang_rate:
+            stats["hung"] += 1
+            await asyncio.sleep(self.scenario.hang_seconds)
+        if self._random.random() < self.scenario.error_rate:
+            stats["errors"] += 1
+            return self._error(self.scenario.error_status, "The service is currently unavailable.")
+
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return self._error(400, "Тело запроса — не JSON")
+        response = await handlers[method](request, model, body)
+        stats["broken" if request.get("broken") else "ok"] += 1
+        return response
+
+    def _take_token(self, model: str) -> bool:
+        """Token bucket на модель: ``burst`` запросов подряд, ``rpm`` в среднем."""
+        rpm = self.scenario.rpm
+        if rpm <= 0:
+            return True
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(model, (float(self.scenario.burst), now))
+        tokens = min(float(self.scenario.burst), tokens + (now - updated) * rpm / 60)
+        if tokens < 1.0:
+            self._buckets[model] = (tokens, now)
+            return False
+        self._buckets[model] = (tokens - 1.0, now)
+        return True
+
+    def _error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None) -> web.Response:
+        error = {"code": status, "message": message, "status": ERROR_STATUSES.get(status, "UNKNOWN")}
+        return web.json_response({"error": error}, status=status, headers=headers)
+
+    def _answer(self, model: str, body: Dict[str, Any]) -> Tuple[str, Dict[str, int]]:
+        prompt = " ".join(_texts(body.get("contents", [])))
+        text = fake_answer(prompt, self.scenario.answer_words)
+        usage = {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4}
+        usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+        return text, usage
+
+    async def generate_content(self, request: web.Request, model: str, body: Dict[str, Any]) -> web.Response:
+        text, usage = self._answer(model, body)
+        await asyncio.sleep(self.llm_latency.sample())
+        return web.json_response(_candidate(text, model, usage, finished=True))
+
+    async def stream_generate_content(self, request: web.Request, model: str, body: Dict[str, Any]) -> web.StreamResponse:
+        text, usage = self._answer(model, body)
+        words = text.split(" ")
+        step = max(1, self.scenario.words_per_chunk)
+        broken = self._random.random() < self.scenario.stream_break_rate
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await asyncio.sleep(self.llm_latency.sample())
+        for i in range(0, len(words), step):
+            if i:
+                await asyncio.sleep(self.chunk_latency.sample())
+                if broken:
+                    # Обрыв соединения посреди ответа, как при сетевом сбое
+                    request["broken"] = True
+                    request.transport.close()
+                    return response
+            last = i + step >= len(words)
+            part = " ".join(words[i:i + step]) + ("" if last else " ")
+            chunk = _candidate(part, model, usage if last else None, finished=last)
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async def batch_embed_contents(self, request: web.Request, model: str, body: Dict[str, Any]) -> web.Response:
+        texts = [" ".join(_texts([r.get("content", {})])) for r in body.get("requests", [])]
+        await asyncio.sleep(self.embed_latency.sample())
+        return web.json_response({"embeddings": [{"values": hash_embedding(t, self.scenario.dim)} for t in texts]})
+
+    async def embed_content(self, request: web.Request, model: str, body: Dict[str, Any]) -> web.Response:
+        text = " ".join(_texts([body.get("content", {})]))
+        await asyncio.sleep(self.embed_latency.sample())
+        return web.json_response({"embedding": {"values": hash_embedding(text, self.scenario.dim)}})
+
+
+def _texts(contents: List[Dict[str, Any]]) -> List[str]:
+    return [part["text"] for content in contents for part in content.get("parts", []) if "text" in part]
+
+
+def _candidate(text: str, model: str, usage: Optional[Dict[str, int]], finished: bool) -> Dict[str, Any]:
+    candidate: Dict[str, Any] = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    result: Dict[str, Any] = {"candidates": [candidate], "modelVersion": model}
+    if usage is not None:
+        result["usageMetadata"] = usage
+    return result
+
+
+@contextmanager
+def serve_in_thread(scenario: Optional[Scenario] = None, host: str = "127.0.0.1", port: int = 0) -> Iterator[GeminiStandIn]:
+    """Запускает заглушку в отдельном потоке со своим event loop (для синхронного кода и тестов).
+
+    Адрес сервера — ``server.base_url`` (порт 0 — любой свободный).
+    """
+    server = GeminiStandIn(scenario)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(server.app, access_log=None)
+
+    async def start() -> None:
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        server.base_url = f"http://{host}:{bound_port}"
+
+    thread = threading.Thread(target=loop.run_forever, name="gemini-stand-in", daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(start(), loop).result()
+    try:
+        yield server
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    for field in fields(Scenario):
+        flag = "--" + field.name.replace("_", "-")
+        parser.add_argument(flag, type=field.type if field.type in (int, float) else float, default=field.default)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    scenario = Scenario(**{f.name: getattr(args, f.name) for f in fields(Scenario)})
+    server = GeminiStandIn(scenario)
+    print(f"GEMINI_BASE_URL=http://{args.host}:{args.port}", flush=True)
+    web.run_app(server.app, host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
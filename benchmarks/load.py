@@ -0,0 +1,352 @@
+"""Нагрузочный тест бота: тысячи одновременных пользователей Telegram.
+
+Синтетические ``Update`` подаются в настоящий ``Dispatcher`` с роутером
+``src.bot.handlers`` — проходят все фильтры, middleware (трасса, метрики,
+admission control) и обработчики. Сеть не нужна:
+
+* Bot API заменён на ``FakeTelegramSession`` — сессию aiogram, которая
+  после задержки отвечает синтетическими ``Message``/``True``;
+* Gemini заменён на ``fake_genai.FakeGenAIClient`` с логнормальными
+  задержками эмбеддингов и генерации;
+* поиск идёт по снимку индекса синтетического корпуса, взаимодействия
+  пишутся во временную БД.
+
+Каждый виртуальный пользователь отправляет ``--messages-per-user``
+сообщений с паузой «на размышление». Для каждого уровня конкурентности
+(числа пользователей) отчёт содержит:
+
+* first_response — время до первого сообщения бота («Ищу информацию...»);
+* reply — время полной обработки обновления (до финального ответа);
+* outcomes — ответы, отказы admission control (shed) и ошибки;
+* loop_lag — задержки event loop, измеренные фоновым таймером.
+
+Запуск из корня репозитория:
+    python -m benchmarks.load --levels 10,100,1000,3000
+    python -m benchmarks.load --levels 1000 --rag-max-concurrency 64 --executor-workers 64
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, GetMe, SendMessage, TelegramMethod
+from aiogram.types import Chat, Message, Update, User
+
+from app.catalog import CatalogSnapshot
+from app.config import settings
+
+from src.bot.admission import OVERLOADED_TEXT, RATE_LIMITED_TEXT, rag_admission
+from src.bot.handlers import router
+from src.bot.menu_cache import menu_cache
+
+from .common import git_commit, latency_summary, peak_rss_mb
+from .e2e import build_index, synthetic_corpus, synthetic_queries, temporary_interaction_writer, use_index
+from .fake_genai import FakeGenAIClient, Latency, install
+
+BOT_TOKEN = "42:LOAD-TEST"
+ERROR_PREFIX = "Извините"
+RATE_LIMITED_PREFIX = RATE_LIMITED_TEXT.split("{")[0]
+# Сообщения, которые не идут в RAG: команды и экраны меню
+MENU_MESSAGES = ("/start", "/menu", "/help", "контакты")
+
+
+class FakeTelegramSession(BaseSession):
+    """Сессия Bot API без сети: после задержки ``latency`` отвечает синтетическими объектами.
+
+    Ответ проходит через ``check_response``, как у настоящей сессии, поэтому
+    возвращённые ``Message`` привязаны к боту (работают ``answer``/``delete``).
+    ``on_request`` вызывается для каждого метода — так тест видит ответы бота.
+    """
+
+    def __init__(self, latency: Optional[Latency] = None, on_request=None):
+        super().__init__()
+        self.latency = latency or Latency()
+        self.on_request = on_request
+        self.calls: Dict[str, int] = defaultdict(int)
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None):
+        await asyncio.sleep(self.latency.sample())
+        self.calls[type(method).__name__] += 1
+        if self.on_request is not None:
+            self.on_request(method)
+        content = json.dumps({"ok": True, "result": self._result(bot, method)}, ensure_ascii=False)
+        return self.check_response(bot, method, 200, content).result
+
+    def _result(self, bot: Bot, method: TelegramMethod) -> Any:
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": method.chat_id, "type": "private"},
+                "from": {"id": bot.id, "is_bot": True, "first_name": "Admissions"},
+                "text": method.text,
+            }
+        if isinstance(method, GetMe):
+            return {"id": bot.id, "is_bot": True, "first_name": "Admissions"}
+        return True
+
+    async def stream_content(self, *args, **kwargs):
+        raise NotImplementedError("Нагрузочный тест не скачивает файлы")
+
+    async def close(self) -> None:
+        pass
+
+
+class LoopLagMonitor:
+    """Фоновый таймер: насколько позже заказанного просыпается ``asyncio.sleep``."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self) -> None:
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class ReplyTracker:
+    """Сопоставляет отправленные ботом сообщения с обрабатываемым обновлением чата."""
+
+    def __init__(self):
+        self._pending: Dict[int, Dict[str, Any]] = {}
+
+    def begin(self, chat_id: int) -> Dict[str, Any]:
+        state = {"started": time.perf_counter(), "first": None, "texts": []}
+        self._pending[chat_id] = state
+        return state
+
+    def end(self, chat_id: int) -> None:
+        self._pending.pop(chat_id, None)
+
+    def __call__(self, method: TelegramMethod) -> None:
+        if not isinstance(method, SendMessage):
+            return
+        state = self._pending.get(method.chat_id)
+        if state is None:
+            return
+        if state["first"] is None:
+            state["first"] = time.perf_counter() - state["started"]
+        state["texts"].append(method.text)
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    user = User(id=user_id, is_bot=False, first_name=f"Абитуриент{user_id}")
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=int(time.time()),
+            chat=Chat(id=user_id, type="private"),
+            from_user=user,
+            text=text,
+        ),
+    )
+
+
+def classify(texts: List[str]) -> str:
+    """Исход обработки по сообщениям бота: ok, shed или error."""
+    if any(t.startswith(ERROR_PREFIX) for t in texts):
+        return "error"
+    if any(t == OVERLOADED_TEXT or t.startswith(RATE_LIMITED_PREFIX) for t in texts):
+        return "shed"
+    return "ok" if texts else "error"
+
+
+async def run_level(
+    dp: Dispatcher,
+    bot: Bot,
+    tracker: ReplyTracker,
+    users: int,
+    questions: List[str],
+    messages_per_user: int = 3,
+    think_seconds: float = 1.0,
+    ramp_seconds: float = 1.0,
+    rag_share: float = 0.8,
+    user_base: int = 1_000_000,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Один уровень нагрузки: ``users`` пользователей одновременно."""
+    rng = random.Random(seed)
+    update_ids = itertools.count(user_base)
+    first_response: List[float] = []
+    reply: List[float] = []
+    outcomes = {"ok": 0, "shed": 0, "error": 0}
+    exceptions: Dict[str, int] = defaultdict(int)
+    admission_before = rag_admission.stats()
+
+    async def virtual_user(user_id: int) -> None:
+        await asyncio.sleep(rng.uniform(0, ramp_seconds))
+        for _ in range(messages_per_user):
+            text = rng.choice(questions) if rng.random() < rag_share else rng.choice(MENU_MESSAGES)
+            update = make_update(next(update_ids), user_id, text)
+            state = tracker.begin(user_id)
+            try:
+                await dp.feed_update(bot, update)
+                outcome = classify(state["texts"])
+            except Exception as e:
+                exceptions[type(e).__name__] += 1
+                outcome = "error"
+            finally:
+                tracker.end(user_id)
+            reply.append(time.perf_counter() - state["started"])
+            if state["first"] is not None:
+                first_response.append(state["first"])
+            outcomes[outcome] += 1
+            await asyncio.sleep(rng.uniform(think_seconds / 2, think_seconds * 1.5))
+
+    lag = LoopLagMonitor()
+    lag.start()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(virtual_user(user_base + i) for i in range(users)))
+    finally:
+        elapsed = time.perf_counter() - started
+        await lag.stop()
+
+    messages = sum(outcomes.values())
+    admission = rag_admission.stats()
+    return {
+        "users": users,
+        "messages": messages,
+        "duration_s": round(elapsed, 3),
+        "messages_per_sec": round(messages / elapsed, 1) if elapsed else None,
+        "first_response": latency_summary(first_response),
+        "reply": latency_summary(reply),
+        "outcomes": outcomes,
+        "error_rate": round(outcomes["error"] / messages, 4) if messages else 0.0,
+        "shed_rate": round(outcomes["shed"] / messages, 4) if messages else 0.0,
+        "exceptions": dict(exceptions),
+        "admission": {
+            key: admission[key] - admission_before[key]
+            for key in ("admitted", "shed_rate", "shed_overload")
+        },
+        "loop_lag": latency_summary(lag.samples),
+    }
+
+
+def create_load_dispatcher() -> Dispatcher:
+    """Диспетчер с роутером бота; без хуков запуска, которым нужны БД и Gemini."""
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+async def run_load(args: argparse.Namespace, questions: List[str]) -> List[Dict[str, Any]]:
+    if args.executor_workers:
+        # Обработчики держат поток на всё время вызова Gemini: пул ограничивает конкурентность
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.executor_workers))
+
+    # Экраны меню и факты строятся из пустого снимка справочников, без БД
+    menu_cache.set_snapshot(CatalogSnapshot(version=1))
+    tracker = ReplyTracker()
+    session = FakeTelegramSession(Latency(args.telegram_latency_ms, args.latency_sigma, seed=args.seed + 3), tracker)
+    bot = Bot(token=BOT_TOKEN, session=session)
+    dp = create_load_dispatcher()
+
+    results = []
+    async with temporary_interaction_writer():
+        for n, users in enumerate(int(s) for s in args.levels.split(",")):
+            results.append(await run_level(
+                dp, bot, tracker, users, questions,
+                messages_per_user=args.messages_per_user,
+                think_seconds=args.think_seconds,
+                ramp_seconds=args.ramp_seconds,
+                rag_share=args.rag_share,
+                # Новые пользователи на каждом уровне: лимиты частоты не переходят между уровнями
+                user_base=(n + 1) * 10_000_000,
+                seed=args.seed + n,
+            ))
+    results[-1]["telegram_calls"] = dict(session.calls)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="10,100,1000", help="Числа одновременных пользователей через запятую")
+    parser.add_argument("--messages-per-user", type=int, default=3, help="Сообщений от каждого пользователя")
+    parser.add_argument("--think-seconds", type=float, default=1.0, help="Средняя пауза между сообщениями")
+    parser.add_argument("--ramp-seconds", type=float, default=1.0, help="Пользователи подключаются равномерно за это время")
+    parser.add_argument("--rag-share", type=float, default=0.8, help="Доля вопросов в свободной форме (остальное — меню)")
+    parser.add_argument("--corpus", type=int, default=5000, help="Чанков в синтетическом индексе")
+    parser.add_argument("--dim", type=int, default=256, help="Размерность фальшивых эмбеддингов")
+    parser.add_argument("--embed-latency-ms", type=float, default=120.0, help="Медиана задержки эмбеддингов")
+    parser.add_argument("--llm-latency-ms", type=float, default=1500.0, help="Медиана задержки генерации")
+    parser.add_argument("--telegram-latency-ms", type=float, default=40.0, help="Медиана задержки Bot API")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Разброс задержек (логнормальный)")
+    parser.add_argument("--rag-max-concurrency", type=int, help="Переопределить RAG_MAX_CONCURRENCY")
+    parser.add_argument("--rag-max-queue", type=int, help="Переопределить RAG_MAX_QUEUE")
+    parser.add_argument("--executor-workers", type=int, help="Размер пула потоков event loop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Дополнительно записать JSON в файл")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    if args.rag_max_concurrency:
+        rag_admission.max_concurrency = args.rag_max_concurrency
+    if args.rag_max_queue is not None:
+        rag_admission.max_queue = args.rag_max_queue
+
+    client = FakeGenAIClient(
+        dim=args.dim,
+        embed_latency=Latency(args.embed_latency_ms, args.latency_sigma, seed=args.seed),
+        llm_latency=Latency(args.llm_latency_ms, args.latency_sigma, seed=args.seed + 1),
+    )
+    with install(client):
+        ids, documents, sources = synthetic_corpus(args.corpus, seed=args.seed)
+        # Индекс строится без задержек: замеряется только обработка сообщений
+        embed_latency, client.embed_latency = client.embed_latency, Latency()
+        index, _ = build_index("snapshot", ids, documents, sources)
+        client.embed_latency = embed_latency
+        questions = [q for q, _ in synthetic_queries(documents, 1000, seed=args.seed + 2)]
+        with use_index("snapshot", index):
+            results = asyncio.run(run_load(args, questions))
+
+    report = {
+        "benchmark": "load",
+        "commit": git_commit(),
+        "config": {
+            **{k: v for k, v in vars(args).items() if k != "output"},
+            "rag_max_concurrency": rag_admission.max_concurrency,
+            "rag_max_queue": rag_admission.max_queue,
+            "rag_user_burst": settings.RAG_USER_BURST,
+        },
+        "results": results,
+        "gemini_calls": client.calls,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Кэш готовых ответов RAG.
+
+Ответы на вопросы без истории диалога не зависят от пользователя, поэтому
+их можно переиспользовать. Кэш ограничен ``ANSWER_CACHE_SIZE`` записями
+(вытесняются давно использованные) и ``ANSWER_CACHE_TTL_SECONDS``; ключ —
+нормализованный текст вопроса. Вопросы дополнительно проиндексированы
+триграммами для поиска по похожим вопросам (inline-режим бота). При
+изменении справочников кэш сбрасывается.
+
+Память процесса — только первый уровень. ``lookup`` при промахе читает
+таблицу ``answer_cache`` в общей базе, поэтому ответ, сгенерированный для
+``/ask``, достаётся боту (и воркерам supervisor) без повторного вызова LLM,
+и наоборот. ``store`` не ждёт базу: ответы копятся в памяти, и фоновая
+задача записывает накопленное одной транзакцией. Запись таблицы
+действительна, пока не истёк TTL и не изменилась версия справочников
+(``catalog_versions``); устаревшие строки удаляет ``app.retention``.
+Ошибки базы не мешают ответу: кэш продолжает работать в памяти.
+"""
+
+import asyncio
+import datetime
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app import models
+from app.catalog import CATALOG_VERSION_KEY, on_catalog_change
+from app.config import settings
+from app.db import AsyncSessionLocal, dialect_insert
+from app.metrics import record_cache
+from app.text_index import TrigramIndex, normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    sources: List[str] = field(default_factory=list)
+    created_at: float = 0.0
+
+
+def catalog_version_expr():
+    """Текущая версия справочников как подзапрос (0, пока справочники не менялись)."""
+    version = (
+        select(models.CatalogVersion.version)
+        .filter(models.CatalogVersion.name == CATALOG_VERSION_KEY)
+        .scalar_subquery()
+    )
+    return func.coalesce(version, 0)
+
+
+class AnswerCache:
+    """LRU-кэш ответов с TTL и триграммным индексом вопросов.
+
+    С ``session_factory`` промахи памяти проверяются в общей таблице
+    ``answer_cache`` (``lookup``), а новые ответы записываются в неё в фоне
+    (``store``; ``flush`` дожидается записи).
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        session_factory=None,
+    ):
+        self.maxsize = maxsize or settings.ANSWER_CACHE_SIZE
+        self.ttl_seconds = ttl_seconds or settings.ANSWER_CACHE_TTL_SECONDS
+        self.session_factory = session_factory
+        self._clock = clock
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self.index = TrigramIndex()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._writer: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return self._clock() - entry.created_at > self.ttl_seconds
+
+    def _drop(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self.index.remove(key)
+
+    def _get_local(self, key: str) -> Optional[CachedAnswer]:
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry):
+            self._drop(key)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _put_local(self, key: str, entry: CachedAnswer) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self.index.add(key, key)
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+
+    def get(self, question: str) -> Optional[CachedAnswer]:
+        entry = self._get_local(normalize_text(question))
+        record_cache("answer", entry is not None)
+        return entry
+
+    def put(self, question: str, answer: str, sources: Optional[List[str]] = None) -> None:
+        key = normalize_text(question)
+        if not key:
+            return
+        self._put_local(key, CachedAnswer(question, answer, list(sources or []), self._clock()))
+
+    async def lookup(self, question: str) -> Optional[CachedAnswer]:
+        """Ответ из памяти процесса или из общей таблицы."""
+        key = normalize_text(question)
+        entry = self._get_local(key)
+        if entry is None and key and self.session_factory is not None:
+            entry = await self._load_shared(key)
+            if entry is not None:
+                self._put_local(key, entry)
+        record_cache("answer", entry is not None)
+        return entry
+
+    def store(self, question: str, answer: str, sources: Optional[List[str]] = None) -> None:
+        """Кэширует ответ в памяти и ставит его в очередь на запись в общую таблицу."""
+        self.put(question, answer, sources)
+        key = normalize_text(question)
+        if not key or self.session_factory is None:
+            return
+        self._pending[key] = {
+            "key": key, "question": question, "answer": answer,
+            "sources_json": json.dumps(list(sources or []), ensure_ascii=False),
+            "created_at": datetime.datetime.utcnow(),
+        }
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+
+    async def flush(self) -> None:
+        """Дожидается записи отложенных ответов в общую таблицу."""
+        while self._writer is not None and not self._writer.done():
+            await self._writer
+
+    async def _write_pending(self) -> None:
+        # Пока идёт транзакция, новые ответы копятся и уходят следующей пачкой
+        while self._pending:
+            rows, self._pending = list(self._pending.values()), {}
+            table = models.AnswerCacheEntry
+            try:
+                async with self.session_factory() as session:
+                    stmt = dialect_insert(session, table).values(
+                        [{**row, "catalog_version": catalog_version_expr()} for row in rows]
+                    )
+                    await session.execute(stmt.on_conflict_do_update(
+                        index_elements=[table.key],
+                        set_={name: getattr(stmt.excluded, name)
+                              for name in ("question", "answer", "sources_json", "catalog_version", "created_at")},
+                    ))
+                    await session.commit()
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить {len(rows)} ответов в общий кэш: {e}")
+
+    async def _load_shared(self, key: str) -> Optional[CachedAnswer]:
+        table = models.AnswerCacheEntry
+        now = datetime.datetime.utcnow()
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(
+                    select(table.question, table.answer, table.sources_json, table.created_at).filter(
+                        table.key == key,
+                        table.created_at >= now - datetime.timedelta(seconds=self.ttl_seconds),
+                        table.catalog_version == catalog_version_expr(),
+                    )
+                )
+                row = result.first()
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать общий кэш ответов: {e}")
+            return None
+        if row is None:
+            return None
+        # Возраст записи переносим на часы процесса, чтобы TTL истёк одновременно
+        age = (now - row.created_at).total_seconds()
+        return CachedAnswer(row.question, row.answer, json.loads(row.sources_json or "[]"), self._clock() - age)
+
+    def search(self, query: str, limit: int = 10) -> List[CachedAnswer]:
+        """Ответы на похожие вопросы, лучшие первыми."""
+        results = []
+        for key, _ in self.index.search(query, limit):
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry):
+                self._drop(key)
+                continue
+            results.append(entry)
+        return results
+
+    def clear(self) -> None:
+        # Ответы по старым справочникам не должны попасть в таблицу с новой версией
+        self._pending.clear()
+        self._entries.clear()
+        self.index = TrigramIndex()
+
+
+answer_cache = AnswerCache(session_factory=AsyncSessionLocal)
+on_catalog_change(answer_cache.clear)
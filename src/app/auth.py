@@ -0,0 +1,21 @@
+"""Проверка административного доступа для API и бота."""
+
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from app.config import settings
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    """Зависимость FastAPI: пропускает запрос только с верным X-Admin-Token."""
+    if not settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def is_admin_user(telegram_id: Optional[int]) -> bool:
+    """Проверяет, входит ли пользователь Telegram в ADMIN_TELEGRAM_IDS."""
+    return telegram_id is not None and telegram_id in settings.ADMIN_TELEGRAM_IDS
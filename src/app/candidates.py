@@ -0,0 +1,78 @@
+"""Разрешение идентичности кандидатов: LRU-кэш и атомарный upsert.
+
+Повторные пользователи разрешаются из памяти без обращения к БД. Новые
+пользователи создаются одним запросом ``INSERT ... ON CONFLICT DO UPDATE
+... RETURNING``, который одновременно возвращает ID уже существующих строк,
+поэтому два одновременных сообщения одного пользователя не создадут дубль.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from app import models
+from app.config import settings
+from app.db import dialect_insert
+
+
+class CandidateCache:
+    """Ограниченный LRU-кэш telegram_id -> candidates.id."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[int, int]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, telegram_id: int) -> Optional[int]:
+        candidate_id = self._data.get(telegram_id)
+        if candidate_id is not None:
+            self._data.move_to_end(telegram_id)
+        return candidate_id
+
+    def put(self, telegram_id: int, candidate_id: int) -> None:
+        self._data[telegram_id] = candidate_id
+        self._data.move_to_end(telegram_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def update(self, candidate_ids: Dict[int, int]) -> None:
+        for telegram_id, candidate_id in candidate_ids.items():
+            self.put(telegram_id, candidate_id)
+
+    def lookup(self, telegram_ids: Iterable[int]) -> Tuple[Dict[int, int], Set[int]]:
+        """Возвращает найденные в кэше ID и множество промахов."""
+        found: Dict[int, int] = {}
+        missing: Set[int] = set()
+        for telegram_id in telegram_ids:
+            candidate_id = self.get(telegram_id)
+            if candidate_id is None:
+                missing.add(telegram_id)
+            else:
+                found[telegram_id] = candidate_id
+        return found, missing
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+async def upsert_candidates(session, users: Dict[int, Optional[str]]) -> Dict[int, int]:
+    """Создаёт недостающих кандидатов и возвращает telegram_id -> id за один запрос.
+
+    Имя существующего кандидата не перезаписывается: при конфликте
+    выполняется пустое обновление, нужное только для RETURNING.
+    """
+    if not users:
+        return {}
+    stmt = dialect_insert(session, models.Candidate).values(
+        [{"telegram_id": telegram_id, "full_name": full_name} for telegram_id, full_name in users.items()]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.Candidate.telegram_id],
+        set_={"telegram_id": stmt.excluded.telegram_id},
+    ).returning(models.Candidate.telegram_id, models.Candidate.id)
+    result = await session.execute(stmt)
+    return {telegram_id: candidate_id for telegram_id, candidate_id in result.all()}
+
+
+candidate_cache = CandidateCache(settings.CANDIDATE_CACHE_SIZE)
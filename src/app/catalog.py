@@ -0,0 +1,108 @@
+"""Снимок справочников и сигналы об их изменении.
+
+Справочники (программы, FAQ, документы, шаги) меняются редко, поэтому бот и
+API держат их в памяти. Любое изменение через ORM или загрузку начальных
+данных увеличивает счётчик в таблице ``catalog_versions``:
+
+* внутри процесса кэши узнают об изменении сразу через ``on_catalog_change``;
+* другие процессы (бот при изменениях из API и наоборот) периодически
+  сравнивают счётчик (``get_catalog_version``) — один запрос по первичному
+  ключу раз в ``CATALOG_REFRESH_SECONDS``.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+from sqlalchemy import event
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+CATALOG_MODELS = (models.Program, models.FAQ, models.Document, models.Step)
+CATALOG_VERSION_KEY = "catalog"
+
+_listeners: List[Callable[[], None]] = []
+
+
+@dataclass
+class CatalogSnapshot:
+    """Содержимое справочников, упорядоченное по id."""
+    version: int = 0
+    programs: List[models.Program] = field(default_factory=list)
+    faqs: List[models.FAQ] = field(default_factory=list)
+    documents: List[models.Document] = field(default_factory=list)
+    steps: List[models.Step] = field(default_factory=list)
+
+
+def on_catalog_change(callback: Callable[[], None]) -> None:
+    """Регистрирует функцию, вызываемую при изменении справочников в этом процессе."""
+    _listeners.append(callback)
+
+
+def notify_catalog_changed() -> None:
+    for callback in list(_listeners):
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике изменения справочников: {e}")
+
+
+async def get_catalog_version(session) -> int:
+    result = await session.execute(
+        select(models.CatalogVersion.version).filter(models.CatalogVersion.name == CATALOG_VERSION_KEY)
+    )
+    return result.scalar_one_or_none() or 0
+
+
+def _bump_version_stmt(session):
+    stmt = dialect_insert(session, models.CatalogVersion).values(name=CATALOG_VERSION_KEY, version=1)
+    return stmt.on_conflict_do_update(
+        index_elements=[models.CatalogVersion.name],
+        set_={"version": models.CatalogVersion.version + 1},
+    )
+
+
+async def bump_catalog_version(session) -> None:
+    """Увеличивает версию справочников в текущей транзакции (без коммита)."""
+    await session.execute(_bump_version_stmt(session))
+    session.info["catalog_version_bumped"] = True
+    session.info["catalog_changed"] = True
+
+
+async def load_catalog_snapshot(session) -> CatalogSnapshot:
+    """Читает все справочники и их версию."""
+    snapshot = CatalogSnapshot(version=await get_catalog_version(session))
+    for attr, model in (("programs", models.Program), ("faqs", models.FAQ),
+                        ("documents", models.Document), ("steps", models.Step)):
+        result = await session.execute(select(model).order_by(model.id))
+        setattr(snapshot, attr, list(result.scalars().all()))
+    return snapshot
+
+
+@event.listens_for(Session, "after_flush")
+def _track_catalog_edits(session, flush_context):
+    """Увеличивает версию, если в транзакции изменялись объекты справочников."""
+    changed = any(isinstance(obj, CATALOG_MODELS) for obj in (*session.new, *session.dirty, *session.deleted))
+    if not changed or session.info.get("catalog_version_bumped"):
+        return
+    session.connection().execute(_bump_version_stmt(session))
+    session.info["catalog_version_bumped"] = True
+    session.info["catalog_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session):
+    if session.info.pop("catalog_changed", False):
+        session.info.pop("catalog_version_bumped", None)
+        notify_catalog_changed()
+
+
+@event.listens_for(Session, "after_rollback")
+def _reset_after_rollback(session):
+    session.info.pop("catalog_changed", None)
+    session.info.pop("catalog_version_bumped", None)
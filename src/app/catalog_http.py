@@ -0,0 +1,201 @@
+"""Готовые HTTP-ответы справочников для API.
+
+``/programs``, ``/faqs``, ``/documents`` и ``/steps`` отдаются из снимка
+справочников (``app.catalog``), сериализованного один раз в байты JSON.
+У каждого ответа сильный ETag (хэш тела): запрос с совпадающим
+``If-None-Match`` получает 304 без тела. Страницы выбираются по ключу
+(``?after=<последний ключ>&limit=N``), ссылка на следующую страницу — в
+заголовке ``Link``. Номера шагов не уникальны, поэтому шаги сортируются по
+``(step_number, id)`` и курсор шага — пара ``after`` и ``after_id``.
+
+Снимок сбрасывается при изменении справочников в этом процессе
+(``on_catalog_change``) и при смене версии в БД, которую фоновая задача
+проверяет раз в ``CATALOG_REFRESH_SECONDS``; о смене версии фоновая задача
+оповещает все подписчики ``on_catalog_change`` процесса.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+
+from app import schemas
+from app.catalog import (
+    CatalogSnapshot, get_catalog_version, load_catalog_snapshot, notify_catalog_changed, on_catalog_change,
+)
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Справочник -> (схема ответа, поля уникального ключа сортировки и пагинации)
+CATALOGS: Dict[str, tuple] = {
+    "programs": (schemas.Program, ("id",)),
+    "faqs": (schemas.FAQ, ("id",)),
+    "documents": (schemas.Document, ("id",)),
+    "steps": (schemas.Step, ("step_number", "id")),
+}
+
+
+def _dumps(data) -> bytes:
+    # Тот же формат, что у JSONResponse FastAPI
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    etag: str
+
+
+class CatalogPages:
+    """Отсортированные по ключу элементы справочника, сериализованные по одному.
+
+    Ключ — кортеж полей ``fields``; отдельные элементы доступны по ``id``.
+    """
+
+    def __init__(self, schema: Type[BaseModel], fields: Tuple[str, ...], rows: List):
+        self.fields = fields
+        items = sorted(
+            (schema.model_validate(row) for row in rows),
+            key=lambda item: tuple(getattr(item, name) for name in fields),
+        )
+        self.keys = [tuple(getattr(item, name) for name in fields) for item in items]
+        self.items = [_dumps(item.model_dump(mode="json")) for item in items]
+        self.by_key = {item.id: CachedBody(body, _etag(body)) for item, body in zip(items, self.items)}
+        full = b"[" + b",".join(self.items) + b"]"
+        self.full = CachedBody(full, _etag(full))
+
+    def page(self, after: Optional[Tuple[int, ...]], skip: int, limit: int):
+        """Возвращает тело страницы и ключ последнего элемента, если есть следующая.
+
+        Неполный курсор (только ``step_number``) пропускает все элементы с этим префиксом.
+        """
+        if after is not None:
+            after = after + (float("inf"),) * (len(self.fields) - len(after))
+        start = bisect_right(self.keys, after) if after is not None else 0
+        start += skip
+        end = start + limit
+        if start == 0 and end >= len(self.items):
+            return self.full, None
+        body = b"[" + b",".join(self.items[start:end]) + b"]"
+        next_key = self.keys[end - 1] if end < len(self.items) else None
+        return CachedBody(body, _etag(body)), next_key
+
+
+class CatalogResponseCache:
+    """Снимок справочников в виде готовых HTTP-ответов."""
+
+    def __init__(self, session_factory=None, refresh_seconds: Optional[float] = None):
+        self._session_factory = session_factory or AsyncSessionLocal
+        self.refresh_seconds = refresh_seconds or settings.CATALOG_REFRESH_SECONDS
+        self.version: Optional[int] = None
+        self._pages: Dict[str, CatalogPages] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def set_snapshot(self, snapshot: CatalogSnapshot) -> None:
+        self._pages = {
+            name: CatalogPages(schema, fields, getattr(snapshot, name))
+            for name, (schema, fields) in CATALOGS.items()
+        }
+        self.version = snapshot.version
+
+    def invalidate(self) -> None:
+        self.version = None
+
+    async def load(self) -> Dict[str, CatalogPages]:
+        async with self._lock:
+            if self.version is None:
+                async with self._session_factory() as session:
+                    self.set_snapshot(await load_catalog_snapshot(session))
+                logger.info(f"HTTP-кэш справочников построен (версия {self.version})")
+            return self._pages
+
+    async def pages(self, name: str) -> CatalogPages:
+        record_cache("catalog_http", self.version is not None)
+        pages = self._pages if self.version is not None else await self.load()
+        return pages[name]
+
+    async def list_response(
+        self, request: Request, name: str, after: Optional[int] = None, skip: int = 0, limit: int = 100,
+        after_id: Optional[int] = None,
+    ) -> Response:
+        cursor = None
+        if after is not None:
+            cursor = (after,) if after_id is None else (after, after_id)
+        cached, next_key = (await self.pages(name)).page(cursor, skip, limit)
+        headers = {}
+        if next_key is not None:
+            params = {"after": next_key[0], "limit": limit}
+            if len(next_key) > 1:
+                params["after_id"] = next_key[1]
+            next_url = request.url.remove_query_params("skip").include_query_params(**params)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return self._respond(request, cached, headers)
+
+    async def item_response(self, request: Request, name: str, key: int, detail: str) -> Response:
+        cached = (await self.pages(name)).by_key.get(key)
+        if cached is None:
+            raise HTTPException(status_code=404, detail=detail)
+        return self._respond(request, cached)
+
+    def _respond(self, request: Request, cached: CachedBody, headers: Optional[Dict[str, str]] = None) -> Response:
+        headers = {
+            **(headers or {}),
+            "ETag": cached.etag,
+            "Cache-Control": f"public, max-age={settings.CATALOG_HTTP_MAX_AGE}",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or cached.etag in (t.strip() for t in if_none_match.split(","))):
+            return Response(status_code=304, headers=headers)
+        return Response(content=cached.body, media_type="application/json", headers=headers)
+
+    async def refresh_if_changed(self) -> bool:
+        """Сбрасывает снимок, если версия справочников в БД изменилась."""
+        async with self._session_factory() as session:
+            version = await get_catalog_version(session)
+        if self.version is None or version == self.version:
+            return False
+        # Изменение сделал другой процесс: оповещаем все кэши этого процесса
+        # (готовые ответы RAG), а не только HTTP-снимок
+        notify_catalog_changed()
+        self.invalidate()
+        return True
+
+    async def start(self) -> None:
+        """Подписывается на изменения справочников и запускает фоновую проверку версии."""
+        on_catalog_change(self.invalidate)
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh_if_changed()
+            except Exception as e:
+                logger.error(f"Ошибка проверки версии справочников: {e}")
+
+
+catalog_responses = CatalogResponseCache()
@@ -1,4 +1,5 @@
 import os
+from typing import List
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -10,9 +11,27 @@ class Settings(BaseSettings):
     BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
     
-    # Google AI Settings  
+    # Update delivery: polling (разработка) | webhook (продакшен, за балансировщиком)
+    # | supervisor (webhook + BOT_WORKERS процессов-воркеров)
+    BOT_MODE: str = "polling"
+    BOT_WORKERS: int = 0  # 0 — по числу ядер
+    SUPERVISOR_QUEUE_SIZE: int = 1000  # Обновлений в очереди воркера, сверх — 503 (Telegram повторит)
+    SUPERVISOR_DRAIN_TIMEOUT_SECONDS: float = 30.0  # Ожидание отправки очередей воркерам при остановке
+    WEBHOOK_URL: str = ""  # Публичный базовый URL, например https://bot.example.com
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str = ""  # Проверяется по заголовку X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    TELEGRAM_API_URL: str = ""  # Альтернативный сервер Bot API (локальный или тестовый)
+    BOT_METRICS_PORT: int = 0  # Порт /metrics бота (0 — выключено); воркер i слушает порт + i
+    LOOP_WATCHDOG_INTERVAL_MS: float = 100.0  # Период замера задержки event loop (0 — сторож выключен)
+    LOOP_LAG_STACK_THRESHOLD_MS: float = 250.0  # Блокировка дольше — стек event loop в лог (0 — не логировать)
+
+    # Google AI Settings
     GOOGLE_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
+    GEMINI_BASE_URL: str = ""  # Альтернативный адрес Gemini API (например, benchmarks.gemini_server)
+    GEMINI_TIMEOUT_SECONDS: float = 0.0  # Таймаут HTTP-запроса к Gemini (0 — по умолчанию SDK)
 
     # LLM Model IDs
     GEMINI_DEFAULT_MODEL: str = "gemini-2.5-flash"
@@ -23,11 +42,78 @@ class Settings(BaseSettings):
     # RAG Settings
     RAG_RELEVANCE_THRESHOLD: float = 0.3  # Понижен порог для лучшего поиска
     RAG_TOP_K: int = 5
+    RAG_INDEX_BACKEND: str = "chroma"  # chroma | snapshot (mmap-снимок, общий для воркеров)
+    RAG_EMBED_BATCH_SIZE: int = 100  # Текстов в одном запросе эмбеддингов (лимит Gemini — 100)
+    RAG_BATCH_MAX_QUERIES: int = 1000  # Вопросов в одном запросе /search/rag/batch
+
+    # RAG admission control: лимиты на пользователя и на процесс
+    RAG_MAX_CONCURRENCY: int = 8
+    RAG_MAX_QUEUE: int = 32
+    RAG_MAX_WAIT_SECONDS: float = 20.0
+    RAG_USER_BURST: int = 3
+    RAG_USER_RATE_PER_MINUTE: float = 6.0
+
+    # Conversation memory: последние реплики пользователя для уточняющих вопросов
+    CONVERSATION_MAX_TURNS: int = 3
+    CONVERSATION_TTL_SECONDS: float = 1800.0
+    CONVERSATION_MAX_USERS: int = 20000
+    CONVERSATION_HISTORY_TOKENS: int = 200
+
+    # Intent routing: свободный текст -> экраны меню без LLM
+    INTENT_SIMILARITY_THRESHOLD: float = 0.8
+    INTENT_MARGIN: float = 0.05
+
+    # Answer cache and inline mode
+    ANSWER_CACHE_SIZE: int = 2000
+    ANSWER_CACHE_TTL_SECONDS: float = 86400.0
+    INLINE_CACHE_TIME: int = 300
+    INLINE_MAX_RESULTS: int = 10
 
     # Project paths
     ROOT_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     DATA_DIR: str = os.path.join(ROOT_DIR, "data")
     INDEX_DIR: str = os.path.join(ROOT_DIR, "src", "rag", "index")
+    RAG_SNAPSHOT_DIR: str = os.path.join(INDEX_DIR, "snapshot")
+    INTENT_CENTROIDS_PATH: str = os.path.join(INDEX_DIR, "intent_centroids.npz")
+
+    # Database
+    DATABASE_URL: str = "sqlite+aiosqlite:///" + os.path.join(ROOT_DIR, "admissions.db")
+    DATABASE_ECHO: bool = False
+    DATABASE_PROFILE: str = ""  # Пусто — профиль выбирается по диалекту DATABASE_URL
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+
+    # Interaction logging (write-behind)
+    INTERACTION_LOG_BATCH_SIZE: int = 100
+    INTERACTION_LOG_FLUSH_INTERVAL_MS: int = 500
+    INTERACTION_LOG_QUEUE_SIZE: int = 10000
+    INTERACTION_LOG_SPILL_PATH: str = os.path.join(ROOT_DIR, "interactions_spill.jsonl")  # + .<pid> процесса
+    INTERACTION_LOG_MAX_REPLAY_ATTEMPTS: int = 5  # Затем пачка уходит в <INTERACTION_LOG_SPILL_PATH>.dead
+    INTERACTION_CONTEXTS_MODE: str = "refs"  # refs | zlib | zstd | full
+
+    # Interaction retention
+    INTERACTION_RETENTION_DAYS: int = 180
+    ARCHIVE_DIR: str = os.path.join(ROOT_DIR, "archive")
+
+    # Admin access: /stats and other admin commands/endpoints
+    ADMIN_API_TOKEN: str = ""
+    ADMIN_TELEGRAM_IDS: List[int] = []
+
+    # Profiling on demand (/profiling в боте, PUT /profiling в API): доля профилируемых
+    # запросов при старте, интервал снятия стеков, каталог и ротация файлов
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_DIR: str = os.path.join(ROOT_DIR, "profiles")
+    PROFILE_MAX_BYTES: int = 10 * 1024 * 1024
+    PROFILE_BACKUPS: int = 5
+
+    # Catalog caches (bot menus, API snapshots): polling interval for cross-process changes
+    CATALOG_REFRESH_SECONDS: float = 30.0
+    CATALOG_HTTP_MAX_AGE: int = 60  # Cache-Control max-age для /programs, /faqs, /documents, /steps
+
+    # Candidate identity cache (telegram_id -> candidates.id)
+    CANDIDATE_CACHE_SIZE: int = 50000
 
     class Config:
         case_sensitive = True
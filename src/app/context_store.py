@@ -0,0 +1,130 @@
+"""Компактное хранение контекстов RAG во взаимодействиях.
+
+Вместо полного текста чанков ``Interaction.contexts_json`` хранит ссылки:
+версию индекса и для каждого чанка ``[chunk_id, score, source]``. Режим
+задаётся ``INTERACTION_CONTEXTS_MODE``:
+
+* ``refs`` — только ссылки (по умолчанию);
+* ``zlib`` / ``zstd`` — ссылки плюс сжатые тексты в ``contexts_blob``;
+* ``full`` — прежний формат: JSON-список со всеми текстами.
+
+``resolve_contexts`` восстанавливает контексты для аудита из любого формата.
+"""
+
+import json
+import logging
+import zlib
+from typing import Any, List, Optional, Tuple
+
+from app.config import settings
+from app.schemas import RAGContext
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_MODES = ("refs", "zlib", "zstd", "full")
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Для чтения контекстов в формате zstd установите пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def encode_contexts(
+    contexts: List[RAGContext], index_version: Optional[str], mode: Optional[str] = None
+) -> Tuple[str, Optional[bytes]]:
+    """Кодирует контексты в пару (contexts_json, contexts_blob) для записи в БД."""
+    mode = mode or settings.INTERACTION_CONTEXTS_MODE
+    if mode == "full":
+        return json.dumps(
+            [{"source": c.source, "text": c.text, "score": c.score} for c in contexts], ensure_ascii=False
+        ), None
+
+    refs: dict = {
+        "v": index_version,
+        "c": [[c.chunk_id, round(c.score, 4), c.source] for c in contexts],
+    }
+    blob = None
+    if mode in ("zlib", "zstd") and contexts:
+        codec = mode
+        if codec == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("Пакет zstandard не установлен, контексты сжимаются zlib")
+            codec = "zlib"
+        refs["z"] = codec
+        texts = json.dumps([c.text for c in contexts], ensure_ascii=False, separators=(",", ":"))
+        blob = _compress(texts.encode("utf-8"), codec)
+    return json.dumps(refs, ensure_ascii=False, separators=(",", ":")), blob
+
+
+def decode_refs(contexts_json: Optional[str]) -> List[Tuple[Optional[str], float, str]]:
+    """Возвращает ссылки (chunk_id, score, source) без обращения к индексу."""
+    data = json.loads(contexts_json) if contexts_json else []
+    if isinstance(data, list):
+        return [(None, item["score"], item["source"]) for item in data]
+    return [(chunk_id, score, source) for chunk_id, score, source in data.get("c", [])]
+
+
+def resolve_contexts(
+    contexts_json: Optional[str], contexts_blob: Optional[bytes] = None, collection: Any = None
+) -> List[RAGContext]:
+    """Восстанавливает полные контексты взаимодействия.
+
+    Тексты берутся из ``contexts_blob`` (если он есть), иначе из ChromaDB по
+    ID чанков. Если индекс с тех пор переиндексирован, тексты могут не
+    совпадать с показанными пользователю — об этом пишется предупреждение.
+    """
+    if not contexts_json:
+        return []
+    data = json.loads(contexts_json)
+    if isinstance(data, list):
+        return [RAGContext(**item) for item in data]
+
+    refs = data.get("c", [])
+    if not refs:
+        return []
+
+    if contexts_blob is not None and data.get("z"):
+        texts = json.loads(_decompress(contexts_blob, data["z"]).decode("utf-8"))
+    else:
+        texts = _fetch_chunk_texts([chunk_id for chunk_id, _, _ in refs], data.get("v"), collection)
+
+    return [
+        RAGContext(source=source, text=text, score=score, chunk_id=chunk_id)
+        for (chunk_id, score, source), text in zip(refs, texts)
+    ]
+
+
+def _fetch_chunk_texts(chunk_ids: List[Optional[str]], index_version: Optional[str], collection: Any) -> List[str]:
+    if collection is None:
+        from src.rag.retriever import get_collection
+        collection = get_collection()
+    if collection is None:
+        logger.warning("ChromaDB недоступна, тексты контекстов не восстановлены")
+        return ["" for _ in chunk_ids]
+
+    current_version = (collection.metadata or {}).get("index_version")
+    if index_version != current_version:
+        logger.warning(
+            f"Контексты ссылаются на версию индекса {index_version}, текущая — {current_version}; "
+            "тексты чанков могут отличаться"
+        )
+
+    known_ids = [chunk_id for chunk_id in chunk_ids if chunk_id]
+    found = collection.get(ids=known_ids, include=["documents"]) if known_ids else {"ids": [], "documents": []}
+    texts_by_id = dict(zip(found["ids"], found["documents"] or []))
+    return [texts_by_id.get(chunk_id, "") if chunk_id else "" for chunk_id in chunk_ids]
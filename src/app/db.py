@@ -1,21 +1,112 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
+
+from .config import Settings, settings
 from .models import Base
 
-DATABASE_URL = "sqlite+aiosqlite:///./admissions.db"
+logger = logging.getLogger(__name__)
+
+
+def sqlite_pragmas(config: Settings) -> Dict[str, Any]:
+    """PRAGMA продакшен-профиля SQLite."""
+    return {
+        # WAL позволяет API и боту читать, пока другой процесс пишет
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        "mmap_size": config.SQLITE_MMAP_SIZE,
+        # Отрицательное значение задаёт размер кэша в КиБ, а не в страницах
+        "cache_size": -config.SQLITE_CACHE_SIZE_KB,
+        "temp_store": "MEMORY",
+    }
+
+
+# Профили настройки движка по бэкендам. "default" — без дополнительных настроек.
+ENGINE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "sqlite": {"pragmas": sqlite_pragmas},
+    "postgresql": {
+        "engine_kwargs": {"pool_size": 10, "max_overflow": 20, "pool_pre_ping": True},
+    },
+}
+
+
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def dialect_insert(session, table):
+    """Возвращает INSERT диалекта сессии (с поддержкой ON CONFLICT)."""
+    return _DIALECT_INSERTS[session.get_bind().dialect.name](table)
 
-async_engine = create_async_engine(DATABASE_URL, echo=True)
+
+def _install_pragmas(engine: AsyncEngine, pragmas: Dict[str, Any]) -> None:
+    """Применяет PRAGMA к каждому новому соединению SQLite."""
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_engine_from_settings(config: Settings = settings, profile: Optional[str] = None) -> AsyncEngine:
+    """Создаёт асинхронный движок по DATABASE_URL с профилем настройки бэкенда."""
+    url = make_url(config.DATABASE_URL)
+    profile_name = profile or config.DATABASE_PROFILE or url.get_backend_name()
+    engine_profile = ENGINE_PROFILES.get(profile_name, ENGINE_PROFILES["default"])
+
+    engine = create_async_engine(
+        url, echo=config.DATABASE_ECHO, **engine_profile.get("engine_kwargs", {})
+    )
+    if "pragmas" in engine_profile:
+        _install_pragmas(engine, engine_profile["pragmas"](config))
+    logger.info(f"Движок БД создан: {url.render_as_string(hide_password=True)} (профиль {profile_name})")
+    return engine
+
+
+async_engine = create_engine_from_settings()
 
 AsyncSessionLocal = async_sessionmaker(
-    bind=async_engine, 
-    class_=AsyncSession, 
+    bind=async_engine,
+    class_=AsyncSession,
     expire_on_commit=False
 )
 
-async def init_db():
-    async with async_engine.begin() as conn:
+def _sync_schema(sync_conn) -> None:
+    """Добавляет колонки и индексы, объявленные в моделях после создания таблиц.
+
+    create_all не трогает существующие таблицы, поэтому новые nullable-колонки
+    и индексы в уже развёрнутой базе добавляем отдельно.
+    """
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"Добавлена колонка {table.name}.{column.name}")
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+async def init_db(engine: Optional[AsyncEngine] = None):
+    async with (engine or async_engine).begin() as conn:
         # In a real app, you would use Alembic for migrations.
         # For this MVP, we'll create tables directly.
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_sync_schema)
+
 
 # Alias for consistency
 init_database = init_db
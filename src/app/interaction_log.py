@@ -0,0 +1,345 @@
+"""Отложенная (write-behind) запись взаимодействий в базу данных.
+
+Обработчики бота не ждут SQLite: запись кладётся в ограниченную очередь,
+а фоновая задача сбрасывает её пачками в одной транзакции — каждые
+``INTERACTION_LOG_FLUSH_INTERVAL_MS`` миллисекунд или по достижении
+``INTERACTION_LOG_BATCH_SIZE`` записей. Вместе с записью в той же транзакции
+обновляются агрегаты статистики (``rollups``). Если очередь переполнена или БД
+недоступна, записи дописываются в JSONL-файл на диске и загружаются в БД
+позже (при следующем успешном сбросе, старте или остановке).
+
+У каждого процесса свой файл переполнения ``<INTERACTION_LOG_SPILL_PATH>.<pid>``:
+воркеры supervisor не делят один файл. Файлы завершившихся процессов
+забирает (атомарным переименованием) первый запустившийся писатель.
+
+Пачка, которую не удалось дозагрузить ``INTERACTION_LOG_MAX_REPLAY_ATTEMPTS``
+раз подряд, переносится в ``<INTERACTION_LOG_SPILL_PATH>.dead`` и больше
+автоматически не повторяется: одна испорченная запись не должна бесконечно
+возвращаться в файл переполнения.
+"""
+
+import asyncio
+import base64
+import datetime
+import json
+import glob
+import logging
+import os
+import re
+import shutil
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app import models
+from app.candidates import CandidateCache, candidate_cache, upsert_candidates
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.metrics import UPSTREAM_ERRORS, stage
+from app.rollups import RollupRow, apply_rollups
+
+logger = logging.getLogger(__name__)
+
+# Суффиксы файлов переполнения после базового пути: .<pid>, .<pid>.replay, .<pid>.claim
+# (без pid — файлы версий, где путь был общим для всех процессов); .dead не забирается
+_SPILL_SUFFIX_RE = re.compile(r"^(?:\.(\d+))?(?:\.replay|\.claim)?$")
+
+TRACE_COLUMNS = (
+    "total_ms", "embed_ms", "search_ms", "llm_ms", "model", "prompt_tokens", "response_tokens", "cache_flags",
+)
+
+
+@dataclass
+class InteractionRecord:
+    """Одно взаимодействие пользователя с ботом, ожидающее записи в БД."""
+    telegram_id: int
+    full_name: Optional[str]
+    user_message: str
+    bot_response: str
+    contexts_json: str
+    contexts_blob: Optional[bytes] = None
+    created_at: datetime.datetime = field(default_factory=datetime.datetime.utcnow)
+    # Колонки трассы (app.trace.Trace.columns)
+    trace: Dict[str, Any] = field(default_factory=dict)
+    # Неудачные попытки дозагрузки из файла переполнения
+    replay_attempts: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Сериализует запись для файла переполнения."""
+        data = asdict(self)
+        data["created_at"] = self.created_at.isoformat()
+        if self.contexts_blob is not None:
+            data["contexts_blob"] = base64.b64encode(self.contexts_blob).decode("ascii")
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InteractionRecord":
+        """Восстанавливает запись из файла переполнения."""
+        data = dict(data)
+        data["created_at"] = datetime.datetime.fromisoformat(data["created_at"])
+        if data.get("contexts_blob") is not None:
+            data["contexts_blob"] = base64.b64decode(data["contexts_blob"])
+        return cls(**data)
+
+
+class InteractionWriter:
+    """Буферизующий писатель взаимодействий с пакетным сбросом в БД."""
+
+    def __init__(
+        self,
+        session_factory=None,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        spill_path: Optional[str] = None,
+        candidates: Optional[CandidateCache] = None,
+        max_replay_attempts: Optional[int] = None,
+    ):
+        self._session_factory = session_factory or AsyncSessionLocal
+        self._candidates = candidates if candidates is not None else candidate_cache
+        self.batch_size = batch_size or settings.INTERACTION_LOG_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.INTERACTION_LOG_FLUSH_INTERVAL_MS) / 1000
+        self.spill_base = spill_path or settings.INTERACTION_LOG_SPILL_PATH
+        self.max_replay_attempts = max_replay_attempts or settings.INTERACTION_LOG_MAX_REPLAY_ATTEMPTS
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or settings.INTERACTION_LOG_QUEUE_SIZE)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def spill_path(self) -> str:
+        """Файл переполнения этого процесса (pid вычисляется после fork воркера)."""
+        return f"{self.spill_base}.{os.getpid()}"
+
+    @property
+    def dead_letter_path(self) -> str:
+        """Общий файл пачек, которые так и не удалось дозагрузить."""
+        return f"{self.spill_base}.dead"
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, record: InteractionRecord) -> None:
+        """Ставит запись в очередь, не блокируя вызывающего."""
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            logger.warning("Очередь журнала взаимодействий переполнена, запись сохранена на диск")
+            self._spill([record])
+
+    async def start(self) -> None:
+        """Запускает фоновую задачу сброса и дозагружает отложенные записи."""
+        if self.running:
+            return
+        self._closing = False
+        await self._replay_spill()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Журнал взаимодействий запущен")
+
+    async def stop(self) -> None:
+        """Дожидается сброса всех буферизованных записей и останавливает задачу."""
+        self._closing = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+        # Записи, поставленные в очередь без запущенной задачи
+        while not self._queue.empty():
+            await self._flush(self._drain(self.batch_size))
+        await self._replay_spill()
+        logger.info("Журнал взаимодействий остановлен")
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            batch = await self._collect()
+            if batch and await self._flush(batch) and os.path.exists(self.spill_path):
+                await self._replay_spill()
+
+    async def _collect(self) -> List[InteractionRecord]:
+        """Собирает пачку записей, пока не истечёт интервал или не наберётся batch_size."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch: List[InteractionRecord] = []
+        while len(batch) < self.batch_size:
+            batch.extend(self._drain(self.batch_size - len(batch)))
+            timeout = deadline - loop.time()
+            if len(batch) >= self.batch_size or timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _drain(self, limit: int) -> List[InteractionRecord]:
+        items: List[InteractionRecord] = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return items
+
+    async def _flush(self, batch: List[InteractionRecord]) -> bool:
+        """Записывает пачку в одной транзакции; при ошибке сохраняет её на диск."""
+        if not batch:
+            return True
+        try:
+            with stage("db_log"):
+                await self._write(batch)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении {len(batch)} взаимодействий в БД: {e}")
+            UPSTREAM_ERRORS.inc(service="database")
+            self._spill(batch)
+            return False
+
+        logger.debug(f"Сохранено {len(batch)} взаимодействий")
+        return True
+
+    async def _write(self, batch: List[InteractionRecord]) -> None:
+        async with self._session_factory() as session:
+            users = {r.telegram_id: r.full_name for r in batch}
+            candidate_ids, missing = self._candidates.lookup(users)
+            new_ids = await upsert_candidates(session, {tid: users[tid] for tid in missing})
+            candidate_ids.update(new_ids)
+            await session.execute(
+                insert(models.Interaction),
+                [
+                    {
+                        "candidate_id": candidate_ids[r.telegram_id],
+                        "user_message": r.user_message,
+                        "bot_response": r.bot_response,
+                        "contexts_json": r.contexts_json,
+                        "contexts_blob": r.contexts_blob,
+                        "created_at": r.created_at,
+                        **{column: r.trace.get(column) for column in TRACE_COLUMNS},
+                    }
+                    for r in batch
+                ],
+            )
+            await apply_rollups(session, [
+                RollupRow(candidate_ids[r.telegram_id], r.created_at, r.contexts_json) for r in batch
+            ])
+            await session.commit()
+        # Кэшируем только после коммита, чтобы не запомнить откатившиеся ID
+        self._candidates.update(new_ids)
+
+    def _spill(self, records: List[InteractionRecord], path: Optional[str] = None) -> None:
+        path = path or self.spill_path
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r.to_dict(), ensure_ascii=False) + "\n" for r in records))
+        except OSError as e:
+            logger.error(f"Не удалось сохранить {len(records)} взаимодействий в {path}: {e}")
+
+    async def _replay_spill(self) -> None:
+        """Загружает в БД записи, ранее сохранённые в файлы переполнения."""
+        replay_path = f"{self.spill_path}.replay"
+        try:
+            self._collect_spills(replay_path)
+            if not os.path.exists(replay_path):
+                return
+            records = self._read_spill(replay_path)
+        except OSError as e:
+            logger.error(f"Не удалось прочитать файл переполнения {replay_path}: {e}")
+            return
+
+        logger.info(f"Дозагрузка {len(records)} отложенных взаимодействий")
+        for i in range(0, len(records), self.batch_size):
+            await self._replay_batch(records[i:i + self.batch_size])
+        os.remove(replay_path)
+
+    async def _replay_batch(self, batch: List[InteractionRecord]) -> None:
+        """Записывает пачку из файла переполнения; неудачную возвращает в файл или в ``.dead``."""
+        try:
+            with stage("db_log"):
+                await self._write(batch)
+            return
+        except Exception as e:
+            error = e
+        UPSTREAM_ERRORS.inc(service="database")
+
+        for r in batch:
+            r.replay_attempts += 1
+        dead = [r for r in batch if r.replay_attempts >= self.max_replay_attempts]
+        retry = [r for r in batch if r.replay_attempts < self.max_replay_attempts]
+        if retry:
+            logger.warning(f"Не удалось дозагрузить {len(retry)} взаимодействий, повторим позже: {error}")
+            self._spill(retry)
+        if dead:
+            logger.error(
+                f"{len(dead)} взаимодействий не загружены за {self.max_replay_attempts} попыток "
+                f"и перенесены в {self.dead_letter_path}: {error}"
+            )
+            self._spill(dead, self.dead_letter_path)
+
+    def _collect_spills(self, replay_path: str) -> None:
+        """Дописывает в ``replay_path`` свой файл переполнения и файлы завершившихся процессов.
+
+        Существующий ``replay_path`` (сбой при прошлой дозагрузке) не
+        перезаписывается: его записи тоже будут загружены.
+        """
+        claim_path = f"{self.spill_path}.claim"
+        if os.path.exists(claim_path):
+            _append_file(claim_path, replay_path)
+        if os.path.exists(self.spill_path):
+            _append_file(self.spill_path, replay_path)
+        for path in self._orphaned_spills():
+            try:
+                # Переименование атомарно: чужой файл заберёт только один процесс
+                os.rename(path, claim_path)
+            except FileNotFoundError:
+                continue
+            logger.info(f"Забираю файл переполнения завершившегося процесса: {path}")
+            _append_file(claim_path, replay_path)
+
+    def _orphaned_spills(self) -> List[str]:
+        """Файлы переполнения процессов, которые больше не работают."""
+        own = {self.spill_path, f"{self.spill_path}.replay", f"{self.spill_path}.claim"}
+        orphans = []
+        for path in glob.glob(glob.escape(self.spill_base) + "*"):
+            match = _SPILL_SUFFIX_RE.match(path[len(self.spill_base):])
+            if match is None or path in own:
+                continue
+            pid = match.group(1)
+            if pid is not None and _pid_alive(int(pid)):
+                continue
+            orphans.append(path)
+        return sorted(orphans)
+
+    @staticmethod
+    def _read_spill(path: str) -> List[InteractionRecord]:
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(InteractionRecord.from_dict(json.loads(line)))
+                except (ValueError, TypeError, KeyError) as e:
+                    # Обрезанная строка после аварийного завершения не должна блокировать остальные
+                    logger.error(f"Пропущена повреждённая строка {number} в {path}: {e}")
+        return records
+
+
+def _append_file(source: str, target: str) -> None:
+    """Дописывает ``source`` в конец ``target`` и удаляет ``source``."""
+    with open(target, "ab") as dst, open(source, "rb") as src:
+        if dst.tell() > 0:
+            # Последняя строка могла остаться без перевода строки
+            dst.write(b"\n")
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+interaction_writer = InteractionWriter()
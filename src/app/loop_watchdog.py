@@ -0,0 +1,103 @@
+"""Сторож event loop: задержка планирования и стек блокирующего вызова.
+
+Синхронный вызов внутри корутины (Gemini, запрос к Chroma, логирование
+SQL) останавливает весь event loop: бот перестаёт отвечать всем
+пользователям сразу. Сторож состоит из двух частей:
+
+* задача в event loop каждые ``LOOP_WATCHDOG_INTERVAL_MS`` засыпает и
+  измеряет, насколько позже заказанного проснулась, — гистограмма
+  ``admissions_event_loop_lag_seconds``;
+* поток-наблюдатель проверяет, не просрочено ли пробуждение задачи больше
+  чем на ``LOOP_LAG_STACK_THRESHOLD_MS``. Если да, loop занят прямо сейчас,
+  и наблюдатель пишет в лог стек потока event loop — место блокирующего
+  вызова — и увеличивает ``admissions_event_loop_stalls_total``. Одна
+  блокировка логируется один раз.
+
+Запускается в боте (``dp.startup``) и в API (``lifespan``)::
+
+    await loop_watchdog.start()
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.config import settings
+from app.metrics import LOOP_LAG_SECONDS, LOOP_STALLS
+
+logger = logging.getLogger(__name__)
+
+STACK_LIMIT = 30  # Кадров стека в сообщении (ближайшие к блокирующему вызову)
+
+
+class LoopWatchdog:
+    def __init__(self, interval: Optional[float] = None, threshold: Optional[float] = None):
+        self.interval = interval if interval is not None else settings.LOOP_WATCHDOG_INTERVAL_MS / 1000
+        self.threshold = threshold if threshold is not None else settings.LOOP_LAG_STACK_THRESHOLD_MS / 1000
+        self.stalls = 0
+        self._deadline: Optional[float] = None  # Когда задача должна проснуться (time.monotonic)
+        self._reported: Optional[float] = None  # Пробуждение, о просрочке которого уже сообщили
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    async def start(self) -> None:
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._measure())
+        if self.threshold > 0:
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+        logger.info(
+            f"Сторож event loop запущен: интервал {self.interval * 1000:g} мс, "
+            f"порог стека {self.threshold * 1000:g} мс"
+        )
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._deadline = None
+
+    async def _measure(self) -> None:
+        while True:
+            self._deadline = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            LOOP_LAG_SECONDS.observe(max(0.0, time.monotonic() - self._deadline))
+
+    def _watch(self) -> None:
+        # Проверяем чаще порога, чтобы застать блокировку, пока она длится
+        while not self._stopping.wait(self.threshold / 2):
+            deadline = self._deadline
+            if deadline is None or deadline == self._reported:
+                continue
+            lag = time.monotonic() - deadline
+            if lag >= self.threshold:
+                self._reported = deadline
+                self.report(lag)
+
+    def report(self, lag: float) -> None:
+        """Логирует текущий стек потока event loop."""
+        self.stalls += 1
+        LOOP_STALLS.inc()
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT)) if frame is not None else "(стек недоступен)\n"
+        logger.warning(f"Event loop заблокирован уже {lag * 1000:.0f} мс. Стек потока event loop:\n{stack.rstrip()}")
+
+
+loop_watchdog = LoopWatchdog()
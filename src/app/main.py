@@ -1,10 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
+import time
 
+from app.answer_cache import answer_cache
+from app.catalog_http import catalog_responses
 from app.db import init_db
-from app.routers import programs, faqs, steps, documents, search
+from app.loop_watchdog import loop_watchdog
+from app.metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, REGISTRY
+from app.routers import ask, programs, faqs, steps, documents, profiling, search, stats
 from app.seed_data import load_seed_data_to_db
 
 # Настройка логирования
@@ -24,10 +29,15 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Ошибка при инициализации базы данных: {e}")
         raise
+    await catalog_responses.start()
+    await loop_watchdog.start()
     
     yield
     
     # On shutdown
+    await loop_watchdog.stop()
+    await catalog_responses.stop()
+    await answer_cache.flush()
     logger.info("Завершение работы приложения.")
 
 app = FastAPI(
@@ -46,6 +56,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Шаблон маршрута, а не путь: число рядов метрики не растёт от id в URL
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    return response
+
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+async def metrics():
+    """Метрики процесса в формате Prometheus."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
 @app.get("/healthz", tags=["Health"])
 async def health_check():
     """Проверка здоровья сервиса."""
@@ -57,3 +86,6 @@ app.include_router(faqs.router, prefix="/faqs", tags=["FAQs"])
 app.include_router(steps.router, prefix="/steps", tags=["Application Steps"])
 app.include_router(documents.router, prefix="/documents", tags=["Documents"])
 app.include_router(search.router, prefix="/search", tags=["RAG Search"])
+app.include_router(ask.router, prefix="/ask", tags=["RAG Answers"])
+app.include_router(stats.router, prefix="/stats", tags=["Admin"])
+app.include_router(profiling.router, prefix="/profiling", tags=["Admin"])
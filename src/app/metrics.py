@@ -0,0 +1,226 @@
+"""Метрики процесса в текстовом формате Prometheus.
+
+Счётчики и гистограммы хранятся в памяти процесса; ``REGISTRY.render()``
+отдаёт их в формате exposition 0.0.4 для ``/metrics`` API и экспортёра бота.
+Запись метрики — захват блокировки и пара сложений, поэтому их можно
+оставлять включёнными в продакшене. Метрики пишутся и из пула потоков
+(эмбеддинги, поиск, генерация), поэтому каждая метрика защищена своей
+блокировкой.
+
+Этапы обработки вопроса измеряются через ``stage`` (длительность попадает
+и в трассу текущего сообщения, см. ``app.trace``)::
+
+    with stage("search"):
+        results = collection.query(...)
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from app.trace import current_trace
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PROMPT_CHARS_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric") -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> "Metric":
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: Registry = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        # Ключ -> [счётчики по корзинам (последняя — +Inf), сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, ([*s[0]], s[1], s[2])) for key, s in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """Значение, вычисляемое при каждом запросе ``/metrics`` (размер очереди и т.п.)."""
+
+    def __init__(self, name: str, help: str, function: Callable[[], float],
+                 kind: str = "gauge", registry: Registry = REGISTRY):
+        self.kind = kind
+        self.function = function
+        super().__init__(name, help, (), registry)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_number(self.function())}"]
+
+
+# --- Метрики пайплайна ---
+
+STAGE_SECONDS = Histogram(
+    "admissions_stage_seconds",
+    "Длительность этапов обработки вопроса: embed, search, llm, db_log",
+    ["stage"],
+)
+PROMPT_CHARS = Histogram(
+    "admissions_prompt_chars", "Размер промпта для LLM в символах", buckets=PROMPT_CHARS_BUCKETS
+)
+HANDLER_SECONDS = Histogram(
+    "admissions_handler_seconds", "Полное время обработки сообщения ботом по обработчикам", ["handler"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "admissions_http_request_seconds", "Время обработки HTTP-запросов API", ["method", "route", "status"]
+)
+CACHE_REQUESTS = Counter(
+    "admissions_cache_requests_total", "Обращения к кэшам по результату (hit/miss)", ["cache", "result"]
+)
+EMPTY_RETRIEVALS = Counter(
+    "admissions_empty_retrievals_total", "Поиски, не нашедшие релевантного контекста"
+)
+UPSTREAM_ERRORS = Counter(
+    "admissions_upstream_errors_total", "Ошибки внешних сервисов: gemini_embed, gemini_generate, vector_index, database",
+    ["service"],
+)
+LOOP_LAG_SECONDS = Histogram(
+    "admissions_event_loop_lag_seconds", "Задержка пробуждения задачи-сторожа event loop", buckets=LOOP_LAG_BUCKETS
+)
+LOOP_STALLS = Counter(
+    "admissions_event_loop_stalls_total", "Блокировки event loop дольше LOOP_LAG_STACK_THRESHOLD_MS (стек — в логе)"
+)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    """Записывает длительность этапа в гистограмму и в трассу текущего сообщения."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    trace = current_trace()
+    if trace is not None:
+        trace.add_stage(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Контекстный менеджер: записывает длительность этапа ``name``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+    trace = current_trace()
+    if trace is not None:
+        trace.record_cache(cache, hit)
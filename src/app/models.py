@@ -1,6 +1,6 @@
 import datetime
 from sqlalchemy import (Column, Integer, String, Boolean, ForeignKey, Text,
-                        DateTime, create_engine)
+                        DateTime, Index, LargeBinary, create_engine)
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -30,6 +30,30 @@ class Step(Base):
     step_number = Column(Integer, nullable=False)
     description = Column(Text, nullable=False)
 
+class CatalogVersion(Base):
+    """Счётчик изменений справочников (программы, FAQ, документы, шаги)."""
+    __tablename__ = "catalog_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class SeedFile(Base):
+    """Применённые файлы начальных данных и хэш их содержимого."""
+    __tablename__ = "seed_files"
+    name = Column(String, primary_key=True)
+    sha256 = Column(String, nullable=False)
+    rows = Column(Integer, nullable=False)
+    applied_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class AnswerCacheEntry(Base):
+    """Готовые ответы RAG, общие для бота и API (app.answer_cache)."""
+    __tablename__ = "answer_cache"
+    key = Column(Text, primary_key=True)  # Нормализованный текст вопроса
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    sources_json = Column(Text)
+    catalog_version = Column(Integer, nullable=False, default=0, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
 class Candidate(Base):
     __tablename__ = "candidates"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -44,6 +68,48 @@ class Interaction(Base):
     candidate_id = Column(Integer, ForeignKey("candidates.id"))
     user_message = Column(Text)
     bot_response = Column(Text)
-    contexts_json = Column(Text) # Storing context as JSON string
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    contexts_json = Column(Text) # Storing context references as JSON string (see context_store)
+    contexts_blob = Column(LargeBinary) # Compressed chunk texts (zlib/zstd modes)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    # Трасса обработки (app.trace): миллисекунды по этапам, модель, токены, попадания в кэши
+    total_ms = Column(Integer)
+    embed_ms = Column(Integer)
+    search_ms = Column(Integer)
+    llm_ms = Column(Integer)
+    model = Column(String)
+    prompt_tokens = Column(Integer)
+    response_tokens = Column(Integer)
+    cache_flags = Column(Integer)  # Биты app.trace.CACHE_FLAGS
     candidate = relationship("Candidate", back_populates="interactions")
+
+    __table_args__ = (
+        # История конкретного пользователя, отсортированная по времени
+        Index("ix_interactions_candidate_created", "candidate_id", "created_at"),
+    )
+
+class InteractionRollup(Base):
+    """Счётчики взаимодействий за час или день (granularity = "hour" | "day")."""
+    __tablename__ = "interaction_rollups"
+    granularity = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)  # Начало периода, UTC
+    messages = Column(Integer, nullable=False, default=0)
+    unique_candidates = Column(Integer, nullable=False, default=0)
+    no_context = Column(Integer, nullable=False, default=0)
+
+class RollupCandidate(Base):
+    """Отметки «кандидат уже учтён в периоде» для инкрементального подсчёта уникальных."""
+    __tablename__ = "interaction_rollup_candidates"
+    granularity = Column(String, primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    candidate_id = Column(Integer, primary_key=True)
+
+class RollupSource(Base):
+    """Количество попаданий источника в контекст ответа за день."""
+    __tablename__ = "interaction_rollup_sources"
+    bucket = Column(DateTime, primary_key=True)
+    source = Column(Text, primary_key=True)
+    hits = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_interaction_rollup_sources_bucket_hits", "bucket", "hits"),
+    )
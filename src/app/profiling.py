@@ -0,0 +1,222 @@
+"""Выборочное профилирование горячих путей бота и API по запросу администратора.
+
+Функции, обёрнутые ``@profiled("имя")`` (``rag_answer_handler``,
+``search_rag``), профилируются с вероятностью ``sample_rate``. Пока идёт
+хотя бы один выбранный запрос, фоновый поток каждые ``interval`` секунд
+снимает стеки всех потоков процесса (``sys._current_frames``) — так видна
+и работа в пуле потоков (эмбеддинги, поиск, генерация), которую
+``cProfile`` в event loop не заметил бы. Простаивающие потоки
+(ожидание в селекторе, очереди пула) пропускаются.
+
+Стеки пишутся в формате collapsed stacks (``корень;поток;кадр;... N``),
+который понимают flamegraph.pl и speedscope; корень — имена запросов,
+шедших во время выборки. Файл ``PROFILE_DIR/profile-<pid>.collapsed``
+ротируется по размеру.
+
+Включение и выключение — во время работы: ``/profiling 0.05`` в боте или
+``PUT /profiling`` в API (только администраторы). Когда ``sample_rate``
+равен нулю, обёртка стоит одно сравнение, поток профилировщика не запущен.
+Состояние у каждого процесса своё (бот, API, воркеры supervisor).
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (файл, функция) верхнего кадра, означающие, что поток ничего не делает
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+MAX_DEPTH = 128
+
+
+def _frame_name(code) -> str:
+    path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> Optional[str]:
+    """Стек от корня к листу через ``;`` или ``None`` для простаивающего потока."""
+    leaf = frame.f_code
+    if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_FRAMES:
+        return None
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profiler:
+    """Семплирующий профилировщик, активный только во время выбранных запросов."""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        sample_rate: Optional[float] = None,
+        interval: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        backups: Optional[int] = None,
+    ):
+        self.directory = directory or settings.PROFILE_DIR
+        self.sample_rate = sample_rate if sample_rate is not None else settings.PROFILE_SAMPLE_RATE
+        self.interval = interval or settings.PROFILE_INTERVAL_MS / 1000
+        self.max_bytes = max_bytes or settings.PROFILE_MAX_BYTES
+        self.backups = backups if backups is not None else settings.PROFILE_BACKUPS
+        self.sessions = 0
+        self.samples = 0
+        self._active: Counter = Counter()
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._writer: Optional[logging.Logger] = None
+        self._writer_pid: Optional[int] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"profile-{os.getpid()}.collapsed")
+
+    def configure(self, sample_rate: float, interval_ms: Optional[float] = None) -> None:
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate должен быть от 0 до 1")
+        if interval_ms is not None:
+            self.interval = interval_ms / 1000
+        self.sample_rate = sample_rate
+        logger.info(f"Профилирование: доля запросов {sample_rate}, интервал {self.interval * 1000:g} мс")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "interval_ms": round(self.interval * 1000, 3),
+            "active": sum(self._active.values()),
+            "sessions": self.sessions,
+            "samples": self.samples,
+            "path": self.path,
+        }
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0.0 and random.random() < self.sample_rate
+
+    def begin(self, name: str) -> None:
+        with self._lock:
+            self._active[name] += 1
+            self.sessions += 1
+            self._wake.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def end(self, name: str) -> None:
+        with self._lock:
+            self._active[name] -= 1
+            if self._active[name] <= 0:
+                del self._active[name]
+            if not self._active:
+                # Поток допишет накопленные стеки и уснёт до следующего запроса
+                self._wake.clear()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            while self._wake.is_set():
+                self._sample()
+                time.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error(f"Не удалось записать профиль в {self.path}: {e}")
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        with self._lock:
+            root = "+".join(sorted(self._active))
+        if not root:
+            return
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = collapse_stack(frame)
+            if stack is not None:
+                stacks.append(f"{root};{thread_names.get(ident, ident)};{stack}")
+        with self._lock:
+            self._stacks.update(stacks)
+            self.samples += 1
+
+    def flush(self) -> None:
+        """Дописывает накопленные стеки в файл профиля."""
+        # Блокировка записи берётся до извлечения стеков: flush, вызванный одновременно
+        # с потоком профилировщика, вернётся только после того, как стеки окажутся в файле
+        with self._write_lock:
+            with self._lock:
+                stacks, self._stacks = self._stacks, Counter()
+            if not stacks:
+                return
+            self._get_writer().info("\n".join(f"{stack} {count}" for stack, count in stacks.items()))
+
+    def _get_writer(self) -> logging.Logger:
+        # Файл привязан к pid: после fork воркеры supervisor пишут каждый в свой
+        if self._writer is None or self._writer_pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            writer = logging.getLogger(f"{__name__}.{id(self)}.{os.getpid()}")
+            writer.propagate = False
+            writer.setLevel(logging.INFO)
+            for handler in list(writer.handlers):
+                writer.removeHandler(handler)
+                handler.close()
+            handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            writer.addHandler(handler)
+            self._writer, self._writer_pid = writer, os.getpid()
+        return self._writer
+
+
+def profiled(name: str) -> Callable:
+    """Декоратор: профилирует долю ``sample_rate`` вызовов функции (синхронной или асинхронной)."""
+
+    def decorator(function: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if not profiler.should_sample():
+                    return await function(*args, **kwargs)
+                profiler.begin(name)
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    profiler.end(name)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.should_sample():
+                return function(*args, **kwargs)
+            profiler.begin(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.end(name)
+        return wrapper
+
+    return decorator
+
+
+profiler = Profiler()
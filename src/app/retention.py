@@ -0,0 +1,162 @@
+"""Архивация старых взаимодействий и отчёт о размерах таблиц.
+
+Строки ``interactions`` старше ``INTERACTION_RETENTION_DAYS`` дней
+переносятся пачками в сжатый JSONL-архив (``ARCHIVE_DIR``) и удаляются из
+рабочей таблицы, чтобы запросы по горячим данным не зависели от длины
+приёмной кампании. Заодно из общего кэша ответов (``answer_cache``)
+удаляются записи с истёкшим TTL и построенные по прежним справочникам.
+
+Запуск (например, из cron), из директории src:
+    python -m app.retention --days 90
+"""
+
+import argparse
+import asyncio
+import base64
+import datetime
+import gzip
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.future import select
+
+from app import models
+from app.answer_cache import catalog_version_expr
+from app.config import settings
+from app.db import AsyncSessionLocal, init_db
+
+logger = logging.getLogger(__name__)
+
+_ARCHIVED_COLUMNS = [c.name for c in models.Interaction.__table__.columns]
+
+
+def _serialize(row) -> Dict[str, Any]:
+    """Строка для архива; ``contexts_blob`` в base64, как в ``InteractionRecord.to_dict``."""
+    data = dict(row._mapping)
+    if data.get("created_at") is not None:
+        data["created_at"] = data["created_at"].isoformat()
+    if data.get("contexts_blob") is not None:
+        data["contexts_blob"] = base64.b64encode(data["contexts_blob"]).decode("ascii")
+    return data
+
+
+async def archive_interactions(
+    older_than_days: Optional[int] = None,
+    archive_dir: Optional[str] = None,
+    batch_size: int = 1000,
+    session_factory=None,
+) -> Dict[str, Any]:
+    """Переносит старые взаимодействия в gzip-архив и удаляет их из БД.
+
+    Каждая пачка сначала сбрасывается в архив и только потом удаляется,
+    поэтому прерванный запуск не теряет данные (в худшем случае строки
+    попадут в архив дважды).
+    """
+    days = older_than_days if older_than_days is not None else settings.INTERACTION_RETENTION_DAYS
+    archive_dir = archive_dir or settings.ARCHIVE_DIR
+    session_factory = session_factory or AsyncSessionLocal
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    archive_path = os.path.join(
+        archive_dir, f"interactions-{datetime.datetime.utcnow():%Y%m%dT%H%M%S}.jsonl.gz"
+    )
+
+    archived = 0
+    columns = [getattr(models.Interaction, name) for name in _ARCHIVED_COLUMNS]
+    try:
+        async with session_factory() as session:
+            with gzip.open(archive_path, "wt", encoding="utf-8") as archive:
+                while True:
+                    result = await session.execute(
+                        select(*columns)
+                        .filter(models.Interaction.created_at < cutoff)
+                        .order_by(models.Interaction.id)
+                        .limit(batch_size)
+                    )
+                    rows = result.all()
+                    if not rows:
+                        break
+                    for row in rows:
+                        archive.write(json.dumps(_serialize(row), ensure_ascii=False) + "\n")
+                    archive.flush()
+                    os.fsync(archive.fileno())
+
+                    await session.execute(
+                        delete(models.Interaction).filter(models.Interaction.id.in_([row.id for row in rows]))
+                    )
+                    await session.commit()
+                    archived += len(rows)
+
+            # Отметки уникальных кандидатов старых периодов больше не нужны:
+            # сами агрегаты за эти периоды уже посчитаны и сохраняются
+            await session.execute(
+                delete(models.RollupCandidate).filter(models.RollupCandidate.bucket < cutoff)
+            )
+            await session.commit()
+    except BaseException:
+        # Уже удалённые из БД строки остаются в архиве; пустой файл не нужен
+        if archived == 0 and os.path.exists(archive_path):
+            os.remove(archive_path)
+        raise
+
+    if archived == 0:
+        os.remove(archive_path)
+        archive_path = None
+    logger.info(f"Архивировано {archived} взаимодействий старше {cutoff:%Y-%m-%d}")
+    return {"archived": archived, "cutoff": cutoff.isoformat(), "archive_path": archive_path}
+
+
+async def purge_answer_cache(ttl_seconds: Optional[float] = None, session_factory=None) -> int:
+    """Удаляет из общего кэша ответов устаревшие записи; возвращает их число."""
+    ttl_seconds = ttl_seconds or settings.ANSWER_CACHE_TTL_SECONDS
+    session_factory = session_factory or AsyncSessionLocal
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=ttl_seconds)
+    table = models.AnswerCacheEntry
+    async with session_factory() as session:
+        # Два запроса вместо OR, чтобы каждый шёл по своему индексу
+        expired = await session.execute(delete(table).filter(table.created_at < cutoff))
+        stale = await session.execute(delete(table).filter(table.catalog_version != catalog_version_expr()))
+        await session.commit()
+    purged = expired.rowcount + stale.rowcount
+    logger.info(f"Из кэша ответов удалено {purged} устаревших записей")
+    return purged
+
+
+async def table_sizes(session_factory=None) -> Dict[str, Dict[str, Optional[int]]]:
+    """Возвращает количество строк и размер на диске (если доступен dbstat) по таблицам."""
+    session_factory = session_factory or AsyncSessionLocal
+    sizes: Dict[str, Dict[str, Optional[int]]] = {}
+    async with session_factory() as session:
+        disk_bytes: Dict[str, int] = {}
+        if session.get_bind().dialect.name == "sqlite":
+            try:
+                result = await session.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"))
+                disk_bytes = {name: size for name, size in result.all()}
+            except Exception:
+                # SQLite собран без SQLITE_ENABLE_DBSTAT_VTAB
+                logger.debug("dbstat недоступен, размеры таблиц не будут посчитаны")
+
+        for table in models.Base.metadata.sorted_tables:
+            result = await session.execute(select(func.count()).select_from(table))
+            sizes[table.name] = {"rows": result.scalar_one(), "bytes": disk_bytes.get(table.name)}
+    return sizes
+
+
+async def main(days: Optional[int] = None, archive_dir: Optional[str] = None) -> None:
+    await init_db()
+    report = await archive_interactions(days, archive_dir)
+    report["answer_cache_purged"] = await purge_answer_cache()
+    report["tables"] = await table_sizes()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Архивация старых взаимодействий")
+    parser.add_argument("--days", type=int, default=None, help="Возраст строк для архивации, дни")
+    parser.add_argument("--archive-dir", default=None, help="Каталог для архивов")
+    args = parser.parse_args()
+    asyncio.run(main(args.days, args.archive_dir))
@@ -0,0 +1,218 @@
+"""Инкрементально обновляемые агрегаты по взаимодействиям.
+
+Писатель журнала (``interaction_log``) вызывает ``apply_rollups`` в той же
+транзакции, что и вставку взаимодействий, поэтому почасовые и дневные
+счётчики всегда согласованы с таблицей ``interactions``. Чтение статистики
+(``get_stats``) затрагивает фиксированное число строк по первичному ключу и
+не зависит от размера таблицы взаимодействий.
+
+Пересчёт с нуля (например, после ручной правки данных), из директории src:
+    python -m app.rollups --rebuild
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.future import select
+
+from app import models
+from app.context_store import decode_refs
+from app.db import AsyncSessionLocal, dialect_insert, init_db
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day")
+
+
+class RollupRow(NamedTuple):
+    """Минимум данных взаимодействия, нужный для агрегатов."""
+    candidate_id: int
+    created_at: datetime.datetime
+    contexts_json: Optional[str]
+
+
+def bucket_start(moment: datetime.datetime, granularity: str) -> datetime.datetime:
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def apply_rollups(session, rows: Iterable[RollupRow]) -> None:
+    """Добавляет пачку взаимодействий к агрегатам (без коммита)."""
+    counters: Dict[Tuple[str, datetime.datetime], Counter] = defaultdict(Counter)
+    candidates: Set[Tuple[str, datetime.datetime, int]] = set()
+    source_hits: Counter = Counter()
+
+    for row in rows:
+        sources = {source for _, _, source in decode_refs(row.contexts_json)}
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(row.created_at, granularity))
+            counters[key]["messages"] += 1
+            counters[key]["no_context"] += 0 if sources else 1
+            candidates.add((granularity, key[1], row.candidate_id))
+        day = bucket_start(row.created_at, "day")
+        for source in sources:
+            source_hits[(day, source)] += 1
+
+    if not counters:
+        return
+
+    # DO NOTHING + RETURNING возвращает только впервые увиденных кандидатов
+    stmt = dialect_insert(session, models.RollupCandidate).values(
+        [{"granularity": g, "bucket": b, "candidate_id": c} for g, b, c in candidates]
+    ).on_conflict_do_nothing().returning(models.RollupCandidate.granularity, models.RollupCandidate.bucket)
+    result = await session.execute(stmt)
+    for granularity, bucket in result.all():
+        counters[(granularity, bucket)]["unique_candidates"] += 1
+
+    table = models.InteractionRollup
+    stmt = dialect_insert(session, table).values([
+        {
+            "granularity": granularity,
+            "bucket": bucket,
+            "messages": counter["messages"],
+            "unique_candidates": counter["unique_candidates"],
+            "no_context": counter["no_context"],
+        }
+        for (granularity, bucket), counter in counters.items()
+    ])
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[table.granularity, table.bucket],
+        set_={
+            "messages": table.messages + stmt.excluded.messages,
+            "unique_candidates": table.unique_candidates + stmt.excluded.unique_candidates,
+            "no_context": table.no_context + stmt.excluded.no_context,
+        },
+    ))
+
+    if source_hits:
+        table = models.RollupSource
+        stmt = dialect_insert(session, table).values(
+            [{"bucket": day, "source": source, "hits": hits} for (day, source), hits in source_hits.items()]
+        )
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.bucket, table.source],
+            set_={"hits": table.hits + stmt.excluded.hits},
+        ))
+
+
+def _bucket_dict(rollup: Optional[models.InteractionRollup], bucket: datetime.datetime) -> Dict[str, Any]:
+    messages = rollup.messages if rollup else 0
+    no_context = rollup.no_context if rollup else 0
+    return {
+        "bucket": bucket,
+        "messages": messages,
+        "unique_candidates": rollup.unique_candidates if rollup else 0,
+        "no_context": no_context,
+        "no_context_rate": round(no_context / messages, 3) if messages else 0.0,
+    }
+
+
+async def get_stats(
+    session, now: Optional[datetime.datetime] = None, hours: int = 24, days: int = 7, top_sources: int = 5
+) -> Dict[str, Any]:
+    """Возвращает статистику за последние часы/дни и топ источников за сегодня."""
+    now = now or datetime.datetime.utcnow()
+    today = bucket_start(now, "day")
+    hour_buckets = [bucket_start(now, "hour") - datetime.timedelta(hours=i) for i in range(hours - 1, -1, -1)]
+    day_buckets = [today - datetime.timedelta(days=i) for i in range(days - 1, -1, -1)]
+
+    table = models.InteractionRollup
+    result = await session.execute(
+        select(table).filter(
+            ((table.granularity == "hour") & (table.bucket >= hour_buckets[0]))
+            | ((table.granularity == "day") & (table.bucket >= day_buckets[0]))
+        )
+    )
+    rollups = {(r.granularity, r.bucket): r for r in result.scalars().all()}
+
+    result = await session.execute(
+        select(models.RollupSource.source, models.RollupSource.hits)
+        .filter(models.RollupSource.bucket == today)
+        .order_by(models.RollupSource.hits.desc())
+        .limit(top_sources)
+    )
+
+    return {
+        "today": _bucket_dict(rollups.get(("day", today)), today),
+        "hourly": [_bucket_dict(rollups.get(("hour", b)), b) for b in hour_buckets],
+        "daily": [_bucket_dict(rollups.get(("day", b)), b) for b in day_buckets],
+        "top_sources": [{"source": source, "hits": hits} for source, hits in result.all()],
+    }
+
+
+async def rebuild_rollups(session_factory=None, batch_size: int = 1000) -> int:
+    """Пересчитывает все агрегаты по текущему содержимому interactions.
+
+    Агрегаты за периоды, уже перенесённые в архив (``retention``), при этом
+    будут потеряны.
+    """
+    session_factory = session_factory or AsyncSessionLocal
+    processed = 0
+    async with session_factory() as session:
+        for table in (models.InteractionRollup, models.RollupCandidate, models.RollupSource):
+            await session.execute(delete(table))
+
+        last_id = 0
+        while True:
+            result = await session.execute(
+                select(
+                    models.Interaction.id, models.Interaction.candidate_id,
+                    models.Interaction.created_at, models.Interaction.contexts_json,
+                )
+                .filter(models.Interaction.id > last_id)
+                .order_by(models.Interaction.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            await apply_rollups(session, [RollupRow(r.candidate_id, r.created_at, r.contexts_json) for r in rows])
+            last_id = rows[-1].id
+            processed += len(rows)
+        await session.commit()
+    logger.info(f"Агрегаты пересчитаны по {processed} взаимодействиям")
+    return processed
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Форматирует статистику для сообщения администратору."""
+    today = stats["today"]
+    last_24h = sum(b["messages"] for b in stats["hourly"])
+    text = (
+        "📊 **Статистика за сегодня (UTC):**\n\n"
+        f"• Сообщений: {today['messages']}\n"
+        f"• Уникальных пользователей: {today['unique_candidates']}\n"
+        f"• Без найденного контекста: {today['no_context']} ({today['no_context_rate']:.0%})\n"
+        f"• Сообщений за 24 часа: {last_24h}\n"
+    )
+    text += "\n📅 **По дням:**\n"
+    for day in stats["daily"]:
+        text += f"{day['bucket']:%d.%m}: {day['messages']} сообщ., {day['unique_candidates']} польз.\n"
+    if stats["top_sources"]:
+        text += "\n📚 **Популярные источники:**\n"
+        for i, item in enumerate(stats["top_sources"], 1):
+            text += f"{i}. {item['source']} — {item['hits']}\n"
+    return text
+
+
+async def main(rebuild: bool) -> None:
+    await init_db()
+    if rebuild:
+        await rebuild_rollups()
+    async with AsyncSessionLocal() as session:
+        stats = await get_stats(session)
+    print(json.dumps(stats, ensure_ascii=False, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Агрегаты по взаимодействиям")
+    parser.add_argument("--rebuild", action="store_true", help="Пересчитать агрегаты с нуля")
+    args = parser.parse_args()
+    asyncio.run(main(args.rebuild))
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, List
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+
+from app.answer_cache import answer_cache
+from app.schemas import AskQuery, RAGContext
+from src.rag.genai import FALLBACK_ANSWERS, llm_answer_stream
+from src.rag.retriever import construct_prompt, retrieve_context
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Отключаем буферизацию ответа в nginx, иначе токены придут пачкой
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data) -> str:
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sources(contexts: List[RAGContext]) -> List[dict]:
+    return [{"source": c.source, "score": c.score, "chunk_id": c.chunk_id} for c in contexts]
+
+
+async def answer_events(question: str) -> AsyncIterator[str]:
+    """Runs retrieval -> prompt -> generation and yields SSE events.
+
+    Events: ``sources`` (once, before any text), ``token`` (zero or more),
+    then ``done`` or ``error``. Cached answers are sent as a single token.
+    """
+    cached = await answer_cache.lookup(question)
+    if cached is not None:
+        yield sse_event("sources", [{"source": s, "score": None, "chunk_id": None} for s in cached.sources])
+        yield sse_event("token", {"text": cached.answer})
+        yield sse_event("done", {"cached": True})
+        return
+
+    # Поиск по индексу блокирующий: выполняем его в пуле потоков
+    contexts = await asyncio.to_thread(retrieve_context, question)
+    yield sse_event("sources", _sources(contexts))
+
+    parts = []
+    try:
+        async for part in llm_answer_stream(construct_prompt(question, contexts)):
+            parts.append(part)
+            yield sse_event("token", {"text": part})
+    except Exception as e:
+        logger.error(f"Генерация ответа прервана: {e}")
+        yield sse_event("error", {"message": "generation failed"})
+        return
+
+    answer = "".join(parts)
+    if contexts and answer not in FALLBACK_ANSWERS:
+        answer_cache.store(question, answer, [c.source for c in contexts])
+    yield sse_event("done", {"cached": False})
+
+
+@router.post("")
+async def ask(query: AskQuery):
+    """
+    Answers a question with the full RAG pipeline, streamed as
+    Server-Sent Events: retrieved sources first, then answer tokens.
+    """
+    return StreamingResponse(answer_events(query.query), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,18 +1,17 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from typing import List
+from fastapi import APIRouter, Query, Request
+from typing import List, Optional
 
-from app import models, schemas
-from app.db import get_db
+from app import schemas
+from app.catalog_http import catalog_responses
 
 router = APIRouter()
 
 @router.get("/", response_model=List[schemas.Document])
 async def read_documents(
-    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    request: Request,
+    after: Optional[int] = Query(None, description="Return items after this id (keyset pagination)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
 ):
     """Retrieve all documents."""
-    result = await db.execute(select(models.Document).offset(skip).limit(limit))
-    documents = result.scalars().all()
-    return documents
+    return await catalog_responses.list_response(request, "documents", after=after, skip=skip, limit=limit)
@@ -1,21 +1,20 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from typing import List
+from fastapi import APIRouter, Query, Request
+from typing import List, Optional
 
-from app import models, schemas
-from app.db import get_db
+from app import schemas
+from app.catalog_http import catalog_responses
 
 router = APIRouter()
 
 @router.get("/", response_model=List[schemas.FAQ])
 async def read_faqs(
-    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    request: Request,
+    after: Optional[int] = Query(None, description="Return items after this id (keyset pagination)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
 ):
     """Retrieve all FAQs."""
-    result = await db.execute(select(models.FAQ).offset(skip).limit(limit))
-    faqs = result.scalars().all()
-    return faqs
+    return await catalog_responses.list_response(request, "faqs", after=after, skip=skip, limit=limit)
 
 # The POST /faqs/search is conceptually replaced by the RAG endpoint.
 # A simple keyword search could be added here if needed, but the primary
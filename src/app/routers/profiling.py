@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+
+from app import schemas
+from app.auth import require_admin_token
+from app.profiling import profiler
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+@router.get("/", response_model=schemas.ProfilingStatus)
+async def read_profiling():
+    """Current sampling settings and counters of this API process."""
+    return profiler.status()
+
+@router.put("/", response_model=schemas.ProfilingStatus)
+async def update_profiling(config: schemas.ProfilingSettings):
+    """Switches request sampling at runtime; ``sample_rate=0`` turns it off."""
+    profiler.configure(config.sample_rate, config.interval_ms)
+    return profiler.status()
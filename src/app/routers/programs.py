@@ -1,27 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from typing import List
+from fastapi import APIRouter, Query, Request
+from typing import List, Optional
 
-from app import models, schemas
-from app.db import get_db
+from app import schemas
+from app.catalog_http import catalog_responses
 
 router = APIRouter()
 
 @router.get("/", response_model=List[schemas.Program])
 async def read_programs(
-    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    request: Request,
+    after: Optional[int] = Query(None, description="Return items after this id (keyset pagination)"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
 ):
     """Retrieve all programs."""
-    result = await db.execute(select(models.Program).offset(skip).limit(limit))
-    programs = result.scalars().all()
-    return programs
+    return await catalog_responses.list_response(request, "programs", after=after, skip=skip, limit=limit)
 
 @router.get("/{program_id}", response_model=schemas.Program)
-async def read_program(program_id: int, db: AsyncSession = Depends(get_db)):
+async def read_program(program_id: int, request: Request):
     """Retrieve a single program by its ID."""
-    result = await db.execute(select(models.Program).filter(models.Program.id == program_id))
-    program = result.scalars().first()
-    if program is None:
-        raise HTTPException(status_code=404, detail="Program not found")
-    return program
+    return await catalog_responses.item_response(request, "programs", program_id, "Program not found")
@@ -1,11 +1,16 @@
-from fastapi import APIRouter
+import asyncio
 
-from app.schemas import RAGQuery, RAGResponse
-from src.rag.retriever import retrieve_context
+from fastapi import APIRouter, HTTPException
+
+from app.config import settings
+from app.profiling import profiled
+from app.schemas import RAGBatchQuery, RAGBatchResponse, RAGQuery, RAGResponse
+from src.rag.retriever import retrieve_context, retrieve_contexts
 
 router = APIRouter()
 
 @router.post("/rag", response_model=RAGResponse)
+@profiled("search_rag")
 async def search_rag(query: RAGQuery):
     """
     (Debug endpoint) Takes a query and returns the raw context chunks 
@@ -13,3 +18,14 @@ async def search_rag(query: RAGQuery):
     """
     contexts = retrieve_context(query.query)
     return RAGResponse(contexts=contexts)
+
+@router.post("/rag/batch", response_model=RAGBatchResponse)
+async def search_rag_batch(query: RAGBatchQuery):
+    """
+    Retrieves context chunks for many queries at once (evaluation, cache
+    pre-warming, bulk imports). Results follow the order of ``queries``.
+    """
+    if len(query.queries) > settings.RAG_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.RAG_BATCH_MAX_QUERIES} queries per request")
+    results = await asyncio.to_thread(retrieve_contexts, query.queries)
+    return RAGBatchResponse(results=[RAGResponse(contexts=contexts) for contexts in results])
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import schemas
+from app.auth import require_admin_token
+from app.db import get_db
+from app.rollups import get_stats
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+@router.get("/", response_model=schemas.StatsResponse)
+async def read_stats(db: AsyncSession = Depends(get_db)):
+    """Admin statistics served from incrementally maintained rollups."""
+    return await get_stats(db)
@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from typing import List
+from fastapi import APIRouter, Query, Request
+from typing import List, Optional
 
-from app import models, schemas
-from app.db import get_db
+from app import schemas
+from app.catalog_http import catalog_responses
 
 router = APIRouter()
 
 @router.get("/", response_model=List[schemas.Step])
 async def read_steps(
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    after: Optional[int] = Query(None, description="Return items after this step number (keyset pagination)"),
+    after_id: Optional[int] = Query(None, description="With after: return items after this (step number, id) pair"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
 ):
-    """Retrieve all application steps, ordered by step number."""
-    result = await db.execute(select(models.Step).order_by(models.Step.step_number))
-    steps = result.scalars().all()
-    return steps
+    """Retrieve all application steps, ordered by step number (ties by id)."""
+    return await catalog_responses.list_response(
+        request, "steps", after=after, skip=skip, limit=limit, after_id=after_id
+    )
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 import datetime
 
@@ -59,6 +59,24 @@ class Step(StepBase):
     class Config:
         from_attributes = True
 
+# Stats Schemas
+class StatsBucket(BaseModel):
+    bucket: datetime.datetime
+    messages: int
+    unique_candidates: int
+    no_context: int
+    no_context_rate: float
+
+class SourceHits(BaseModel):
+    source: str
+    hits: int
+
+class StatsResponse(BaseModel):
+    today: StatsBucket
+    hourly: List[StatsBucket]
+    daily: List[StatsBucket]
+    top_sources: List[SourceHits]
+
 # RAG Search Schemas
 class RAGQuery(BaseModel):
     query: str
@@ -67,6 +85,30 @@ class RAGContext(BaseModel):
     source: str
     text: str
     score: float
+    chunk_id: Optional[str] = None
 
 class RAGResponse(BaseModel):
     contexts: List[RAGContext]
+
+class RAGBatchQuery(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+
+class RAGBatchResponse(BaseModel):
+    results: List[RAGResponse]
+
+# Answer Schemas
+class AskQuery(BaseModel):
+    query: str = Field(..., min_length=1, max_length=1000)
+
+# Profiling Schemas
+class ProfilingSettings(BaseModel):
+    sample_rate: float = Field(..., ge=0.0, le=1.0)
+    interval_ms: Optional[float] = Field(None, gt=0.0, le=1000.0)
+
+class ProfilingStatus(BaseModel):
+    sample_rate: float
+    interval_ms: float
+    active: int
+    sessions: int
+    samples: int
+    path: str
@@ -1,86 +1,135 @@
-"""Модуль для загрузки начальных данных в базу данных."""
+"""Модуль для загрузки начальных данных в базу данных.
 
+Строки справочников сопоставляются с базой по естественному ключу
+(название программы, вопрос FAQ, название документа, номер шага), а не
+по позиции в файле: при перестановке или вставке строк их ``id`` не
+меняются. Найденные строки обновляются пачками Core ``INSERT ... ON
+CONFLICT (id) DO UPDATE``, новые — вставляются (явный ``id`` из файла
+используется, если он свободен), а строки, которых больше нет в файле,
+удаляются в той же транзакции. SHA-256 содержимого файла сохраняется в
+таблице ``seed_files``: неизменённые файлы пропускаются без разбора.
+"""
+
+import datetime
+import hashlib
 import json
 import asyncio
 from pathlib import Path
-from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
 
-from app.db import AsyncSessionLocal, init_db
+from app.catalog import bump_catalog_version
+from app.db import AsyncSessionLocal, dialect_insert, init_db
 from app import models
 from app.config import settings
 
+SEED_BATCH_SIZE = 500
+
+# Файл -> модель, естественный ключ и колонки со значениями по умолчанию
+SEED_FILES = [
+    ("programs.json", models.Program, "name", {"name": None, "description": None, "cost": None}),
+    ("faqs.json", models.FAQ, "question", {"question": None, "answer": None}),
+    ("documents.json", models.Document, "name", {"name": None, "required": True}),
+    ("steps.json", models.Step, "step_number", {"step_number": None, "description": None}),
+]
+
+
+async def _sync_rows(session: AsyncSession, model, key: str, items: List[Dict[str, Any]], columns) -> int:
+    """Приводит таблицу к содержимому файла; возвращает число строк файла."""
+    rows: Dict[Any, Dict[str, Any]] = {}
+    for item in items:
+        # При повторе ключа действует последняя строка файла
+        rows[item.get(key)] = {"id": item.get("id"), **{name: item.get(name, default) for name, default in columns.items()}}
+
+    result = await session.execute(select(getattr(model, key), model.id).order_by(model.id))
+    existing: Dict[Any, int] = {}
+    stale: List[int] = []
+    for value, row_id in result.all():
+        if value in rows and value not in existing:
+            existing[value] = row_id
+        else:
+            stale.append(row_id)
+    for i in range(0, len(stale), SEED_BATCH_SIZE):
+        await session.execute(delete(model).filter(model.id.in_(stale[i:i + SEED_BATCH_SIZE])))
+
+    taken = set(existing.values())
+    updates, inserts = [], []
+    for value, row in rows.items():
+        if value in existing:
+            updates.append({**row, "id": existing[value]})
+        elif row["id"] is not None and row["id"] not in taken:
+            taken.add(row["id"])
+            updates.append(row)
+        else:
+            inserts.append({name: row[name] for name in columns})
+
+    for i in range(0, len(updates), SEED_BATCH_SIZE):
+        stmt = dialect_insert(session, model).values(updates[i:i + SEED_BATCH_SIZE])
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[model.id],
+            set_={name: getattr(stmt.excluded, name) for name in columns},
+        ))
+    for i in range(0, len(inserts), SEED_BATCH_SIZE):
+        await session.execute(insert(model).values(inserts[i:i + SEED_BATCH_SIZE]))
+    return len(rows)
+
 
-async def load_seed_data_to_db():
-    """Загружает начальные данные из JSON файлов в базу данных."""
+async def load_seed_data_to_db(data_dir: Optional[str] = None, engine: Optional[AsyncEngine] = None) -> Dict[str, int]:
+    """Загружает начальные данные из JSON файлов в базу данных.
+
+    Возвращает словарь «файл -> количество применённых строк» только для
+    файлов, которые были изменены с прошлой загрузки.
+    """
     print("Инициализация базы данных...")
-    await init_db()
-    
-    async with AsyncSessionLocal() as session:
-        # Проверяем, есть ли уже данные в базе
-        result = await session.execute(select(models.Program))
-        if result.scalars().first():
-            print("База данных уже содержит данные. Пропускаем инициализацию.")
-            return
-        
-        data_path = Path(settings.DATA_DIR)
-        
-        # Загружаем программы
-        programs_file = data_path / "programs.json"
-        if programs_file.exists():
-            with open(programs_file, 'r', encoding='utf-8') as f:
-                programs_data = json.load(f)
-                for program_data in programs_data:
-                    program = models.Program(
-                        name=program_data["name"],
-                        description=program_data.get("description"),
-                        cost=program_data.get("cost")
-                    )
-                    session.add(program)
-            print(f"Загружено {len(programs_data)} программ.")
-        
-        # Загружаем FAQ
-        faqs_file = data_path / "faqs.json"
-        if faqs_file.exists():
-            with open(faqs_file, 'r', encoding='utf-8') as f:
-                faqs_data = json.load(f)
-                for faq_data in faqs_data:
-                    faq = models.FAQ(
-                        question=faq_data["question"],
-                        answer=faq_data["answer"]
-                    )
-                    session.add(faq)
-            print(f"Загружено {len(faqs_data)} FAQ.")
-        
-        # Загружаем документы
-        documents_file = data_path / "documents.json"
-        if documents_file.exists():
-            with open(documents_file, 'r', encoding='utf-8') as f:
-                documents_data = json.load(f)
-                for doc_data in documents_data:
-                    document = models.Document(
-                        name=doc_data["name"],
-                        required=doc_data.get("required", True)
-                    )
-                    session.add(document)
-            print(f"Загружено {len(documents_data)} документов.")
-        
-        # Загружаем шаги
-        steps_file = data_path / "steps.json"
-        if steps_file.exists():
-            with open(steps_file, 'r', encoding='utf-8') as f:
-                steps_data = json.load(f)
-                for step_data in steps_data:
-                    step = models.Step(
-                        step_number=step_data["step_number"],
-                        description=step_data["description"]
-                    )
-                    session.add(step)
-            print(f"Загружено {len(steps_data)} шагов.")
-        
+    await init_db(engine)
+    session_factory = (
+        async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False) if engine else AsyncSessionLocal
+    )
+    data_path = Path(data_dir or settings.DATA_DIR)
+    applied: Dict[str, int] = {}
+
+    async with session_factory() as session:
+        result = await session.execute(select(models.SeedFile.name, models.SeedFile.sha256))
+        known_hashes = dict(result.all())
+
+        for file_name, model, key, columns in SEED_FILES:
+            seed_file = data_path / file_name
+            if not seed_file.exists():
+                continue
+
+            raw = seed_file.read_bytes()
+            digest = hashlib.sha256(raw).hexdigest()
+            if known_hashes.get(file_name) == digest:
+                print(f"{file_name} не изменился. Пропускаем.")
+                continue
+
+            rows = await _sync_rows(session, model, key, json.loads(raw.decode("utf-8")), columns)
+
+            stmt = dialect_insert(session, models.SeedFile).values(
+                name=file_name, sha256=digest, rows=rows, applied_at=datetime.datetime.utcnow()
+            )
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[models.SeedFile.name],
+                set_={"sha256": stmt.excluded.sha256, "rows": stmt.excluded.rows, "applied_at": stmt.excluded.applied_at},
+            ))
+            applied[file_name] = rows
+            print(f"{file_name}: применено {rows} строк.")
+
+        if applied:
+            # Кэши справочников в этом процессе сбросятся после коммита,
+            # в остальных — при следующей проверке версии
+            await bump_catalog_version(session)
         await session.commit()
+
+    if applied:
         print("Начальные данные успешно загружены в базу данных.")
+    else:
+        print("Начальные данные не изменились.")
+    return applied
 
 
 if __name__ == "__main__":
-    asyncio.run(load_seed_data_to_db())
\ No newline at end of file
+    asyncio.run(load_seed_data_to_db())
@@ -0,0 +1,70 @@
+"""Нечёткий поиск по коротким текстам с помощью триграмм.
+
+Каждое слово дополняется пробелами и разбивается на триграммы. Оценка
+совпадения — доля триграмм запроса, найденных в тексте. Последнее слово
+запроса дополняется пробелом только слева, поэтому недописанное слово
+работает как префикс («стоим» находит «стоимость»).
+"""
+
+import re
+from collections import defaultdict
+from typing import Dict, FrozenSet, Hashable, List, Set, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Нижний регистр, «ё» -> «е», слова через один пробел."""
+    return " ".join(_WORD_RE.findall(text.lower().replace("ё", "е")))
+
+
+def trigrams(text: str, prefix_last: bool = False) -> FrozenSet[str]:
+    words = normalize_text(text).split()
+    grams: Set[str] = set()
+    for i, word in enumerate(words):
+        padded = f" {word}" if prefix_last and i == len(words) - 1 else f" {word} "
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class TrigramIndex:
+    """Инвертированный индекс «триграмма -> ключи»."""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[Hashable]] = defaultdict(set)
+        self._grams: Dict[Hashable, FrozenSet[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def add(self, key: Hashable, text: str) -> None:
+        self.remove(key)
+        grams = trigrams(text)
+        self._grams[key] = grams
+        for gram in grams:
+            self._postings[gram].add(key)
+
+    def remove(self, key: Hashable) -> None:
+        for gram in self._grams.pop(key, ()):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.5) -> List[Tuple[Hashable, float]]:
+        """Ключи, отсортированные по доле совпавших триграмм запроса."""
+        grams = trigrams(query, prefix_last=True)
+        if not grams:
+            return []
+        hits: Dict[Hashable, int] = defaultdict(int)
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                hits[key] += 1
+        scored = [
+            # При равной полноте выше короткие тексты (меньше лишнего)
+            (key, count / len(grams), count / len(self._grams[key]))
+            for key, count in hits.items()
+            if count / len(grams) >= min_score
+        ]
+        scored.sort(key=lambda item: (item[1], item[2]), reverse=True)
+        return [(key, score) for key, score, _ in scored[:limit]]
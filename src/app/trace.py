@@ -0,0 +1,78 @@
+"""Трассировка обработки одного сообщения.
+
+Трасса создаётся при получении сообщения и живёт в ``ContextVar``, поэтому
+её видят все вызовы внутри обработчика, включая ``asyncio.to_thread``
+(поток получает копию контекста с тем же объектом трассы). Этапы
+(``app.metrics.stage``), обращения к кэшам и использование модели
+записываются в трассу автоматически; при записи взаимодействия трасса
+превращается в несколько компактных колонок ``Interaction``::
+
+    SELECT model, avg(llm_ms), avg(prompt_tokens) FROM interactions
+    WHERE total_ms > 10000 GROUP BY model;
+"""
+
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+# Этапы, для которых в Interaction есть отдельные колонки <этап>_ms
+TRACE_STAGES = ("embed", "search", "llm")
+
+# Биты колонки cache_flags: какие кэши ответили попаданием
+CACHE_FLAGS = {"answer": 1, "menu": 2, "catalog_http": 4}
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("interaction_trace", default=None)
+
+
+@dataclass
+class Trace:
+    started: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, float] = field(default_factory=dict)  # Секунды, суммарно по этапу
+    model: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+    cache_flags: int = 0
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_cache(self, cache: str, hit: bool) -> None:
+        if hit:
+            self.cache_flags |= CACHE_FLAGS.get(cache, 0)
+
+    def record_llm(self, model: str, usage: Any = None) -> None:
+        """Запоминает модель и число токенов из ``usage_metadata`` ответа Gemini."""
+        self.model = model
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_token_count", None)
+            self.response_tokens = getattr(usage, "candidates_token_count", None)
+
+    def columns(self) -> Dict[str, Any]:
+        """Значения колонок трассы в ``Interaction``."""
+        columns = {f"{name}_ms": _ms(self.stages[name]) if name in self.stages else None for name in TRACE_STAGES}
+        columns.update(
+            total_ms=_ms(time.perf_counter() - self.started),
+            model=self.model,
+            prompt_tokens=self.prompt_tokens,
+            response_tokens=self.response_tokens,
+            cache_flags=self.cache_flags,
+        )
+        return columns
+
+
+def _ms(seconds: float) -> int:
+    return int(round(seconds * 1000))
+
+
+def start_trace():
+    """Начинает трассу в текущем контексте; возвращает токен для ``end_trace``."""
+    return _current.set(Trace())
+
+
+def end_trace(token) -> None:
+    _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
@@ -0,0 +1,214 @@
+"""Контроль допуска к дорогому RAG-пути.
+
+Каждый вопрос в свободной форме может запустить поиск по индексу и
+генерацию Gemini. Контроль состоит из двух частей:
+
+* middleware ``RagAdmissionMiddleware`` применяется только к обработчикам с
+  флагом ``rag`` (``@router.message(..., flags={"rag": True})``): у каждого
+  пользователя свой token bucket — не больше ``RAG_USER_BURST`` вопросов
+  подряд и ``RAG_USER_RATE_PER_MINUTE`` в среднем;
+* сам обработчик занимает слот ``generation_slot`` только на время поиска и
+  генерации: одновременно выполняется не больше ``RAG_MAX_CONCURRENCY``
+  генераций; если в очереди уже ``RAG_MAX_QUEUE`` запросов или ожидание
+  превысило ``RAG_MAX_WAIT_SECONDS``, запрос отклоняется с вежливым ответом.
+
+Ответы из кэша, маршрутизация на экраны меню и отправка сообщений в Telegram
+слот не занимают и под нагрузкой не отклоняются. Меню и команды флага не
+имеют и проходят мимо контроля, поэтому не ждут LLM.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message, TelegramObject
+
+from app.config import settings
+
+from .keyboards import main_menu_keyboard
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED_TEXT = (
+    "⏳ Вы задаёте вопросы слишком часто. Пожалуйста, подождите {seconds} сек. "
+    "и отправьте вопрос снова."
+)
+OVERLOADED_TEXT = (
+    "😔 Сейчас очень много обращений, и я не успеваю ответить на ваш вопрос. "
+    "Пожалуйста, повторите его через минуту или воспользуйтесь разделами меню."
+)
+
+
+class Rejected(Exception):
+    """Запрос не допущен к RAG-пути."""
+
+    def __init__(self, reason: str, retry_after: float = 0.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class TokenBucket:
+    tokens: float
+    updated: float
+    notified: bool = False
+
+
+class AdmissionController:
+    """Token bucket на пользователя и общий лимит одновременных генераций."""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_wait_seconds: Optional[float] = None,
+        user_burst: Optional[int] = None,
+        user_rate_per_minute: Optional[float] = None,
+        max_users: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_concurrency = max_concurrency or settings.RAG_MAX_CONCURRENCY
+        self.max_queue = max_queue if max_queue is not None else settings.RAG_MAX_QUEUE
+        self.max_wait_seconds = max_wait_seconds or settings.RAG_MAX_WAIT_SECONDS
+        self.user_burst = user_burst or settings.RAG_USER_BURST
+        self.user_rate = (user_rate_per_minute or settings.RAG_USER_RATE_PER_MINUTE) / 60.0
+        self.max_users = max_users
+        self._clock = clock
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_rate = 0
+        self.shed_overload = 0
+
+    def _bucket(self, user_id: int) -> TokenBucket:
+        now = self._clock()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(tokens=float(self.user_burst), updated=now)
+            self._buckets[user_id] = bucket
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+            bucket.tokens = min(float(self.user_burst), bucket.tokens + (now - bucket.updated) * self.user_rate)
+            bucket.updated = now
+        return bucket
+
+    def take_token(self, user_id: int) -> TokenBucket:
+        """Списывает токен пользователя или бросает ``Rejected("rate")``."""
+        bucket = self._bucket(user_id)
+        if bucket.tokens < 1.0:
+            self.shed_rate += 1
+            raise Rejected("rate", retry_after=(1.0 - bucket.tokens) / self.user_rate)
+        bucket.tokens -= 1.0
+        bucket.notified = False
+        return bucket
+
+    def _refund(self, user_id: int) -> None:
+        # Отклонённый из-за перегрузки вопрос не расходует лимит пользователя
+        bucket = self._buckets.get(user_id)
+        if bucket is not None:
+            bucket.tokens = min(float(self.user_burst), bucket.tokens + 1.0)
+
+    @asynccontextmanager
+    async def generation_slot(self, user_id: int):
+        """Слот одновременной генерации; освобождается при выходе из блока."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self._refund(user_id)
+                self.shed_overload += 1
+                raise Rejected("overload")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.max_wait_seconds)
+            except asyncio.TimeoutError:
+                self._refund(user_id)
+                self.shed_overload += 1
+                raise Rejected("overload")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self, user_id: int):
+        """Токен пользователя и слот генерации на время блока."""
+        self.take_token(user_id)
+        async with self.generation_slot(user_id):
+            yield
+
+    def should_notify(self, user_id: int) -> bool:
+        """Сообщать об ограничении частоты один раз, пока не появится токен."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None or bucket.notified:
+            return False
+        bucket.notified = True
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed_rate": self.shed_rate,
+            "shed_overload": self.shed_overload,
+        }
+
+
+class RagAdmissionMiddleware(BaseMiddleware):
+    """Inner-middleware сообщений: лимит частоты для обработчиков с флагом ``rag``.
+
+    Отказ ``Rejected`` из ``generation_slot`` внутри обработчика тоже
+    превращается здесь в ответ пользователю.
+    """
+
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if not get_flag(data, "rag") or user is None:
+            return await handler(event, data)
+
+        try:
+            self.controller.take_token(user.id)
+            return await handler(event, data)
+        except Rejected as e:
+            logger.warning(f"RAG-запрос пользователя {user.id} отклонён: {e.reason}")
+            if isinstance(event, Message):
+                await self._reply_rejected(event, user.id, e)
+
+    async def _reply_rejected(self, message: Message, user_id: int, rejection: Rejected) -> None:
+        if rejection.reason == "rate":
+            if self.controller.should_notify(user_id):
+                await message.answer(RATE_LIMITED_TEXT.format(seconds=max(1, round(rejection.retry_after))))
+        else:
+            await message.answer(OVERLOADED_TEXT, reply_markup=main_menu_keyboard())
+
+
+rag_admission = AdmissionController()
@@ -0,0 +1,179 @@
+"""Ответы на фактические вопросы напрямую из справочников.
+
+Вопросы вида «сколько стоит обучение на информатике» или «нужен ли
+паспорт» не требуют поиска и генерации: точный ответ лежит в таблицах
+``programs`` и ``documents``. ``FactIndex`` строится по снимку справочников
+(вместе с кэшем меню) и содержит индекс «основа слова -> записи». Анализ
+вопроса — токенизация, грубый стемминг и поиск по словарям, без обращений к
+БД и LLM.
+
+Анализатор отвечает только когда уверен: найден намерение и сущность, и в
+вопросе не осталось значимых слов, которые он не понял («...для
+иностранцев»). Во всех остальных случаях возвращается ``None`` и вопрос идёт
+в RAG. Если в самом вопросе программы нет, она ищется в предыдущих вопросах
+пользователя («а сколько стоит?»).
+"""
+
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app import models
+from app.catalog import CatalogSnapshot
+
+from .keyboards import back_to_menu_keyboard
+from .menus import MenuMessage, format_cost, render_documents
+
+_WORD_RE = re.compile(r"[a-zа-я0-9]+")
+_ENDINGS = sorted((
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее",
+    "ые", "ие", "ую", "юю", "ом", "ем", "ах", "ях", "ам", "ям", "ов", "ев", "а", "я", "о", "е", "и", "ы",
+    "у", "ю", "ь",
+), key=len, reverse=True)
+
+COST_PREFIXES = ("стои", "цен", "оплат", "платн", "руб", "деньг", "денег")
+PROGRAM_PREFIXES = ("программ", "направлен", "специальн")
+DOCUMENT_PREFIXES = ("документ", "бумаг", "перечен", "список")
+STOPWORDS = frozenset((
+    "а", "и", "в", "во", "на", "по", "для", "о", "об", "обо", "про", "за", "у", "с", "со", "к", "ко", "ли",
+    "же", "бы", "не", "это", "мне", "я", "вы", "вас", "ваш", "ваша", "ваше", "ваши", "вашей", "вашем",
+    "какой", "какая", "какое", "какие", "каков", "какова", "каковы", "сколько", "что", "как", "где", "есть",
+    "нужен", "нужна", "нужно", "нужны", "надо", "обучение", "обучения", "обучении", "учеба", "учебы",
+    "учиться", "год", "семестр", "расскажи", "расскажите", "подскажи", "подскажите", "скажи", "скажите",
+    "пожалуйста", "можно", "узнать", "хочу", "интересует", "сейчас", "вообще", "там", "тут", "при",
+    "поступлении", "поступления", "поступить", "нужные", "необходимы", "необходимо",
+    "необходимые", "требуются", "требуется", "каких", "всех", "все", "весь",
+))
+
+
+def normalize(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower().replace("ё", "е"))
+
+
+def stem(word: str) -> str:
+    """Отбрасывает окончание, оставляя основу не короче четырёх букв."""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 4:
+            return word[:-len(ending)]
+    return word
+
+
+def _name_stems(name: str) -> Set[str]:
+    return {stem(w) for w in normalize(name) if len(w) >= 3 and w not in STOPWORDS}
+
+
+class NameIndex:
+    """Индекс «основа слова -> id записей» по названиям."""
+
+    def __init__(self, items: Iterable[Tuple[int, str]]):
+        self.names: Dict[int, Set[str]] = {}
+        self._by_stem: Dict[str, Set[int]] = defaultdict(set)
+        for item_id, name in items:
+            stems = _name_stems(name)
+            self.names[item_id] = stems
+            for s in stems:
+                self._by_stem[s].add(item_id)
+
+    def __contains__(self, word_stem: str) -> bool:
+        return word_stem in self._by_stem
+
+    def match(self, stems: Set[str]) -> List[int]:
+        """id записей с наибольшим числом совпавших основ (все при равенстве)."""
+        hits: Dict[int, int] = defaultdict(int)
+        for s in stems:
+            for item_id in self._by_stem.get(s, ()):
+                hits[item_id] += 1
+        if not hits:
+            return []
+        best = max((count, count / len(self.names[i])) for i, count in hits.items())
+        return sorted(i for i, count in hits.items() if (count, count / len(self.names[i])) == best)
+
+
+def _has_prefix(word: str, prefixes: Sequence[str]) -> bool:
+    return word.startswith(prefixes)
+
+
+class FactIndex:
+    """Анализатор фактических вопросов по снимку справочников."""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        self.programs: Dict[int, models.Program] = {p.id: p for p in snapshot.programs}
+        self.documents: Dict[int, models.Document] = {d.id: d for d in snapshot.documents}
+        self.program_index = NameIndex((p.id, p.name) for p in snapshot.programs if p.name)
+        self.document_index = NameIndex((d.id, d.name) for d in snapshot.documents if d.name)
+
+    def answer(self, text: str, previous: Sequence[str] = ()) -> Optional[MenuMessage]:
+        """Готовый ответ на вопрос или ``None``, если нужен RAG."""
+        words = normalize(text)
+        if not words:
+            return None
+
+        cost = any(_has_prefix(w, COST_PREFIXES) for w in words)
+        program = any(_has_prefix(w, PROGRAM_PREFIXES) for w in words)
+        document = any(_has_prefix(w, DOCUMENT_PREFIXES) for w in words)
+
+        stems = {stem(w) for w in words}
+        program_stems = {s for s in stems if s in self.program_index}
+        document_stems = {s for s in stems if s in self.document_index}
+
+        # Значимые слова, которые анализатор не понял: вопрос сложнее шаблона
+        known = program_stems | document_stems
+        leftover = [
+            w for w in words
+            if w not in STOPWORDS and stem(w) not in known
+            and not _has_prefix(w, COST_PREFIXES + PROGRAM_PREFIXES + DOCUMENT_PREFIXES)
+        ]
+        if leftover:
+            return None
+
+        program_ids = self.program_index.match(program_stems)
+        if not program_ids and (cost or program) and not (document or document_stems):
+            for question in reversed(previous):
+                program_ids = self.program_index.match({stem(w) for w in normalize(question)})
+                if program_ids:
+                    break
+
+        if cost:
+            return self._cost_answer(program_ids) if program_ids else None
+        if document_stems:
+            return self._document_answer(self.document_index.match(document_stems))
+        if document:
+            return render_documents(self.snapshot.documents) if self.documents else None
+        if program_ids:
+            return self._program_answer(program_ids)
+        return None
+
+    def _cost_answer(self, program_ids: List[int]) -> MenuMessage:
+        programs = [self.programs[i] for i in program_ids]
+        if len(programs) == 1:
+            p = programs[0]
+            text = f"💰 Стоимость обучения на программе «{p.name}»: {format_cost(p.cost)}."
+        else:
+            text = "💰 **Стоимость обучения:**\n\n" + "\n".join(
+                f"• **{p.name}** — {format_cost(p.cost)}" for p in programs
+            )
+        text += "\n\n💡 Все программы — в разделе «Программы» главного меню."
+        return MenuMessage(text, {"parse_mode": "Markdown", "reply_markup": back_to_menu_keyboard()})
+
+    def _program_answer(self, program_ids: List[int]) -> MenuMessage:
+        parts = []
+        for i in program_ids:
+            p = self.programs[i]
+            part = f"🎓 **{p.name}**\n"
+            if p.description:
+                part += f"_{p.description}_\n"
+            part += f"💰 Стоимость: {format_cost(p.cost)}"
+            parts.append(part)
+        return MenuMessage("\n\n".join(parts), {"parse_mode": "Markdown", "reply_markup": back_to_menu_keyboard()})
+
+    def _document_answer(self, document_ids: List[int]) -> MenuMessage:
+        lines = []
+        for i in document_ids:
+            d = self.documents[i]
+            if d.required:
+                lines.append(f"✅ Да, «{d.name}» входит в список обязательных документов.")
+            else:
+                lines.append(f"📎 «{d.name}» — дополнительный документ, его можно не предоставлять.")
+        lines.append("\n📋 Полный список — в разделе «Список документов» главного меню.")
+        return MenuMessage("\n".join(lines), {"reply_markup": back_to_menu_keyboard()})
@@ -1,23 +1,47 @@
-import json
+import asyncio
 import logging
-from typing import Optional
+from typing import Any, Dict, List, Optional, Union
 
 from aiogram import F, Router
-from aiogram.filters import Command
-from aiogram.types import CallbackQuery, Message
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, InlineQuery, Message
 
-from app import models
+from app.answer_cache import answer_cache
+from app.auth import is_admin_user
+from app.config import settings
+from app.context_store import encode_contexts
 from app.db import AsyncSessionLocal
-from src.rag.genai import llm_answer
-from src.rag.retriever import construct_prompt, retrieve_context
-
+from app.interaction_log import InteractionRecord, interaction_writer
+from app.profiling import profiled, profiler
+from app.rollups import format_stats, get_stats
+from app.schemas import RAGContext
+from app.trace import current_trace
+from src.rag.genai import FALLBACK_ANSWERS, embed_texts, llm_answer
+from src.rag.retriever import construct_prompt, get_index_version, retrieve_context
+
+from .admission import RagAdmissionMiddleware, Rejected, rag_admission
+from .inline import inline_index
+from .intents import classify_lexical, intent_router
 from .keyboards import back_to_menu_keyboard, main_menu_keyboard
+from .memory import conversation_memory
+from .menu_cache import menu_cache
+from .metrics import HandlerMetricsMiddleware, TraceMiddleware
+from .menus import MenuMessage, render_contacts
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Трасса сообщения (этапы, модель, токены) записывается вместе со взаимодействием
+router.message.outer_middleware(TraceMiddleware())
+
+# Время обработчиков (включая ожидание в admission control)
+router.message.middleware(HandlerMetricsMiddleware())
+router.callback_query.middleware(HandlerMetricsMiddleware())
+router.inline_query.middleware(HandlerMetricsMiddleware())
+
+# Лимиты RAG-пути: действуют только на обработчики с флагом "rag"
+router.message.middleware(RagAdmissionMiddleware(rag_admission))
+
 async def safe_answer(callback: CallbackQuery, text: str, **kwargs):
     """Безопасная отправка ответа через callback."""
     if callback.message:
@@ -28,6 +52,9 @@ async def safe_answer(callback: CallbackQuery, text: str, **kwargs):
 async def start_handler(message: Message):
     """Обработчик команды /start."""
     user_name = message.from_user.first_name if message.from_user and message.from_user.first_name else "Абитуриент"
+    if message.from_user:
+        # Новый диалог — предыдущие реплики больше не уточняют вопросы
+        conversation_memory.clear(message.from_user.id)
     welcome_text = f"""
 👋 Здравствуйте, {user_name}!
 
@@ -80,141 +107,158 @@ async def menu_handler(message: Message):
     )
 
 
-@router.callback_query(F.data == "show_programs")
-async def show_programs_handler(callback: CallbackQuery):
-    """Обрабатывает нажатие кнопки 'Программы'."""
+@router.message(Command("stats"))
+async def stats_handler(message: Message):
+    """Обработчик команды /stats (только для администраторов)."""
+    if not message.from_user or not is_admin_user(message.from_user.id):
+        await message.answer("Эта команда доступна только администраторам.")
+        return
     try:
         async with AsyncSessionLocal() as session:
-            result = await session.execute(select(models.Program).order_by(models.Program.name))
-            programs = result.scalars().all()
-            if not programs:
-                await safe_answer(callback, "Информация о программах пока не добавлена.")
-            else:
-                response_text = "🎓 **Наши программы:**\n\n"
-                for p in programs:
-                    # Правильная проверка для SQLAlchemy объектов
-                    cost_value = getattr(p, 'cost', None)
-                    cost = f"{cost_value:,} руб.".replace(",", " ") if cost_value else "бесплатно"
-                    response_text += f"• **{p.name}** - {cost}\n"
-                    
-                    # Правильная проверка для description
-                    desc_value = getattr(p, 'description', None)
-                    if desc_value:
-                        response_text += f"  _{desc_value}_\n\n"
-                    else:
-                        response_text += "\n"
-                await safe_answer(callback, response_text, parse_mode="Markdown", reply_markup=back_to_menu_keyboard())
+            stats = await get_stats(session)
+        await message.answer(format_stats(stats))
+    except Exception as e:
+        logger.error(f"Ошибка при получении статистики: {e}")
+        await message.answer("Не удалось получить статистику. Попробуйте позже.")
+
+
+PROFILE_USAGE = "Использование: /profiling — состояние, /profiling 0.05 — профилировать 5% вопросов, /profiling off — выключить."
+
+
+def format_profiling(status: Dict[str, Any]) -> str:
+    state = f"доля вопросов {status['sample_rate']:g}" if status["sample_rate"] > 0 else "выключено"
+    return (
+        f"🔬 Профилирование: {state}, интервал {status['interval_ms']:g} мс\n"
+        f"Профилировано запросов: {status['sessions']}, выборок стеков: {status['samples']}\n"
+        f"Файл: {status['path']}"
+    )
+
+
+@router.message(Command("profiling"))
+async def profiling_handler(message: Message, command: CommandObject):
+    """Обработчик команды /profiling (только для администраторов): выборочное профилирование."""
+    if not message.from_user or not is_admin_user(message.from_user.id):
+        await message.answer("Эта команда доступна только администраторам.")
+        return
+    if command.args:
+        argument = command.args.strip().lower()
+        try:
+            profiler.configure(0.0 if argument == "off" else float(argument))
+        except ValueError:
+            await message.answer(PROFILE_USAGE)
+            return
+    await message.answer(format_profiling(profiler.status()))
+
+
+async def send_menu(callback: CallbackQuery, key: str, error_text: str):
+    """Отправляет экран меню из кэша."""
+    try:
+        menu = await menu_cache.get(key)
+        await safe_answer(callback, menu.text, **menu.kwargs)
     except Exception as e:
-        logger.error(f"Ошибка при получении программ: {e}")
-        await safe_answer(callback, 
-            "Произошла ошибка при получении информации о программах. Попробуйте позже.",
-            reply_markup=back_to_menu_keyboard()
-        )
+        logger.error(f"Ошибка при получении экрана меню '{key}': {e}")
+        await safe_answer(callback, error_text, reply_markup=back_to_menu_keyboard())
     await callback.answer()
 
 
+@router.callback_query(F.data == "show_programs")
+async def show_programs_handler(callback: CallbackQuery):
+    """Обрабатывает нажатие кнопки 'Программы'."""
+    await send_menu(callback, "programs",
+        "Произошла ошибка при получении информации о программах. Попробуйте позже.")
+
+
 @router.callback_query(F.data == "show_guide")
 async def show_guide_handler(callback: CallbackQuery):
     """Обрабатывает нажатие кнопки 'Шаги подачи документов'."""
-    try:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(select(models.Step).order_by(models.Step.step_number))
-            steps = result.scalars().all()
-            if not steps:
-                await safe_answer(callback, 
-                    "Пошаговое руководство пока не добавлено.",
-                    reply_markup=back_to_menu_keyboard()
-                )
-            else:
-                response_text = "📝 **Пошаговое руководство по подаче документов:**\n\n"
-                for s in steps:
-                    response_text += f"**{s.step_number}.** {s.description}\n\n"
-                
-                response_text += "💡 *Рекомендуем следовать шагам последовательно для успешного поступления.*"
-                
-                await safe_answer(callback, response_text, reply_markup=back_to_menu_keyboard())
-    except Exception as e:
-        logger.error(f"Ошибка при получении шагов: {e}")
-        await safe_answer(callback, 
-            "Произошла ошибка при получении пошагового руководства. Попробуйте позже.",
-            reply_markup=back_to_menu_keyboard()
-        )
-    await callback.answer()
+    await send_menu(callback, "guide",
+        "Произошла ошибка при получении пошагового руководства. Попробуйте позже.")
 
 
 @router.callback_query(F.data == "show_faq")
 async def show_faq_handler(callback: CallbackQuery):
     """Обрабатывает нажатие кнопки 'FAQ'."""
-    try:
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(select(models.FAQ).order_by(models.FAQ.id))
-            faqs = result.scalars().all()
-            if not faqs:
-                await safe_answer(callback, 
-                    "Раздел FAQ пока пуст.",
-                    reply_markup=back_to_menu_keyboard()
-                )
-            else:
-                response_text = "❓ **Часто задаваемые вопросы:**\n\n"
-                for i, f in enumerate(faqs, 1):
-                    response_text += f"**{i}. {f.question}**\n{f.answer}\n\n"
-                
-                response_text += "💬 *Если не нашли ответ на свой вопрос, задайте его мне напрямую!*"
-                
-                await safe_answer(callback, response_text, reply_markup=back_to_menu_keyboard())
-    except Exception as e:
-        logger.error(f"Ошибка при получении FAQ: {e}")
-        await safe_answer(callback, 
-            "Произошла ошибка при получении FAQ. Попробуйте позже.",
-            reply_markup=back_to_menu_keyboard()
-        )
-    await callback.answer()
+    await send_menu(callback, "faq", "Произошла ошибка при получении FAQ. Попробуйте позже.")
 
 
 @router.callback_query(F.data == "check_docs")
 async def check_docs_handler(callback: CallbackQuery):
     """Обрабатывает нажатие кнопки 'Список документов'."""
+    await send_menu(callback, "documents",
+        "Произошла ошибка при получении списка документов. Попробуйте позже.")
+
+
+def log_interaction(message: Message, answer: str, contexts: List[RAGContext]):
+    """Ставит взаимодействие в очередь на запись в БД (не блокирует ответ)."""
+    contexts_json, contexts_blob = encode_contexts(contexts, get_index_version())
+    trace = current_trace()
+    interaction_writer.submit(InteractionRecord(
+        telegram_id=message.from_user.id,
+        full_name=message.from_user.full_name,
+        user_message=message.text,
+        bot_response=answer,
+        contexts_json=contexts_json,
+        contexts_blob=contexts_blob,
+        trace=trace.columns() if trace is not None else {},
+    ))
+
+
+async def fact_filter(message: Message) -> Union[bool, Dict[str, Any]]:
+    """Пропускает вопросы, на которые есть точный ответ в справочниках."""
+    if not message.text or not message.from_user:
+        return False
     try:
-        async with AsyncSessionLocal() as session:
-            # Получаем обязательные документы
-            result = await session.execute(select(models.Document).filter(models.Document.required == True))
-            required_docs = result.scalars().all()
-            
-            # Получаем дополнительные документы
-            result = await session.execute(select(models.Document).filter(models.Document.required == False))
-            optional_docs = result.scalars().all()
-            
-            if not required_docs:
-                await safe_answer(callback, 
-                    "Список обязательных документов пока не определен.",
-                    reply_markup=back_to_menu_keyboard()
-                )
-            else:
-                response_text = "📋 **Необходимые документы для поступления:**\n\n"
-                
-                response_text += "✅ **Обязательные документы:**\n"
-                for i, d in enumerate(required_docs, 1):
-                    response_text += f"{i}. {d.name}\n"
-                
-                if optional_docs:
-                    response_text += "\n📎 **Дополнительные документы:**\n"
-                    for i, d in enumerate(optional_docs, 1):
-                        response_text += f"{i}. {d.name}\n"
-                
-                response_text += "\n💡 *Убедитесь, что у вас готовы сканы всех документов в хорошем качестве.*"
-                response_text += "\n\n📧 *Документы можно подать через личный кабинет или принести лично в приёмную комиссию.*"
-                
-                await safe_answer(callback, response_text, reply_markup=back_to_menu_keyboard())
+        facts = await menu_cache.get_facts()
     except Exception as e:
-        logger.error(f"Ошибка при получении документов: {e}")
-        await safe_answer(callback, 
-            "Произошла ошибка при получении списка документов. Попробуйте позже.",
-            reply_markup=back_to_menu_keyboard()
-        )
-    await callback.answer()
+        logger.error(f"Индекс фактических ответов недоступен: {e}")
+        return False
+    previous = [turn.question for turn in conversation_memory.recent(message.from_user.id)]
+    answer = facts.answer(message.text, previous)
+    return {"fact": answer} if answer else False
+
+
+@router.message(F.text, fact_filter)
+async def fact_answer_handler(message: Message, fact: MenuMessage):
+    """Отвечает на вопросы о стоимости, программах и документах по шаблону, без RAG."""
+    await message.answer(fact.text, **fact.kwargs)
+    conversation_memory.add(message.from_user.id, message.text, fact.text)
+    # Источник «catalog» отделяет шаблонные ответы от промахов RAG в статистике
+    log_interaction(message, fact.text, [RAGContext(source="catalog", text="", score=1.0)])
+
+
+async def send_intent_menu(message: Message, intent: str):
+    """Отвечает на свободный текст готовым экраном меню."""
+    menu = await menu_cache.get(intent)
+    await message.answer(menu.text, **menu.kwargs)
+    conversation_memory.add(message.from_user.id, message.text, menu.text)
+    log_interaction(message, menu.text, [RAGContext(source=f"menu:{intent}", text="", score=1.0)])
+
+
+async def intent_filter(message: Message) -> Union[bool, Dict[str, Any]]:
+    """Пропускает короткие сообщения, однозначно указывающие на экран меню."""
+    if not message.text or not message.from_user:
+        return False
+    match = classify_lexical(message.text)
+    return {"intent": match.intent} if match else False
+
+
+@router.message(F.text, intent_filter)
+async def intent_menu_handler(message: Message, intent: str):
+    """Показывает экран меню, о котором просит сообщение («контакты», «список документов»)."""
+    try:
+        await send_intent_menu(message, intent)
+    except Exception as e:
+        logger.error(f"Ошибка при показе экрана '{intent}': {e}")
+        await message.answer("Выберите один из вариантов:", reply_markup=main_menu_keyboard())
+
+
+def truncate_message(text: str) -> str:
+    """Ограничивает длину ответа для Telegram."""
+    return text if len(text) <= 4096 else text[:4093] + "..."
 
 
-@router.message(F.text)
+@router.message(F.text, flags={"rag": True})
+@profiled("rag_answer_handler")
 async def rag_answer_handler(message: Message):
     """Обрабатывает любое текстовое сообщение через RAG-пайплайн и логирует взаимодействие."""
     if not message.text or not message.from_user:
@@ -224,53 +268,60 @@ async def rag_answer_handler(message: Message):
     search_message = await message.answer("Ищу информацию... 🧠")
 
     try:
-        # 1. Получаем контекст
-        contexts = retrieve_context(message.text)
+        # Поиск и генерация блокирующие: выполняем их в пуле потоков,
+        # чтобы меню и команды отвечали, пока идут генерации
+        # 1. Получаем контекст; уточняющий вопрос дополняем предыдущими
+        user_id = message.from_user.id
+        query = conversation_memory.retrieval_query(user_id, message.text)
+
+        # Ответ на вопрос без истории диалога мог уже сгенерировать бот или /ask
+        cached = await answer_cache.lookup(message.text) if query == message.text else None
+        if cached is not None:
+            await search_message.delete()
+            await message.answer(truncate_message(cached.answer), disable_web_page_preview=True)
+            conversation_memory.add(user_id, message.text, cached.answer)
+            log_interaction(message, cached.answer, [RAGContext(source=s, text="", score=0.0) for s in cached.sources])
+            return
+
+        texts = [message.text] if query == message.text else [message.text, query]
+        embeddings = await asyncio.to_thread(embed_texts, texts)
+
+        # Вопрос, близкий к одному из экранов меню, не требует LLM
+        match = intent_router.classify_embedding(embeddings[0]) if embeddings else None
+        if match:
+            logger.info(f"Вопрос направлен на экран '{match.intent}' (сходство {match.score:.3f})")
+            await search_message.delete()
+            await send_intent_menu(message, match.intent)
+            return
+
+        # Слот общего лимита занимают только поиск и генерация: ответы из кэша
+        # и экраны меню выше не отклоняются при перегрузке
+        async with rag_admission.generation_slot(user_id):
+            query_embedding = embeddings[-1] if len(embeddings) == len(texts) else None
+            contexts = await asyncio.to_thread(retrieve_context, query, query_embedding)
+
+            # 2. Конструируем промпт с краткой историей диалога
+            prompt = construct_prompt(message.text, contexts, conversation_memory.summary(user_id))
+
+            # 3. Получаем ответ от LLM
+            answer = await asyncio.to_thread(llm_answer, prompt)
+        
+        conversation_memory.add(user_id, message.text, answer)
 
-        # 2. Конструируем промпт
-        prompt = construct_prompt(message.text, contexts)
+        # 4. Удаляем сообщение о поиске и отправляем ответ
+        await search_message.delete()
+        await message.answer(truncate_message(answer), disable_web_page_preview=True)
 
-        # 3. Получаем ответ от LLM
-        answer = llm_answer(prompt)
-        
-        # 4. Логируем взаимодействие в базе данных
-        try:
-            async with AsyncSessionLocal() as session:
-                # Находим или создаем кандидата
-                result = await session.execute(
-                    select(models.Candidate).filter(models.Candidate.telegram_id == message.from_user.id)
-                )
-                candidate = result.scalars().first()
-                if not candidate:
-                    candidate = models.Candidate(
-                        telegram_id=message.from_user.id,
-                        full_name=message.from_user.full_name
-                    )
-                    session.add(candidate)
-                    await session.flush()  # Флашируем для получения ID кандидата
-
-                # Создаем запись взаимодействия
-                interaction = models.Interaction(
-                    candidate_id=candidate.id,
-                    user_message=message.text,
-                    bot_response=answer,
-                    contexts_json=json.dumps([{"source": c.source, "text": c.text, "score": c.score} for c in contexts], ensure_ascii=False)
-                )
-                session.add(interaction)
-                await session.commit()
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении взаимодействия в БД: {e}")
-            # Продолжаем работу, даже если не удалось сохранить в БД
-
-        # 5. Удаляем сообщение о поиске и отправляем ответ
+        # 5. Кэш и журнал — после отправки, чтобы total_ms трассы включал ответ Telegram
+        # Ответ без истории диалога годится и для других пользователей, inline-режима и /ask
+        if query == message.text and contexts and answer not in FALLBACK_ANSWERS:
+            answer_cache.store(message.text, answer, [c.source for c in contexts])
+        log_interaction(message, answer, contexts)
+
+    except Rejected:
+        # Ответ о перегрузке отправит RagAdmissionMiddleware
         await search_message.delete()
-        
-        # Ограничиваем длину ответа для Telegram
-        if len(answer) > 4096:
-            answer = answer[:4093] + "..."
-            
-        await message.answer(answer, disable_web_page_preview=True)
-        
+        raise
     except Exception as e:
         logger.error(f"Ошибка при обработке RAG-запроса: {e}")
         await search_message.delete()
@@ -280,30 +331,23 @@ async def rag_answer_handler(message: Message):
         await message.answer("Выберите один из вариантов:", reply_markup=main_menu_keyboard())
 
 
+@router.inline_query()
+async def inline_query_handler(inline_query: InlineQuery):
+    """Отвечает на inline-запросы по FAQ и кэшу готовых ответов, без LLM."""
+    results = []
+    try:
+        snapshot = menu_cache.snapshot or await menu_cache.load()
+        results = inline_index.search(snapshot, inline_query.query)
+    except Exception as e:
+        logger.error(f"Ошибка при поиске inline-ответов: {e}")
+    await inline_query.answer(results, cache_time=settings.INLINE_CACHE_TIME, is_personal=False)
+
+
 @router.callback_query(F.data == "show_contacts")
 async def show_contacts_handler(callback: CallbackQuery):
     """Обрабатывает нажатие кнопки 'Контакты'."""
-    contact_text = """
-📞 **Контактная информация**
-
-🏢 **Приёмная комиссия ALT University**
-
-📧 **Email:** admissions@alt.university
-📱 **Телефон:** +7 (495) 123-45-67
-🌐 **Сайт:** https://alt.university
-
-📍 **Адрес:** 
-г. Москва, ул. Университетская, д. 1
-
-🕐 **Часы работы приёмной комиссии:**
-Пн-Пт: 09:00 - 18:00
-Сб: 10:00 - 15:00
-Вс: выходной
-
-📋 **Личный кабинет абитуриента:**
-https://cabinet.alt.university
-"""
-    await safe_answer(callback, contact_text, reply_markup=back_to_menu_keyboard())
+    menu = render_contacts()
+    await safe_answer(callback, menu.text, **menu.kwargs)
     await callback.answer()
 
 
@@ -0,0 +1,79 @@
+"""Inline-режим: ``@bot <вопрос>`` в любом чате.
+
+Ответы берутся только из памяти — вопросов FAQ из снимка справочников и
+кэша готовых ответов RAG (``app.answer_cache``), поиск по триграммам.
+LLM и векторный поиск в inline-пути не вызываются, поэтому ответ
+укладывается в единицы миллисекунд, а Telegram кэширует его на
+``INLINE_CACHE_TIME`` секунд.
+"""
+
+import hashlib
+import logging
+from typing import List, Optional
+
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+
+from app.answer_cache import AnswerCache, answer_cache
+from app.catalog import CatalogSnapshot
+from app.config import settings
+from app.text_index import TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+DESCRIPTION_LENGTH = 120
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _article(result_id: str, question: str, answer: str) -> InlineQueryResultArticle:
+    message = f"❓ {question}\n\n{answer}"
+    if len(message) > MAX_MESSAGE_LENGTH:
+        message = message[:MAX_MESSAGE_LENGTH - 3] + "..."
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=_shorten(question, 64),
+        description=_shorten(answer, DESCRIPTION_LENGTH),
+        input_message_content=InputTextMessageContent(message_text=message, disable_web_page_preview=True),
+    )
+
+
+class InlineIndex:
+    """Поиск по вопросам FAQ и кэшированным ответам."""
+
+    def __init__(self, answers: AnswerCache = answer_cache):
+        self.answers = answers
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._faq_index = TrigramIndex()
+        self._faqs = {}
+
+    def _ensure_faqs(self, snapshot: CatalogSnapshot) -> None:
+        # Снимок заменяется целиком при изменении справочников
+        if snapshot is self._snapshot:
+            return
+        index = TrigramIndex()
+        for faq in snapshot.faqs:
+            index.add(faq.id, faq.question)
+        self._faq_index, self._faqs, self._snapshot = index, {f.id: f for f in snapshot.faqs}, snapshot
+
+    def search(self, snapshot: CatalogSnapshot, query: str, limit: Optional[int] = None) -> List[InlineQueryResultArticle]:
+        limit = limit or settings.INLINE_MAX_RESULTS
+        self._ensure_faqs(snapshot)
+
+        if not query.strip():
+            return [_article(f"faq:{f.id}", f.question, f.answer) for f in snapshot.faqs[:limit]]
+
+        results = [
+            _article(f"faq:{faq_id}", self._faqs[faq_id].question, self._faqs[faq_id].answer)
+            for faq_id, _ in self._faq_index.search(query, limit)
+        ]
+        for cached in self.answers.search(query, limit - len(results)):
+            digest = hashlib.sha1(cached.question.encode("utf-8")).hexdigest()[:16]
+            results.append(_article(f"answer:{digest}", cached.question, cached.answer))
+        return results[:limit]
+
+
+inline_index = InlineIndex()
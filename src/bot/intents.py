@@ -0,0 +1,199 @@
+"""Маршрутизация свободного текста на готовые экраны меню.
+
+Многие сообщения — это на самом деле просьбы показать FAQ, список
+документов, шаги подачи, программы или контакты. Эти экраны уже есть в кэше
+меню, поэтому LLM для них не нужен.
+
+``IntentRouter`` классифицирует текст двумя способами:
+
+* лексически — короткое сообщение из ключевых слов одного намерения
+  («контакты», «список документов») распознаётся без обращения к API;
+* по ближайшему центроиду — примеры фраз каждого намерения один раз
+  векторизуются, центроиды кэшируются на диске (``INTENT_CENTROIDS_PATH``).
+  Эмбеддинг вопроса вычисляется в RAG-пути всё равно, поэтому
+  классификация почти бесплатна. Намерение принимается, только если
+  сходство не ниже ``INTENT_SIMILARITY_THRESHOLD`` и отрыв от второго
+  кандидата не меньше ``INTENT_MARGIN``; иначе вопрос идёт в RAG.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import settings
+from src.rag.genai import embed_texts
+
+from .facts import STOPWORDS, normalize
+
+logger = logging.getLogger(__name__)
+
+# Ключи совпадают с ключами кэша меню
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "faq": [
+        "Покажи часто задаваемые вопросы",
+        "Какие вопросы обычно задают абитуриенты?",
+        "Открой раздел FAQ",
+        "Ответы на популярные вопросы",
+    ],
+    "documents": [
+        "Какие документы нужны для поступления?",
+        "Список документов для подачи",
+        "Что нужно принести в приёмную комиссию?",
+        "Перечень необходимых документов",
+    ],
+    "guide": [
+        "Как подать документы?",
+        "Какие шаги нужно пройти для поступления?",
+        "Порядок поступления по шагам",
+        "С чего начать поступление?",
+    ],
+    "contacts": [
+        "Как связаться с приёмной комиссией?",
+        "Дайте телефон приёмной комиссии",
+        "Где вы находитесь?",
+        "Какой у вас адрес и часы работы?",
+    ],
+    "programs": [
+        "Какие программы обучения у вас есть?",
+        "На какие направления можно поступить?",
+        "Покажи список специальностей",
+        "Чему у вас можно учиться?",
+    ],
+}
+
+INTENT_KEYWORDS: Dict[str, Sequence[str]] = {
+    "faq": ("faq", "чаво", "частые", "частых", "популярн"),
+    "documents": ("документ", "перечен"),
+    "guide": ("шаг", "инструкц", "порядок", "руководств"),
+    "contacts": ("контакт", "телефон", "адрес", "почт", "email", "связат", "связь", "позвонит"),
+    "programs": ("программ", "направлен", "специальн"),
+}
+# Слова, не меняющие намерения короткого сообщения
+NEUTRAL_PREFIXES = ("покаж", "откр", "дай", "дайте", "список", "раздел", "приемн", "комисс", "университет", "вуз")
+MAX_LEXICAL_WORDS = 4
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    score: float
+    method: str
+
+
+def classify_lexical(text: str) -> Optional[IntentMatch]:
+    """Распознаёт короткие сообщения из ключевых слов одного намерения."""
+    words = [w for w in normalize(text) if w not in STOPWORDS]
+    if not words or len(words) > MAX_LEXICAL_WORDS:
+        return None
+    found = set()
+    for word in words:
+        intents = {intent for intent, prefixes in INTENT_KEYWORDS.items() if word.startswith(tuple(prefixes))}
+        if not intents and not word.startswith(NEUTRAL_PREFIXES):
+            return None
+        found |= intents
+    if len(found) != 1:
+        return None
+    return IntentMatch(found.pop(), 1.0, "lexical")
+
+
+def _examples_digest(examples: Dict[str, List[str]], model: str) -> str:
+    payload = json.dumps({"model": model, "examples": examples}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IntentRouter:
+    """Классификатор намерений: лексические правила и ближайший центроид."""
+
+    def __init__(
+        self,
+        examples: Optional[Dict[str, List[str]]] = None,
+        threshold: Optional[float] = None,
+        margin: Optional[float] = None,
+        cache_path: Optional[str] = None,
+        embed: Callable[[List[str]], List[List[float]]] = embed_texts,
+    ):
+        self.examples = examples or INTENT_EXAMPLES
+        self.threshold = threshold if threshold is not None else settings.INTENT_SIMILARITY_THRESHOLD
+        self.margin = margin if margin is not None else settings.INTENT_MARGIN
+        self.cache_path = Path(cache_path or settings.INTENT_CENTROIDS_PATH)
+        self._embed = embed
+        self.intents: List[str] = list(self.examples)
+        self.centroids: Optional[np.ndarray] = None
+
+    def _load_cached(self, digest: str) -> Optional[np.ndarray]:
+        if not self.cache_path.exists():
+            return None
+        try:
+            with np.load(self.cache_path) as data:
+                if str(data["digest"]) == digest and list(data["intents"]) == self.intents:
+                    return data["centroids"]
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш центроидов намерений: {e}")
+        return None
+
+    def _save_cached(self, digest: str, centroids: np.ndarray) -> None:
+        # Запись во временный файл рядом и os.replace: воркеры, одновременно
+        # собирающие центроиды, не читают и не оставляют недописанный файл
+        tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez(f, digest=digest, intents=np.array(self.intents), centroids=centroids)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш центроидов намерений: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def build(self) -> bool:
+        """Вычисляет центроиды (или читает их из кэша). Возвращает успех."""
+        digest = _examples_digest(self.examples, settings.GEMINI_EMBEDDING_MODEL)
+        centroids = self._load_cached(digest)
+        if centroids is None:
+            texts = [text for intent in self.intents for text in self.examples[intent]]
+            embeddings = self._embed(texts)
+            if len(embeddings) != len(texts) or not all(embeddings):
+                logger.error("Не удалось векторизовать примеры намерений, работает только лексическая маршрутизация")
+                return False
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            rows, start = [], 0
+            for intent in self.intents:
+                count = len(self.examples[intent])
+                rows.append(vectors[start:start + count].mean(axis=0))
+                start += count
+            centroids = np.stack(rows)
+            self._save_cached(digest, centroids)
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+        logger.info(f"Центроиды намерений готовы: {', '.join(self.intents)}")
+        return True
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self.build)
+
+    def classify_embedding(self, embedding: Sequence[float]) -> Optional[IntentMatch]:
+        """Ближайший центроид, если сходство уверенное."""
+        if self.centroids is None or embedding is None or len(embedding) == 0:
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm == 0.0 or query.shape[0] != self.centroids.shape[1]:
+            return None
+        scores = self.centroids @ (query / norm)
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        second = float(scores[order[1]]) if len(order) > 1 else -1.0
+        if best < self.threshold or best - second < self.margin:
+            return None
+        return IntentMatch(self.intents[order[0]], best, "centroid")
+
+
+intent_router = IntentRouter()
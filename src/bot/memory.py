@@ -0,0 +1,122 @@
+"""Краткая память диалога с каждым пользователем.
+
+Для уточняющих вопросов («а сколько стоит?») боту нужен контекст
+предыдущих реплик. Память хранит последние ``CONVERSATION_MAX_TURNS`` пар
+«вопрос — ответ» в кольцевом буфере на пользователя; реплики обрезаются,
+записи старше ``CONVERSATION_TTL_SECONDS`` удаляются, а число пользователей
+ограничено ``CONVERSATION_MAX_USERS`` (вытесняются давно писавшие). Поэтому
+объём памяти ограничен независимо от числа активных пользователей.
+
+В промпт попадает только сводка, укладывающаяся в
+``CONVERSATION_HISTORY_TOKENS``; в поисковый запрос — предыдущие вопросы.
+"""
+
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Deque, List, Optional
+
+from app.config import settings
+
+# Ограничения длины сохраняемых реплик (символы)
+MAX_QUESTION_CHARS = 200
+MAX_ANSWER_CHARS = 300
+# Грубая оценка для русского текста: ~4 символа на токен
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+@dataclass
+class Turn:
+    __slots__ = ("question", "answer", "at")
+    question: str
+    answer: str
+    at: float
+
+
+class ConversationMemory:
+    """Кольцевые буферы последних реплик пользователей с TTL и LRU-вытеснением."""
+
+    def __init__(
+        self,
+        max_turns: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        max_users: Optional[int] = None,
+        history_tokens: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_turns = max_turns or settings.CONVERSATION_MAX_TURNS
+        self.ttl_seconds = ttl_seconds or settings.CONVERSATION_TTL_SECONDS
+        self.max_users = max_users or settings.CONVERSATION_MAX_USERS
+        self.history_tokens = history_tokens or settings.CONVERSATION_HISTORY_TOKENS
+        self._clock = clock
+        # Порядок — по времени последней реплики: в начале самые старые
+        self._turns: "OrderedDict[int, Deque[Turn]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def add(self, user_id: int, question: str, answer: str) -> None:
+        now = self._clock()
+        turns = self._turns.pop(user_id, None)
+        if turns is None or (turns and now - turns[-1].at > self.ttl_seconds):
+            turns = deque(maxlen=self.max_turns)
+        turns.append(Turn(_shorten(question, MAX_QUESTION_CHARS), _shorten(answer, MAX_ANSWER_CHARS), now))
+        self._turns[user_id] = turns
+        self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        while self._turns:
+            user_id, turns = next(iter(self._turns.items()))
+            if len(self._turns) <= self.max_users and now - turns[-1].at <= self.ttl_seconds:
+                break
+            del self._turns[user_id]
+
+    def recent(self, user_id: int) -> List[Turn]:
+        """Неустаревшие реплики пользователя, от старых к новым."""
+        turns = self._turns.get(user_id)
+        if not turns:
+            return []
+        if self._clock() - turns[-1].at > self.ttl_seconds:
+            del self._turns[user_id]
+            return []
+        return list(turns)
+
+    def clear(self, user_id: int) -> None:
+        self._turns.pop(user_id, None)
+
+    def summary(self, user_id: int, max_tokens: Optional[int] = None) -> str:
+        """Сводка последних реплик (новые важнее) в пределах бюджета токенов."""
+        budget = max_tokens or self.history_tokens
+        lines: List[str] = []
+        for turn in reversed(self.recent(user_id)):
+            line = f"Абитуриент: {turn.question}\nАссистент: {turn.answer}"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            budget -= cost
+            lines.append(line)
+        return "\n".join(reversed(lines))
+
+    def retrieval_query(self, user_id: int, question: str, max_tokens: Optional[int] = None) -> str:
+        """Поисковый запрос: текущий вопрос, дополненный предыдущими вопросами."""
+        budget = (max_tokens or self.history_tokens) - estimate_tokens(question)
+        previous: List[str] = []
+        for turn in reversed(self.recent(user_id)):
+            cost = estimate_tokens(turn.question)
+            if cost > budget:
+                break
+            budget -= cost
+            previous.append(turn.question)
+        return "\n".join([*reversed(previous), question])
+
+
+conversation_memory = ConversationMemory()
@@ -0,0 +1,119 @@
+"""Кэш готовых сообщений меню бота.
+
+Экраны «Программы», «Шаги», «FAQ» и «Документы» рендерятся один раз из
+снимка справочников (при старте бота или первом обращении) и отдаются из
+памяти без обращения к БД. Из того же снимка строится индекс для ответов на
+фактические вопросы (``facts.FactIndex``). Кэш сбрасывается при изменении справочников в
+этом процессе (``on_catalog_change``) и при смене версии справочников в БД,
+которую фоновая задача проверяет раз в ``CATALOG_REFRESH_SECONDS``; о смене
+версии фоновая задача оповещает все подписчики ``on_catalog_change`` процесса.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from app.catalog import (
+    CatalogSnapshot, get_catalog_version, load_catalog_snapshot, notify_catalog_changed, on_catalog_change,
+)
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.metrics import record_cache
+
+from .facts import FactIndex
+from .menus import MenuMessage, render_contacts, render_documents, render_faq, render_guide, render_programs
+
+logger = logging.getLogger(__name__)
+
+
+class MenuCache:
+    """Отрендеренные экраны меню и снимок справочников, из которого они построены."""
+
+    def __init__(self, session_factory=None, refresh_seconds: Optional[float] = None):
+        self._session_factory = session_factory or AsyncSessionLocal
+        self.refresh_seconds = refresh_seconds or settings.CATALOG_REFRESH_SECONDS
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self._messages: Dict[str, MenuMessage] = {}
+        self.facts: Optional[FactIndex] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def set_snapshot(self, snapshot: CatalogSnapshot) -> None:
+        """Рендерит все экраны по снимку и атомарно заменяет содержимое кэша."""
+        self._messages = {
+            "programs": render_programs(snapshot.programs),
+            "guide": render_guide(snapshot.steps),
+            "faq": render_faq(snapshot.faqs),
+            "documents": render_documents(snapshot.documents),
+            "contacts": render_contacts(),
+        }
+        self.facts = FactIndex(snapshot)
+        self.snapshot = snapshot
+
+    def invalidate(self) -> None:
+        self.snapshot = None
+
+    async def load(self) -> CatalogSnapshot:
+        async with self._lock:
+            if self.snapshot is None:
+                async with self._session_factory() as session:
+                    self.set_snapshot(await load_catalog_snapshot(session))
+                logger.info(f"Кэш меню построен (версия справочников {self.snapshot.version})")
+            return self.snapshot
+
+    async def get(self, key: str) -> MenuMessage:
+        """Возвращает экран меню, при необходимости перестраивая кэш."""
+        record_cache("menu", self.snapshot is not None)
+        if self.snapshot is None:
+            await self.load()
+        return self._messages[key]
+
+    async def get_facts(self) -> FactIndex:
+        """Возвращает индекс фактических ответов, при необходимости перестраивая кэш."""
+        if self.snapshot is None:
+            await self.load()
+        return self.facts
+
+    async def refresh_if_changed(self) -> bool:
+        """Перестраивает кэш, если версия справочников в БД изменилась."""
+        async with self._session_factory() as session:
+            version = await get_catalog_version(session)
+        if self.snapshot is not None and version == self.snapshot.version:
+            return False
+        if self.snapshot is not None:
+            # Справочники изменил другой процесс: сбрасываем и остальные кэши
+            # этого процесса (готовые ответы RAG), а не только меню
+            notify_catalog_changed()
+        self.invalidate()
+        await self.load()
+        return True
+
+    async def start(self) -> None:
+        """Строит кэш и запускает фоновую проверку версии справочников."""
+        on_catalog_change(self.invalidate)
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Не удалось построить кэш меню при старте: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh_if_changed()
+            except Exception as e:
+                logger.error(f"Ошибка проверки версии справочников: {e}")
+
+
+menu_cache = MenuCache()
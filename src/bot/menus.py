@@ -0,0 +1,106 @@
+"""Отрисовка экранов меню бота по снимку справочников."""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable
+
+from app import models
+
+from .keyboards import back_to_menu_keyboard
+
+CONTACTS_TEXT = """
+📞 **Контактная информация**
+
+🏢 **Приёмная комиссия ALT University**
+
+📧 **Email:** admissions@alt.university
+📱 **Телефон:** +7 (495) 123-45-67
+🌐 **Сайт:** https://alt.university
+
+📍 **Адрес:**
+г. Москва, ул. Университетская, д. 1
+
+🕐 **Часы работы приёмной комиссии:**
+Пн-Пт: 09:00 - 18:00
+Сб: 10:00 - 15:00
+Вс: выходной
+
+📋 **Личный кабинет абитуриента:**
+https://cabinet.alt.university
+"""
+
+
+@dataclass
+class MenuMessage:
+    """Готовое к отправке сообщение меню."""
+    text: str
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+
+
+def format_cost(cost) -> str:
+    return f"{cost:,} руб.".replace(",", " ") if cost else "бесплатно"
+
+
+def render_programs(programs: Iterable[models.Program]) -> MenuMessage:
+    programs = sorted(programs, key=lambda p: p.name)
+    if not programs:
+        return MenuMessage("Информация о программах пока не добавлена.")
+
+    response_text = "🎓 **Наши программы:**\n\n"
+    for p in programs:
+        response_text += f"• **{p.name}** - {format_cost(getattr(p, 'cost', None))}\n"
+        desc_value = getattr(p, 'description', None)
+        if desc_value:
+            response_text += f"  _{desc_value}_\n\n"
+        else:
+            response_text += "\n"
+    return MenuMessage(response_text, {"parse_mode": "Markdown", "reply_markup": back_to_menu_keyboard()})
+
+
+def render_guide(steps: Iterable[models.Step]) -> MenuMessage:
+    steps = sorted(steps, key=lambda s: s.step_number)
+    if not steps:
+        return MenuMessage("Пошаговое руководство пока не добавлено.", {"reply_markup": back_to_menu_keyboard()})
+
+    response_text = "📝 **Пошаговое руководство по подаче документов:**\n\n"
+    for s in steps:
+        response_text += f"**{s.step_number}.** {s.description}\n\n"
+    response_text += "💡 *Рекомендуем следовать шагам последовательно для успешного поступления.*"
+    return MenuMessage(response_text, {"reply_markup": back_to_menu_keyboard()})
+
+
+def render_faq(faqs: Iterable[models.FAQ]) -> MenuMessage:
+    faqs = list(faqs)
+    if not faqs:
+        return MenuMessage("Раздел FAQ пока пуст.", {"reply_markup": back_to_menu_keyboard()})
+
+    response_text = "❓ **Часто задаваемые вопросы:**\n\n"
+    for i, f in enumerate(faqs, 1):
+        response_text += f"**{i}. {f.question}**\n{f.answer}\n\n"
+    response_text += "💬 *Если не нашли ответ на свой вопрос, задайте его мне напрямую!*"
+    return MenuMessage(response_text, {"reply_markup": back_to_menu_keyboard()})
+
+
+def render_documents(documents: Iterable[models.Document]) -> MenuMessage:
+    documents = list(documents)
+    required_docs = [d for d in documents if d.required]
+    optional_docs = [d for d in documents if not d.required]
+    if not required_docs:
+        return MenuMessage(
+            "Список обязательных документов пока не определен.", {"reply_markup": back_to_menu_keyboard()}
+        )
+
+    response_text = "📋 **Необходимые документы для поступления:**\n\n"
+    response_text += "✅ **Обязательные документы:**\n"
+    for i, d in enumerate(required_docs, 1):
+        response_text += f"{i}. {d.name}\n"
+    if optional_docs:
+        response_text += "\n📎 **Дополнительные документы:**\n"
+        for i, d in enumerate(optional_docs, 1):
+            response_text += f"{i}. {d.name}\n"
+    response_text += "\n💡 *Убедитесь, что у вас готовы сканы всех документов в хорошем качестве.*"
+    response_text += "\n\n📧 *Документы можно подать через личный кабинет или принести лично в приёмную комиссию.*"
+    return MenuMessage(response_text, {"reply_markup": back_to_menu_keyboard()})
+
+
+def render_contacts() -> MenuMessage:
+    return MenuMessage(CONTACTS_TEXT, {"reply_markup": back_to_menu_keyboard()})
@@ -0,0 +1,102 @@
+"""Метрики процесса бота: время обработчиков, трассы сообщений, состояние admission control и экспортёр.
+
+У бота нет HTTP-сервера в режиме polling, поэтому ``/metrics`` отдаёт
+отдельный небольшой aiohttp-сервер на ``BOT_METRICS_PORT``. В режиме
+supervisor у каждого воркера свой реестр метрик и свой экспортёр на порту
+``BOT_METRICS_PORT + номер воркера``.
+"""
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+from app.config import settings
+from app.metrics import CONTENT_TYPE, HANDLER_SECONDS, REGISTRY, CallbackMetric
+from app.trace import end_trace, start_trace
+
+from .admission import rag_admission
+
+logger = logging.getLogger(__name__)
+
+CallbackMetric("admissions_rag_in_flight", "Генерации RAG, выполняющиеся сейчас", lambda: rag_admission.in_flight)
+CallbackMetric("admissions_rag_waiting", "Вопросы в очереди на генерацию", lambda: rag_admission.waiting)
+CallbackMetric("admissions_rag_admitted_total", "Вопросы, допущенные к генерации", lambda: rag_admission.admitted, kind="counter")
+CallbackMetric(
+    "admissions_rag_shed_rate_total", "Вопросы, отклонённые по лимиту пользователя",
+    lambda: rag_admission.shed_rate, kind="counter",
+)
+CallbackMetric(
+    "admissions_rag_shed_overload_total", "Вопросы, отклонённые из-за перегрузки",
+    lambda: rag_admission.shed_overload, kind="counter",
+)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: записывает полное время каждого обработчика."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=name)
+
+
+class TraceMiddleware(BaseMiddleware):
+    """Outer-middleware сообщений: начинает трассу до фильтров обработчиков."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        token = start_trace()
+        try:
+            return await handler(event, data)
+        finally:
+            end_trace(token)
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+class MetricsExporter:
+    """HTTP-сервер с единственным маршрутом ``/metrics``."""
+
+    def __init__(self, port: Optional[int] = None, host: Optional[str] = None):
+        self.port = port if port is not None else settings.BOT_METRICS_PORT
+        self.host = host or settings.WEBHOOK_HOST
+        self.port_offset = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        if not self.port or self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", metrics_view)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        port = self.port + self.port_offset
+        await web.TCPSite(self._runner, self.host, port).start()
+        logger.info(f"Метрики бота доступны на http://{self.host}:{port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_exporter = MetricsExporter()
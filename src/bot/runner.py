@@ -3,10 +3,20 @@ import logging
 import sys
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import ErrorEvent
 
+from app.answer_cache import answer_cache
 from app.config import settings
+from app.interaction_log import interaction_writer
+from app.loop_watchdog import loop_watchdog
 from src.bot.handlers import router as main_router
+from src.bot.intents import intent_router
+from src.bot.menu_cache import menu_cache
+from src.bot.metrics import metrics_exporter
+from src.bot.supervisor import run_supervisor
+from src.bot.webhook import run_webhook
 
 # Настройка логирования
 logging.basicConfig(
@@ -19,8 +29,48 @@ async def error_handler(event: ErrorEvent):
     """Обработчик ошибок бота."""
     logger.error(f"Ошибка при обработке обновления {event.update}: {event.exception}")
 
-async def main():
-    """Инициализирует и запускает бота."""
+def create_bot() -> Bot:
+    """Создаёт бота; ``TELEGRAM_API_URL`` направляет запросы на другой сервер Bot API."""
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    return Bot(token=settings.TELEGRAM_BOT_TOKEN, session=session)
+
+def create_dispatcher() -> Dispatcher:
+    """Создаёт диспетчер с роутерами и хуками запуска/остановки."""
+    dp = Dispatcher()
+
+    # Регистрируем обработчик ошибок
+    dp.errors.register(error_handler)
+
+    # Включаем основной роутер
+    dp.include_router(main_router)
+
+    # Фоновая запись взаимодействий: запуск и дренаж очереди при остановке
+    dp.startup.register(interaction_writer.start)
+    dp.shutdown.register(interaction_writer.stop)
+
+    # Отложенная запись готовых ответов в общий кэш
+    dp.shutdown.register(answer_cache.flush)
+
+    # Кэш экранов меню: построение при старте и проверка версии справочников
+    dp.startup.register(menu_cache.start)
+    dp.shutdown.register(menu_cache.stop)
+
+    # Центроиды намерений: вычисляются один раз и кэшируются на диске
+    dp.startup.register(intent_router.start)
+
+    # Экспортёр метрик Prometheus (если задан BOT_METRICS_PORT)
+    dp.startup.register(metrics_exporter.start)
+    dp.shutdown.register(metrics_exporter.stop)
+
+    # Сторож event loop: задержка планирования в метриках, стек блокирующего вызова в логе
+    dp.startup.register(loop_watchdog.start)
+    dp.shutdown.register(loop_watchdog.stop)
+    return dp
+
+def check_settings():
+    """Завершает процесс, если не заданы обязательные ключи."""
     if not settings.TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN не установлен. Бот не может быть запущен.")
         sys.exit(1)
@@ -29,26 +79,33 @@ async def main():
         logger.error("GEMINI_API_KEY не установлен. Бот не может быть запущен.")
         sys.exit(1)
 
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-    dp = Dispatcher()
-
-    # Регистрируем обработчик ошибок
-    dp.errors.register(error_handler)
+async def main():
+    """Инициализирует и запускает бота."""
+    check_settings()
 
-    # Включаем основной роутер
-    dp.include_router(main_router)
+    bot = create_bot()
+    dp = create_dispatcher()
 
-    logger.info("Запуск бота...")
+    logger.info(f"Запуск бота (режим {settings.BOT_MODE})...")
     try:
-        # Начинаем поллинг
-        await dp.start_polling(bot)
+        if settings.BOT_MODE == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            # Поллинг: режим для разработки; снимаем webhook, если он был установлен
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     except Exception as e:
         logger.error(f"Критическая ошибка бота: {e}")
         raise
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if settings.BOT_MODE == "supervisor":
+            # Воркеры форкаются до запуска event loop, поэтому без asyncio.run(main())
+            check_settings()
+            run_supervisor()
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен вручную.")
     except Exception as e:
@@ -0,0 +1,324 @@
+"""Режим супервизора: приём webhook в одном процессе, обработка в N воркерах.
+
+Супервизор загружает снимок векторного индекса (``rag.snapshot``) и форкает
+воркеры до запуска своего event loop: эмбеддинги открыты через mmap и лежат в
+page cache один раз, тексты чанков разделяются copy-on-write (``gc.freeze``
+не даёт сборщику мусора трогать их страницы в воркерах).
+
+Супервизор принимает обновления по HTTP, сразу отвечает 200 и передаёт тело
+запроса воркеру ``chat_id % N`` по pipe. Все обновления одного чата попадают в
+один воркер, а внутри воркера выполняются строго по очереди; разные чаты
+обрабатываются параллельно. Очередь каждого воркера ограничена
+``SUPERVISOR_QUEUE_SIZE``: когда она заполнена или воркер упал, webhook
+отвечает 503, и Telegram повторяет доставку, а не теряет подтверждённое
+обновление. Если воркер падает, супервизор останавливается, чтобы перезапуск
+выполнил systemd/оркестратор.
+"""
+
+import asyncio
+import gc
+import hmac
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from app.config import settings
+
+from .metrics import metrics_exporter
+from .webhook import healthz
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+CHAT_UPDATE_TYPES = ("message", "edited_message", "channel_post", "edited_channel_post", "business_message")
+
+
+def affinity_key(update: Dict[str, Any]) -> int:
+    """Ключ распределения обновления: id чата, иначе id пользователя."""
+    for kind in CHAT_UPDATE_TYPES:
+        if kind in update:
+            return update[kind]["chat"]["id"]
+    callback = update.get("callback_query")
+    if callback:
+        message = callback.get("message") or {}
+        return message.get("chat", {}).get("id", callback["from"]["id"])
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"]["id"]
+    return update.get("update_id", 0)
+
+
+class ChatSerializer:
+    """Выполняет задачи одного чата последовательно, разных чатов — параллельно."""
+
+    def __init__(self):
+        self._tails: Dict[int, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, key: int, job: Callable[[], Any]) -> asyncio.Task:
+        task = asyncio.create_task(self._run_after(self._tails.get(key), job))
+        self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._forget(key, t))
+        return task
+
+    def _forget(self, key: int, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    @staticmethod
+    async def _run_after(previous: Optional[asyncio.Task], job: Callable[[], Any]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await job()
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления в воркере: {e}")
+
+    async def drain(self) -> None:
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+
+def _default_bot() -> Bot:
+    from .runner import create_bot
+    return create_bot()
+
+
+def _default_dispatcher() -> Dispatcher:
+    from .runner import create_dispatcher
+    return create_dispatcher()
+
+
+async def _worker_loop(conn, bot_factory, dispatcher_factory) -> None:
+    bot = bot_factory()
+    dp = dispatcher_factory()
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+
+    loop = asyncio.get_running_loop()
+    inbox: asyncio.Queue = asyncio.Queue()
+    fd = conn.fileno()
+
+    def on_readable():
+        try:
+            while conn.poll():
+                inbox.put_nowait(conn.recv_bytes())
+        except (EOFError, OSError):
+            loop.remove_reader(fd)
+            inbox.put_nowait(None)
+
+    loop.add_reader(fd, on_readable)
+    serializer = ChatSerializer()
+    try:
+        while (body := await inbox.get()) is not None:
+            update = json.loads(body)
+            serializer.submit(affinity_key(update), lambda u=update: dp.feed_raw_update(bot, u))
+        await serializer.drain()
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await bot.session.close()
+
+
+def _worker_main(index, conn, inherited, bot_factory, dispatcher_factory) -> None:
+    # Ctrl+C получает супервизор; воркер завершается, дочитав pipe до конца
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    gc.enable()
+    metrics_exporter.port_offset = index
+    for other in inherited:
+        other.close()
+    asyncio.run(_worker_loop(conn, bot_factory, dispatcher_factory))
+
+
+class Supervisor:
+    """Процесс, принимающий webhook и распределяющий обновления по воркерам."""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        bot_factory: Callable[[], Bot] = _default_bot,
+        dispatcher_factory: Callable[[], Dispatcher] = _default_dispatcher,
+        path: Optional[str] = None,
+        secret: Optional[str] = None,
+        base_url: Optional[str] = None,
+    ):
+        self.workers = workers or settings.BOT_WORKERS or os.cpu_count() or 1
+        self.bot_factory = bot_factory
+        self.dispatcher_factory = dispatcher_factory
+        self.path = path or settings.WEBHOOK_PATH
+        self.secret = secret if secret is not None else settings.WEBHOOK_SECRET
+        self.base_url = base_url
+        self.processes: List[multiprocessing.Process] = []
+        self._writers: List[Any] = []
+        self._queues: List[asyncio.Queue] = []
+        self._dead: Set[int] = set()  # Воркеры, pipe которых закрыт
+        self._tasks: List[asyncio.Task] = []
+        self._stopped: Optional[asyncio.Event] = None
+
+    def start_workers(self) -> None:
+        """Форкает воркеры; вызывается до запуска event loop супервизора."""
+        ctx = multiprocessing.get_context("fork")
+        gc.disable()
+        gc.collect()
+        gc.freeze()
+        try:
+            for i in range(self.workers):
+                reader, writer = ctx.Pipe(duplex=False)
+                process = ctx.Process(
+                    target=_worker_main,
+                    args=(i, reader, list(self._writers) + [writer], self.bot_factory, self.dispatcher_factory),
+                    name=f"bot-worker-{i}",
+                    daemon=True,
+                )
+                process.start()
+                reader.close()
+                self.processes.append(process)
+                self._writers.append(writer)
+        finally:
+            gc.unfreeze()
+            gc.enable()
+        logger.info(f"Запущено воркеров: {self.workers} (pid {[p.pid for p in self.processes]})")
+
+    def stop_workers(self, timeout: float = 30.0) -> None:
+        """Закрывает pipe воркеров и ждёт, пока они дообработают очередь."""
+        for writer in self._writers:
+            writer.close()
+        self._writers = []
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"Воркер {process.name} не завершился за {timeout} с, останавливаем принудительно")
+                process.terminate()
+                process.join()
+        self.processes = []
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401, text="Unauthorized")
+        body = await request.read()
+        try:
+            key = affinity_key(json.loads(body))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return web.Response(status=400, text="Bad update")
+        index = key % self.workers
+        if index in self._dead:
+            return web.Response(status=503, text="Worker unavailable")
+        try:
+            self._queues[index].put_nowait(body)
+        except asyncio.QueueFull:
+            logger.warning(f"Очередь воркера {index} заполнена, обновление отклонено (Telegram повторит)")
+            return web.Response(status=503, text="Overloaded")
+        return web.json_response({})
+
+    async def _send_loop(self, index: int) -> None:
+        # Отправка идёт в пуле потоков, чтобы заполненный pipe не блокировал event loop
+        loop = asyncio.get_running_loop()
+        queue = self._queues[index]
+        writer = self._writers[index]
+        while True:
+            body = await queue.get()
+            try:
+                await loop.run_in_executor(None, writer.send_bytes, body)
+            except OSError as e:
+                # Воркер завершился (BrokenPipeError): новые обновления получат 503,
+                # а уже подтверждённые Telegram из его очереди доставить некуда
+                self._dead.add(index)
+                lost = queue.qsize() + 1
+                while not queue.empty():
+                    queue.get_nowait()
+                    queue.task_done()
+                logger.error(f"Pipe воркера {index} закрыт ({e}), потеряно обновлений: {lost}")
+                self._stopped.set()
+                return
+            finally:
+                queue.task_done()
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(1.0)
+            dead = [p for p in self.processes if not p.is_alive()]
+            self._dead.update(i for i, p in enumerate(self.processes) if not p.is_alive())
+            if dead:
+                logger.error(f"Воркеры завершились: {[(p.name, p.exitcode) for p in dead]}. Останавливаем супервизор.")
+                self._stopped.set()
+                return
+
+    async def _on_startup(self, app: web.Application) -> None:
+        self._stopped = asyncio.Event()
+        self._queues = [asyncio.Queue(maxsize=settings.SUPERVISOR_QUEUE_SIZE) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._send_loop(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._monitor()))
+        if self.base_url:
+            bot = self.bot_factory()
+            try:
+                url = self.base_url.rstrip("/") + self.path
+                await bot.set_webhook(
+                    url,
+                    secret_token=self.secret or None,
+                    allowed_updates=self.dispatcher_factory().resolve_used_update_types(),
+                )
+                logger.info(f"Webhook зарегистрирован: {url}")
+            finally:
+                await bot.session.close()
+
+    async def _on_cleanup(self, app: web.Application) -> None:
+        # Дописываем принятые обновления в pipe и сообщаем воркерам об остановке;
+        # очереди упавших воркеров уже пусты, зависший pipe ограничен таймаутом
+        for index, queue in enumerate(self._queues):
+            if index in self._dead:
+                continue
+            try:
+                await asyncio.wait_for(queue.join(), settings.SUPERVISOR_DRAIN_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logger.error(f"Очередь воркера {index} не отправлена за отведённое время, осталось: {queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for writer in self._writers:
+            writer.close()
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", healthz)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def serve(self) -> None:
+        runner = web.AppRunner(self.build_app())
+        await runner.setup()
+        site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+        await site.start()
+        logger.info(f"Супервизор слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{self.path}")
+        try:
+            await self._stopped.wait()
+        finally:
+            await runner.cleanup()
+
+    def run(self) -> None:
+        """Загружает индекс, форкает воркеры и обслуживает webhook до остановки."""
+        from src.rag.retriever import load_snapshot_index
+
+        if load_snapshot_index() is not None:
+            settings.RAG_INDEX_BACKEND = "snapshot"
+        else:
+            logger.warning("Снимок индекса недоступен: каждый воркер откроет ChromaDB самостоятельно")
+
+        self.start_workers()
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.stop_workers()
+
+
+def run_supervisor() -> None:
+    if not settings.WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL не установлен, режим супервизора недоступен.")
+    Supervisor(base_url=settings.WEBHOOK_URL).run()
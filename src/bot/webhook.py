@@ -0,0 +1,79 @@
+"""Приём обновлений Telegram через webhook.
+
+Обновления принимает встроенный aiohttp-сервер. Каждое обновление
+подтверждается ответом 200 сразу после разбора JSON, а обработка идёт в
+фоновой задаче, поэтому медленные ответы RAG не задерживают Telegram и
+несколько обновлений обрабатываются параллельно. Запросы без правильного
+``WEBHOOK_SECRET`` отклоняются с 401.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+async def healthz(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+def build_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    base_url: Optional[str] = None,
+    path: Optional[str] = None,
+    secret: Optional[str] = None,
+) -> web.Application:
+    """Собирает aiohttp-приложение, принимающее обновления для ``dp``.
+
+    Если задан ``base_url``, при старте приложения webhook регистрируется
+    в Telegram. Хуки ``dp.startup``/``dp.shutdown`` привязываются к жизненному
+    циклу приложения.
+    """
+    path = path or settings.WEBHOOK_PATH
+    secret = secret if secret is not None else settings.WEBHOOK_SECRET
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, handle_in_background=True, secret_token=secret or None
+    ).register(app, path=path)
+    app.router.add_get("/healthz", healthz)
+
+    if base_url:
+        async def register_webhook(bot: Bot) -> None:
+            url = base_url.rstrip("/") + path
+            await bot.set_webhook(
+                url,
+                secret_token=secret or None,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info(f"Webhook зарегистрирован: {url}")
+
+        dp.startup.register(register_webhook)
+
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Запускает HTTP-сервер webhook и работает до отмены."""
+    if not settings.WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL не установлен, режим webhook недоступен.")
+
+    app = build_webhook_app(dp, bot, base_url=settings.WEBHOOK_URL)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook-сервер слушает {settings.WEBHOOK_HOST}:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
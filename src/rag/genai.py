@@ -1,16 +1,29 @@
+import time
+
 import google.genai as genai
-from typing import List
+from google.genai import types
+from typing import AsyncIterator, List
 import logging
 
 from app.config import Settings
+from app.metrics import UPSTREAM_ERRORS, observe_stage, stage
+from app.trace import current_trace
 
 settings = Settings()
 
 logger = logging.getLogger(__name__)
 
+def create_client(base_url: str = "") -> genai.Client:
+    """Создаёт клиент Gemini; ``GEMINI_BASE_URL`` направляет запросы на другой сервер (локальную заглушку)."""
+    http_options = types.HttpOptions(
+        base_url=base_url or settings.GEMINI_BASE_URL or None,
+        timeout=int(settings.GEMINI_TIMEOUT_SECONDS * 1000) or None,
+    )
+    return genai.Client(api_key=settings.GEMINI_API_KEY, http_options=http_options)
+
 # Настраиваем клиент
 try:
-    client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    client = create_client()
     logger.info("Gemini клиент инициализирован успешно")
 except Exception as e:
     logger.error(f"Ошибка инициализации Gemini клиента: {e}")
@@ -34,7 +47,7 @@ SYSTEM_PROMPT = """
 """
 
 USER_PROMPT_TEMPLATE = """
-ВОПРОС ПОЛЬЗОВАТЕЛЯ:
+{{conversation_history}}ВОПРОС ПОЛЬЗОВАТЕЛЯ:
 {{user_question}}
 
 КОНТЕКСТ ИЗ БАЗЫ ЗНАНИЙ:
@@ -47,24 +60,40 @@ USER_PROMPT_TEMPLATE = """
 4) В конце предложи дополнительную помощь или использование кнопок меню
 """
 
+HISTORY_PROMPT_TEMPLATE = """ПРЕДЫДУЩИЕ РЕПЛИКИ (кратко, для понимания уточняющих вопросов):
+{{history}}
+
+"""
+
+# Ответы-заглушки при сбоях генерации (не кэшируются)
+UNAVAILABLE_ANSWER = "Извините, сервис временно недоступен. Пожалуйста, обратитесь в приёмную комиссию напрямую."
+EMPTY_ANSWER = "Извините, не удалось получить ответ. Попробуйте переформулировать вопрос."
+ERROR_ANSWER = "Произошла ошибка при обработке запроса. Пожалуйста, попробуйте позже или обратитесь в приёмную комиссию."
+FALLBACK_ANSWERS = frozenset((UNAVAILABLE_ANSWER, EMPTY_ANSWER, ERROR_ANSWER))
+
 # --- Core Functions ---
 
 def llm_answer(prompt: str, model: str = settings.GEMINI_DEFAULT_MODEL) -> str:
     """Генерирует ответ используя указанную модель Gemini."""
     if not client:
         logger.error("Gemini клиент не инициализирован")
-        return "Извините, сервис временно недоступен. Пожалуйста, обратитесь в приёмную комиссию напрямую."
+        return UNAVAILABLE_ANSWER
     
     try:
         # Добавляем системный промпт к каждому вызову
         full_prompt = f"{SYSTEM_PROMPT}\n\n{prompt}"
         
         logger.info(f"Отправляем запрос к модели {model}")
-        r = client.models.generate_content(model=model, contents=full_prompt)
+        with stage("llm"):
+            r = client.models.generate_content(model=model, contents=full_prompt)
         
+        trace = current_trace()
+        if trace is not None:
+            trace.record_llm(model, getattr(r, "usage_metadata", None))
+
         if not r or not r.text:
             logger.warning("Модель вернула пустой ответ")
-            return "Извините, не удалось получить ответ. Попробуйте переформулировать вопрос."
+            return EMPTY_ANSWER
             
         logger.info("Ответ от модели получен успешно")
         return r.text
@@ -72,7 +101,48 @@ def llm_answer(prompt: str, model: str = settings.GEMINI_DEFAULT_MODEL) -> str:
     except Exception as e:
         # Базовая обработка ошибок
         logger.error(f"Ошибка при генерации ответа: {e}")
-        return f"Произошла ошибка при обработке запроса. Пожалуйста, попробуйте позже или обратитесь в приёмную комиссию."
+        UPSTREAM_ERRORS.inc(service="gemini_generate")
+        return ERROR_ANSWER
+
+async def llm_answer_stream(prompt: str, model: str = settings.GEMINI_DEFAULT_MODEL) -> AsyncIterator[str]:
+    """Генерирует ответ по частям через асинхронный клиент Gemini.
+
+    Если модель недоступна или упала до первой части, отдаёт одну из
+    заглушек ``FALLBACK_ANSWERS``. Ошибка посреди ответа пробрасывается —
+    вызывающий сам решает, что делать с уже отправленной частью.
+    """
+    if not client:
+        logger.error("Gemini клиент не инициализирован")
+        yield UNAVAILABLE_ANSWER
+        return
+
+    full_prompt = f"{SYSTEM_PROMPT}\n\n{prompt}"
+    produced = False
+    started = time.perf_counter()
+    trace = current_trace()
+    try:
+        logger.info(f"Отправляем потоковый запрос к модели {model}")
+        stream = await client.aio.models.generate_content_stream(model=model, contents=full_prompt)
+        async for chunk in stream:
+            # Число токенов приходит в последней части ответа
+            if trace is not None and getattr(chunk, "usage_metadata", None) is not None:
+                trace.record_llm(model, chunk.usage_metadata)
+            if chunk and chunk.text:
+                produced = True
+                yield chunk.text
+    except Exception as e:
+        logger.error(f"Ошибка при потоковой генерации ответа: {e}")
+        UPSTREAM_ERRORS.inc(service="gemini_generate")
+        if produced:
+            raise
+        yield ERROR_ANSWER
+        return
+    # Включает и время, пока потребитель обрабатывал части ответа
+    observe_stage("llm", time.perf_counter() - started)
+
+    if not produced:
+        logger.warning("Модель вернула пустой ответ")
+        yield EMPTY_ANSWER
 
 def embed_texts(texts: List[str], model: str = settings.GEMINI_EMBEDDING_MODEL) -> List[List[float]]:
     """Векторизует список текстов используя указанную модель эмбеддингов."""
@@ -82,7 +152,8 @@ def embed_texts(texts: List[str], model: str = settings.GEMINI_EMBEDDING_MODEL)
     
     try:
         logger.info(f"Векторизация {len(texts)} текстов с помощью модели {model}")
-        r = client.models.embed_content(model=model, contents=texts)
+        with stage("embed"):
+            r = client.models.embed_content(model=model, contents=texts)
         
         if not r or not r.embeddings:
             logger.warning("Модель вернула пустые эмбеддинги")
@@ -106,4 +177,5 @@ def embed_texts(texts: List[str], model: str = settings.GEMINI_EMBEDDING_MODEL)
         
     except Exception as e:
         logger.error(f"Ошибка при векторизации: {e}")
+        UPSTREAM_ERRORS.inc(service="gemini_embed")
         return []
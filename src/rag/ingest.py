@@ -1,4 +1,5 @@
 import chromadb
+import datetime
 import json
 from pathlib import Path
 from typing import List, Dict, Any
@@ -7,6 +8,7 @@ import logging
 
 from app.config import settings
 from .genai import embed_texts
+from .snapshot import export_snapshot
 from .document_loader import DocumentLoader, LoaderResult
 from app.db import init_db
 
@@ -176,12 +178,22 @@ async def ingest_data():
             metadatas=metadatas,
             ids=ids
         )
+        # Версия индекса: взаимодействия ссылаются на чанки по ID в рамках версии
+        index_version = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        collection.modify(metadata={"index_version": index_version})
+        logger.info(f"Версия индекса: {index_version}")
         logger.info("Индексация данных завершена.")
         logger.info(f"Общее количество элементов в коллекции: {collection.count()}")
     except Exception as e:
         logger.error(f"Ошибка при добавлении в ChromaDB: {e}")
         return
 
+    # 5. Снимок индекса для воркеров бота (RAG_INDEX_BACKEND=snapshot)
+    try:
+        export_snapshot(collection)
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки снимка индекса: {e}")
+
 # Алиас для обратной совместимости
 ingest_documents = ingest_data
 
@@ -1,12 +1,14 @@
 import logging
-from typing import List
+from typing import List, Optional
 
 import chromadb
 
 from app.config import settings
+from app.metrics import EMPTY_RETRIEVALS, PROMPT_CHARS, UPSTREAM_ERRORS, stage
 from app.schemas import RAGContext
 
-from .genai import USER_PROMPT_TEMPLATE, embed_texts
+from .genai import HISTORY_PROMPT_TEMPLATE, USER_PROMPT_TEMPLATE, embed_texts
+from .snapshot import SnapshotIndex, export_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +16,7 @@ logger = logging.getLogger(__name__)
 # Предполагается, что индекс уже создан скриптом ingest.py
 client = None
 collection = None
+snapshot_index: Optional[SnapshotIndex] = None
 
 def get_collection():
     """Получает коллекцию ChromaDB с повторными попытками"""
@@ -46,17 +49,93 @@ def get_collection():
             logger.error(f"Критическая ошибка ChromaDB: {e2}")
             return None
 
-def retrieve_context(query: str) -> List[RAGContext]:
-    """Получает релевантный контекст из векторного хранилища на основе запроса."""
-    collection = get_collection()
+def load_snapshot_index(export_missing: bool = True) -> Optional[SnapshotIndex]:
+    """Загружает снимок индекса, при отсутствии выгружая его из ChromaDB."""
+    global snapshot_index
+
+    if snapshot_index is not None:
+        return snapshot_index
+
+    try:
+        snapshot_index = SnapshotIndex.load()
+    except FileNotFoundError:
+        if not export_missing or get_collection() is None:
+            logger.error(f"Снимок индекса не найден: {settings.RAG_SNAPSHOT_DIR}")
+            return None
+        logger.info("Снимок индекса не найден, выгружаем из ChromaDB...")
+        export_snapshot(get_collection())
+        snapshot_index = SnapshotIndex.load()
+    except Exception as e:
+        logger.error(f"Ошибка загрузки снимка индекса: {e}")
+        return None
+    return snapshot_index
+
+def get_search_index():
+    """Возвращает индекс для поиска: коллекцию ChromaDB или снимок (``RAG_INDEX_BACKEND``)."""
+    if settings.RAG_INDEX_BACKEND == "snapshot":
+        return load_snapshot_index()
+    return get_collection()
+
+def get_index_version() -> Optional[str]:
+    """Возвращает версию индекса, записанную ingest.py в метаданные коллекции."""
+    collection = get_search_index()
+    if not collection:
+        return None
+    return (collection.metadata or {}).get("index_version")
+
+def _contexts_from_results(results, row: int = 0) -> List[RAGContext]:
+    """Отбирает релевантные чанки из строки ``row`` результата ``collection.query``."""
+    contexts = []
+    if results and results.get("ids"):
+        ids_list = results["ids"]
+        if ids_list and len(ids_list) > row and ids_list[row]:
+            for i in range(len(ids_list[row])):
+                # Безопасное получение distance
+                distance = 1.0
+                distances = results.get("distances")
+                if distances and len(distances) > row and distances[row] and len(distances[row]) > i:
+                    distance = distances[row][i]
+                
+                # Chroma использует косинусное расстояние, поэтому 1 - distance = косинусное сходство
+                similarity = 1 - distance
+
+                if similarity >= settings.RAG_RELEVANCE_THRESHOLD:
+                    # Безопасное получение metadata
+                    metadata = {}
+                    metadatas = results.get("metadatas")
+                    if metadatas and len(metadatas) > row and metadatas[row] and len(metadatas[row]) > i:
+                        metadata = metadatas[row][i] or {}
+                    
+                    source = str(metadata.get("source", "unknown"))
+                    
+                    # Безопасное получение текста документа
+                    text = ""
+                    documents = results.get("documents")
+                    if documents and len(documents) > row and documents[row] and len(documents[row]) > i:
+                        text = documents[row][i] or ""
+                
+                    contexts.append(RAGContext(
+                        source=source,
+                        text=text,
+                        score=similarity,
+                        chunk_id=ids_list[row][i]
+                    ))
+    return contexts
+
+def retrieve_context(query: str, query_embedding: Optional[List[float]] = None) -> List[RAGContext]:
+    """Получает релевантный контекст из векторного хранилища на основе запроса.
+
+    Если эмбеддинг запроса уже вычислен (``query_embedding``), повторно он не запрашивается.
+    """
+    collection = get_search_index()
     
     if not collection:
-        logger.warning("ChromaDB коллекция недоступна")
+        logger.warning("Векторный индекс недоступен")
         return []
 
     try:
         # 1. Векторизуем запрос пользователя
-        query_embedding = embed_texts([query])
+        query_embedding = [query_embedding] if query_embedding else embed_texts([query])
         if not query_embedding:
             logger.error("Не удалось векторизовать запрос")
             return []
@@ -64,54 +143,25 @@ def retrieve_context(query: str) -> List[RAGContext]:
         # 2. Запрашиваем коллекцию
         try:
             # ChromaDB принимает первый элемент списка эмбеддингов
-            results = collection.query(
-                query_embeddings=query_embedding[0] if query_embedding else [],
-                n_results=settings.RAG_TOP_K,
-                include=["documents", "metadatas", "distances"]  # type: ignore
-            )
+            with stage("search"):
+                results = collection.query(
+                    query_embeddings=query_embedding[0] if query_embedding else [],
+                    n_results=settings.RAG_TOP_K,
+                    include=["documents", "metadatas", "distances"]  # type: ignore
+                )
         except Exception as e:
-            logger.error(f"Ошибка при запросе к ChromaDB: {e}")
+            logger.error(f"Ошибка при запросе к векторному индексу: {e}")
+            UPSTREAM_ERRORS.inc(service="vector_index")
             return []
 
         # 3. Фильтруем и форматируем результаты
-        contexts = []
-        if results and results.get("ids"):
-            ids_list = results["ids"]
-            if ids_list and len(ids_list) > 0 and ids_list[0]:
-                for i in range(len(ids_list[0])):
-                    # Безопасное получение distance
-                    distance = 1.0
-                    distances = results.get("distances")
-                    if distances and len(distances) > 0 and distances[0] and len(distances[0]) > i:
-                        distance = distances[0][i]
-                    
-                    # Chroma использует косинусное расстояние, поэтому 1 - distance = косинусное сходство
-                    similarity = 1 - distance
-
-                    if similarity >= settings.RAG_RELEVANCE_THRESHOLD:
-                        # Безопасное получение metadata
-                        metadata = {}
-                        metadatas = results.get("metadatas")
-                        if metadatas and len(metadatas) > 0 and metadatas[0] and len(metadatas[0]) > i:
-                            metadata = metadatas[0][i] or {}
-                        
-                        source = str(metadata.get("source", "unknown"))
-                        
-                        # Безопасное получение текста документа
-                        text = ""
-                        documents = results.get("documents")
-                        if documents and len(documents) > 0 and documents[0] and len(documents[0]) > i:
-                            text = documents[0][i] or ""
-                    
-                        contexts.append(RAGContext(
-                            source=source,
-                            text=text,
-                            score=similarity
-                        ))
+        contexts = _contexts_from_results(results)
                     
         logger.info(f"Найдено {len(contexts)} релевантных контекстов для запроса: '{query[:50]}{'...' if len(query) > 50 else ''}'")
         
         # Логируем статистику релевантности
+        if not contexts:
+            EMPTY_RETRIEVALS.inc()
         if contexts:
             max_score = max(ctx.score for ctx in contexts)
             min_score = min(ctx.score for ctx in contexts)
@@ -124,15 +174,64 @@ def retrieve_context(query: str) -> List[RAGContext]:
         logger.error(f"Ошибка при поиске контекста: {e}")
         return []
 
-def construct_prompt(user_question: str, contexts: List[RAGContext]) -> str:
-    """Конструирует финальный промпт для LLM."""
+def retrieve_contexts(queries: List[str], batch_size: Optional[int] = None) -> List[List[RAGContext]]:
+    """Пакетный вариант ``retrieve_context``: контексты для каждого вопроса, в том же порядке.
+
+    Вопросы векторизуются пачками по ``batch_size`` (по умолчанию
+    ``RAG_EMBED_BATCH_SIZE``) и ищутся одним запросом к индексу.
+    Повторяющиеся вопросы обрабатываются один раз. Для вопросов, которые
+    не удалось векторизовать, возвращается пустой список.
+    """
+    batch_size = batch_size or settings.RAG_EMBED_BATCH_SIZE
+    unique = list(dict.fromkeys(q for q in queries if q.strip()))
+    found = {}
+
+    collection = get_search_index()
+    if not collection:
+        logger.warning("Векторный индекс недоступен")
+        unique = []
+
+    # 1. Векторизуем вопросы пачками
+    embedded = []
+    for i in range(0, len(unique), batch_size):
+        batch = unique[i:i + batch_size]
+        embeddings = embed_texts(batch)
+        if len(embeddings) != len(batch):
+            logger.error(f"Не удалось векторизовать пачку вопросов {i // batch_size + 1}")
+            continue
+        embedded.extend((q, e) for q, e in zip(batch, embeddings) if e)
+
+    # 2. Один запрос к индексу на все вопросы
+    if embedded:
+        try:
+            with stage("search"):
+                results = collection.query(
+                    query_embeddings=[e for _, e in embedded],
+                    n_results=settings.RAG_TOP_K,
+                    include=["documents", "metadatas", "distances"]  # type: ignore
+                )
+            for row, (query, _) in enumerate(embedded):
+                found[query] = _contexts_from_results(results, row)
+        except Exception as e:
+            logger.error(f"Ошибка при пакетном запросе к векторному индексу: {e}")
+            UPSTREAM_ERRORS.inc(service="vector_index")
+
+    logger.info(f"Пакетный поиск: {len(queries)} вопросов, {len(unique)} уникальных, найдено для {sum(1 for c in found.values() if c)}")
+    return [list(found.get(q, ())) for q in queries]
+
+def construct_prompt(user_question: str, contexts: List[RAGContext], history: str = "") -> str:
+    """Конструирует финальный промпт для LLM; ``history`` — сводка предыдущих реплик."""
     if not contexts:
         # Если релевантного контекста не найдено, уведомляем об этом LLM
         context_str = "Релевантного контекста в базе знаний не найдено. Сообщите пользователю, что у вас нет информации по этому вопросу, и предложите обратиться в приёмную комиссию напрямую."
     else:
         context_str = "\n---\n".join([f"Источник: {c.source}\nСодержание: {c.text}\nРелевантность: {c.score:.3f}" for c in contexts])
 
-    prompt = USER_PROMPT_TEMPLATE.replace("{{user_question}}", user_question)
+    history_str = HISTORY_PROMPT_TEMPLATE.replace("{{history}}", history) if history else ""
+
+    prompt = USER_PROMPT_TEMPLATE.replace("{{conversation_history}}", history_str)
+    prompt = prompt.replace("{{user_question}}", user_question)
     prompt = prompt.replace("{{context_chunks_with_sources}}", context_str)
+    PROMPT_CHARS.observe(len(prompt))
     
     return prompt
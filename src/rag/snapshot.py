@@ -0,0 +1,146 @@
+"""Снимок векторного индекса только для чтения.
+
+``export_snapshot`` выгружает эмбеддинги коллекции ChromaDB в ``.npy``, а
+тексты чанков и их источники — в ``chunks.json``. ``SnapshotIndex`` открывает
+эмбеддинги через ``np.load(mmap_mode="r")``: страницы файла лежат в page cache
+один раз, сколько бы процессов (воркеров бота) ни читали индекс, а тексты,
+загруженные до ``fork``, разделяются воркерами copy-on-write.
+
+Поиск — полный перебор скалярным произведением (numpy отпускает GIL).
+Расстояния считаются в том же пространстве, что и в коллекции (``hnsw:space``,
+по умолчанию ``l2``), поэтому ``RAG_RELEVANCE_THRESHOLD`` одинаково работает
+для обоих бэкендов. ``query`` возвращает результат в формате
+``collection.query``.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_EMBEDDINGS = "embeddings.npy"
+SNAPSHOT_CHUNKS = "chunks.json"
+
+
+def _replace_atomically(path: Path, write) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def export_snapshot(collection, path: Optional[str] = None) -> Path:
+    """Выгружает коллекцию ChromaDB в каталог снимка."""
+    snapshot_dir = Path(path or settings.RAG_SNAPSHOT_DIR)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    if data["ids"]:
+        embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+    else:
+        embeddings = np.zeros((0, 0), dtype=np.float32)
+    metadata = collection.metadata or {}
+    chunks = {
+        "version": metadata.get("index_version"),
+        "space": metadata.get("hnsw:space", "l2"),
+        "ids": list(data["ids"]),
+        "documents": [doc or "" for doc in data["documents"]],
+        "sources": [str((meta or {}).get("source", "unknown")) for meta in data["metadatas"]],
+    }
+
+    _replace_atomically(snapshot_dir / SNAPSHOT_EMBEDDINGS, lambda f: np.save(f, embeddings))
+    _replace_atomically(
+        snapshot_dir / SNAPSHOT_CHUNKS, lambda f: f.write(json.dumps(chunks, ensure_ascii=False).encode("utf-8"))
+    )
+    logger.info(f"Снимок индекса сохранён в {snapshot_dir}: {len(chunks['ids'])} чанков, версия {chunks['version']}")
+    return snapshot_dir
+
+
+class SnapshotIndex:
+    """Индекс в памяти/mmap с интерфейсом чтения, совместимым с коллекцией ChromaDB."""
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        ids: List[str],
+        documents: List[str],
+        sources: List[str],
+        version: Optional[str] = None,
+        space: str = "l2",
+    ):
+        if embeddings.ndim != 2 or len(embeddings) != len(ids):
+            raise ValueError("Размер матрицы эмбеддингов не совпадает с числом чанков")
+        self.embeddings = embeddings
+        self.ids = ids
+        self.documents = documents
+        self.sources = sources
+        self.version = version
+        self.space = space
+        self.sq_norms = np.einsum("ij,ij->i", embeddings, embeddings)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "SnapshotIndex":
+        snapshot_dir = Path(path or settings.RAG_SNAPSHOT_DIR)
+        embeddings = np.load(snapshot_dir / SNAPSHOT_EMBEDDINGS, mmap_mode="r")
+        chunks = json.loads((snapshot_dir / SNAPSHOT_CHUNKS).read_text(encoding="utf-8"))
+        index = cls(
+            embeddings, chunks["ids"], chunks["documents"], chunks["sources"],
+            version=chunks.get("version"), space=chunks.get("space", "l2"),
+        )
+        logger.info(f"Снимок индекса загружен из {snapshot_dir}: {index.count()} чанков, версия {index.version}")
+        return index
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return {"index_version": self.version}
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def distances(self, embeddings: Sequence) -> np.ndarray:
+        """Матрица расстояний «запрос x чанк»; все запросы — одним умножением матриц."""
+        queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if not self.ids:
+            return np.zeros((len(queries), 0), dtype=np.float32)
+        dots = queries @ self.embeddings.T
+        if self.space == "cosine":
+            norms = np.linalg.norm(queries, axis=1)[:, None] * np.sqrt(self.sq_norms)[None, :]
+            return 1.0 - dots / np.maximum(norms, 1e-12)
+        if self.space == "ip":
+            return 1.0 - dots
+        return self.sq_norms[None, :] + np.einsum("ij,ij->i", queries, queries)[:, None] - 2.0 * dots
+
+    def query(self, query_embeddings, n_results: int = 10, include=None) -> Dict[str, List[list]]:
+        """Находит ``n_results`` ближайших чанков; формат как у ``collection.query``.
+
+        Как и Chroma, принимает один вектор или список векторов — тогда
+        на каждый запрос приходится своя строка результата.
+        """
+        distances = self.distances(query_embeddings)
+        results: Dict[str, List[list]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        k = min(n_results, len(self.ids))
+        for row in distances:
+            top = np.argpartition(row, k - 1)[:k] if k else np.arange(0)
+            top = top[np.argsort(row[top])]
+            results["ids"].append([self.ids[i] for i in top])
+            results["documents"].append([self.documents[i] for i in top])
+            results["metadatas"].append([{"source": self.sources[i]} for i in top])
+            results["distances"].append([float(row[i]) for i in top])
+        return results
+
+
+if __name__ == "__main__":
+    # Пересборка снимка из существующего индекса: python -m src.rag.snapshot
+    logging.basicConfig(level=logging.INFO)
+    from .retriever import get_collection
+
+    export_snapshot(get_collection())
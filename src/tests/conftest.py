@@ -0,0 +1,28 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import models
+from app.answer_cache import answer_cache
+
+
+@pytest.fixture(autouse=True)
+def memory_only_answer_cache(monkeypatch):
+    """Общий кэш ответов в тестах не обращается к рабочей базе."""
+    monkeypatch.setattr(answer_cache, "session_factory", None)
+    answer_cache.clear()
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    """Фикстура с временной SQLite базой данных."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def session_factory(engine):
+    return async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
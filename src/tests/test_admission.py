@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Update
+
+from src.bot.admission import AdmissionController, RagAdmissionMiddleware, Rejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_update(update_id, user_id, text):
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Тест"},
+        },
+    })
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_user_and_refills():
+    """Тестирует лимит частоты на пользователя и пополнение токенов."""
+    clock = FakeClock()
+    controller = AdmissionController(user_burst=2, user_rate_per_minute=6, clock=clock)
+
+    for _ in range(2):
+        async with controller.admit(1):
+            pass
+    with pytest.raises(Rejected) as exc:
+        async with controller.admit(1):
+            pass
+    assert exc.value.reason == "rate"
+    assert exc.value.retry_after == pytest.approx(10.0)
+
+    # Другой пользователь не затронут, а через 10 секунд появляется новый токен
+    async with controller.admit(2):
+        pass
+    clock.now = 10.0
+    async with controller.admit(1):
+        pass
+    assert controller.stats()["shed_rate"] == 1
+
+
+@pytest.mark.asyncio
+async def test_global_limit_sheds_when_queue_is_full_or_wait_is_too_long():
+    """Тестирует общий лимит генераций и сброс нагрузки."""
+    controller = AdmissionController(max_concurrency=1, max_queue=1, max_wait_seconds=0.05, user_burst=10)
+    release = asyncio.Event()
+
+    async def hold(user_id):
+        async with controller.admit(user_id):
+            await release.wait()
+
+    running = asyncio.create_task(hold(1))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(hold(2))
+    await asyncio.sleep(0)
+    assert controller.stats()["waiting"] == 1
+
+    # Очередь заполнена — отказ сразу
+    with pytest.raises(Rejected) as exc:
+        async with controller.admit(3):
+            pass
+    assert exc.value.reason == "overload"
+
+    # Ожидающий запрос не дождался слота
+    with pytest.raises(Rejected):
+        await waiting
+
+    release.set()
+    await running
+    assert controller.stats() == {"in_flight": 0, "waiting": 0, "admitted": 1, "shed_rate": 0, "shed_overload": 2}
+
+
+@pytest.mark.asyncio
+async def test_middleware_only_limits_rag_handlers(monkeypatch):
+    """Тестирует, что слот занимает только генерация, а меню и ответы без LLM не отклоняются."""
+    controller = AdmissionController(max_concurrency=1, max_queue=0, user_burst=10)
+    release = asyncio.Event()
+    handled = []
+    rejected = []
+    router = Router()
+    middleware = RagAdmissionMiddleware(controller)
+    router.message.middleware(middleware)
+
+    async def reply_rejected(message, user_id, rejection):
+        rejected.append((user_id, rejection.reason))
+
+    monkeypatch.setattr(middleware, "_reply_rejected", reply_rejected)
+
+    @router.message(F.text == "menu")
+    async def menu(message):
+        handled.append("menu")
+
+    @router.message(F.text, flags={"rag": True})
+    async def rag(message):
+        if message.text == "из кэша":
+            handled.append("cached")
+            return
+        async with controller.generation_slot(message.from_user.id):
+            handled.append("rag")
+            await release.wait()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot("42:TEST")
+
+    slow = asyncio.create_task(dp.feed_update(bot, make_update(1, 1, "вопрос")))
+    while not handled:
+        await asyncio.sleep(0.01)
+    await asyncio.wait_for(dp.feed_update(bot, make_update(2, 2, "menu")), 1)
+    await asyncio.wait_for(dp.feed_update(bot, make_update(3, 3, "из кэша")), 1)
+    await asyncio.wait_for(dp.feed_update(bot, make_update(4, 4, "другой вопрос")), 1)
+    assert handled == ["rag", "menu", "cached"]
+    assert rejected == [(4, "overload")]
+    assert controller.stats()["in_flight"] == 1
+
+    release.set()
+    await slow
+    await bot.session.close()
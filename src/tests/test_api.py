@@ -6,6 +6,8 @@ import asyncio
 # Для работы тестов необходимо настроить python path
 # Можно запускать с помощью `python -m pytest` из корневой директории
 from src.app.main import app
+from app.catalog import CatalogSnapshot
+from app.catalog_http import catalog_responses
 
 client = TestClient(app)
 
@@ -22,18 +24,11 @@ def test_cors_headers():
 
 @pytest.mark.asyncio
 async def test_programs_endpoint():
-    """Тестирует эндпоинт /programs с мокированной БД."""
-    with patch('src.app.routers.programs.get_db') as mock_get_db:
-        # Мокируем сессию БД
-        mock_session = AsyncMock()
-        mock_get_db.return_value.__aenter__.return_value = mock_session
-        
-        # Мокируем результат запроса
-        mock_result = AsyncMock()
-        mock_result.scalars.return_value.all.return_value = []
-        mock_session.execute.return_value = mock_result
-        
+    """Тестирует эндпоинт /programs с мокированным снимком справочников."""
+    with patch('app.catalog_http.load_catalog_snapshot', AsyncMock(return_value=CatalogSnapshot())):
+        catalog_responses.invalidate()
         response = client.get("/programs/")
+        catalog_responses.invalidate()
         assert response.status_code == 200
         assert response.json() == []
 
@@ -0,0 +1,67 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from src.app.main import app
+from app.answer_cache import AnswerCache
+from app.schemas import RAGContext
+
+client = TestClient(app)
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def fake_stream(*parts, fail=False):
+    async def stream(prompt):
+        for part in parts:
+            yield part
+        if fail:
+            raise RuntimeError("connection reset")
+    return stream
+
+
+def test_ask_streams_sources_then_tokens_and_caches():
+    """Тестирует SSE-поток /ask и повторный ответ из кэша."""
+    cache = AnswerCache(maxsize=10, ttl_seconds=60)
+    contexts = [RAGContext(source="costs.txt", text="200 000 руб.", score=0.9, chunk_id="c1")]
+    retrieve = MagicMock(return_value=contexts)
+
+    with patch("app.routers.ask.answer_cache", cache), \
+         patch("app.routers.ask.retrieve_context", retrieve), \
+         patch("app.routers.ask.llm_answer_stream", fake_stream("Стоимость ", "200 000 руб.")):
+        response = client.post("/ask", json={"query": "Сколько стоит обучение?"})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert parse_events(response.text) == [
+            ("sources", [{"source": "costs.txt", "score": 0.9, "chunk_id": "c1"}]),
+            ("token", {"text": "Стоимость "}),
+            ("token", {"text": "200 000 руб."}),
+            ("done", {"cached": False}),
+        ]
+
+        again = parse_events(client.post("/ask", json={"query": "сколько стоит обучение"}).text)
+
+    assert retrieve.call_count == 1
+    assert again[1:] == [("token", {"text": "Стоимость 200 000 руб."}), ("done", {"cached": True})]
+    assert again[0] == ("sources", [{"source": "costs.txt", "score": None, "chunk_id": None}])
+
+
+def test_ask_reports_interrupted_generation_without_caching():
+    cache = AnswerCache(maxsize=10, ttl_seconds=60)
+    contexts = [RAGContext(source="costs.txt", text="...", score=0.9)]
+
+    with patch("app.routers.ask.answer_cache", cache), \
+         patch("app.routers.ask.retrieve_context", return_value=contexts), \
+         patch("app.routers.ask.llm_answer_stream", fake_stream("Стоим", fail=True)):
+        events = parse_events(client.post("/ask", json={"query": "Сколько стоит обучение?"}).text)
+
+    assert [name for name, _ in events] == ["sources", "token", "error"]
+    assert len(cache) == 0
+    assert client.post("/ask", json={"query": ""}).status_code == 422
@@ -0,0 +1,88 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from benchmarks.e2e import (
+    bench_handler, bench_retrieval, build_index, synthetic_corpus, synthetic_queries, temporary_interaction_writer,
+    use_index,
+)
+from benchmarks.fake_genai import FakeGenAIClient, Latency, hash_embedding, install
+from src.rag.genai import SYSTEM_PROMPT, embed_texts, llm_answer, llm_answer_stream
+
+
+def test_fake_client_is_deterministic():
+    """Тестирует, что фальшивый Gemini детерминирован и сохраняет близость текстов."""
+    a = np.array(hash_embedding("стоимость обучения в университете"))
+    b = np.array(hash_embedding("стоимость обучения"))
+    c = np.array(hash_embedding("общежитие для иногородних"))
+    assert np.allclose(a, hash_embedding("Стоимость обучения в университете"))
+    assert a @ b > a @ c
+
+    with install(FakeGenAIClient(dim=32, llm_latency=Latency(1, 0.5, seed=3))) as client:
+        assert len(embed_texts(["один", "два"])[1]) == 32
+        assert llm_answer("промпт") == llm_answer("промпт")
+        assert client.calls == {"embed_content": 1, "generate_content": 2, "generate_content_stream": 0}
+
+
+@pytest.mark.asyncio
+async def test_fake_client_streams_in_chunks():
+    fake = FakeGenAIClient(answer_words=20, words_per_chunk=8)
+    with install(fake):
+        parts = [part async for part in llm_answer_stream("промпт")]
+    assert len(parts) == 3
+    assert "".join(parts) == fake.response(f"{SYSTEM_PROMPT}\n\nпромпт").text
+
+
+def test_e2e_pipeline_on_small_corpus():
+    """Тестирует прогон бенчмарка на маленьком корпусе."""
+    ids, documents, sources = synthetic_corpus(300)
+    with install(FakeGenAIClient(dim=64)):
+        index, ingest = build_index("snapshot", ids, documents, sources)
+        queries = synthetic_queries(documents, 20)
+        with use_index("snapshot", index):
+            retrieval = bench_retrieval(queries)
+            handler = asyncio.run(bench_handler(queries[:10], concurrency=4))
+
+    assert ingest["chunks"] == 300 and ingest["chunks_per_sec"] > 0
+    assert retrieval["count"] == 20 and retrieval["recall_at_5"] > 0.5
+    assert handler["messages"] == 10 and handler["errors"] == 0
+
+
+def test_load_generator_drives_real_dispatcher():
+    """Тестирует прогон синтетических обновлений через диспетчер с фальшивым Bot API."""
+    from aiogram import Bot
+
+    from benchmarks.load import FakeTelegramSession, ReplyTracker, create_load_dispatcher, run_level
+    from app.catalog import CatalogSnapshot
+    from src.bot.handlers import router
+    from src.bot.menu_cache import menu_cache
+
+    ids, documents, sources = synthetic_corpus(200)
+
+    async def scenario():
+        menu_cache.set_snapshot(CatalogSnapshot(version=1))
+        tracker = ReplyTracker()
+        session = FakeTelegramSession(on_request=tracker)
+        bot = Bot(token="42:TEST", session=session)
+        dp = create_load_dispatcher()
+        questions = [q for q, _ in synthetic_queries(documents, 10)]
+        try:
+            async with temporary_interaction_writer():
+                return await run_level(dp, bot, tracker, users=4, questions=questions, messages_per_user=2,
+                                       think_seconds=0.0, ramp_seconds=0.0, user_base=7_000_000), session
+        finally:
+            # Роутер бота подключается только к одному диспетчеру: отсоединяем для других тестов
+            dp.sub_routers.clear()
+            router._parent_router = None
+
+    with install(FakeGenAIClient(dim=64)):
+        index, _ = build_index("snapshot", ids, documents, sources)
+        with use_index("snapshot", index):
+            result, session = asyncio.run(scenario())
+
+    assert result["messages"] == 8
+    assert result["outcomes"]["error"] == 0 and not result["exceptions"]
+    assert result["reply"]["count"] == 8 and result["first_response"]["count"] == 8
+    assert result["loop_lag"]["count"] > 0
+    assert session.calls["SendMessage"] >= 8
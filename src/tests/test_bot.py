@@ -3,7 +3,12 @@ from unittest.mock import AsyncMock, patch, MagicMock
 from aiogram.types import Message, User, Chat, CallbackQuery
 from aiogram.enums import ChatType
 
+from app.answer_cache import answer_cache
+from src.app.answer_cache import AnswerCache
+from src.app.catalog import CatalogSnapshot
 from src.bot.handlers import start_handler, rag_answer_handler, show_programs_handler
+from src.bot.memory import ConversationMemory
+from src.bot.menu_cache import MenuCache
 
 
 @pytest.fixture
@@ -55,24 +60,23 @@ async def test_start_handler(mock_message):
     assert "ALT University" in call_args[0][0]
     assert "reply_markup" in call_args[1]
 
+def make_menu_cache(programs=None, session_factory=None):
+    """Создаёт кэш меню с заданным снимком справочников."""
+    cache = MenuCache(session_factory=session_factory)
+    if programs is not None:
+        cache.set_snapshot(CatalogSnapshot(programs=programs))
+    return cache
+
 @pytest.mark.asyncio
 async def test_show_programs_handler_success(mock_callback_query):
     """Тестирует успешное получение программ."""
-    with patch('src.bot.handlers.AsyncSessionLocal') as mock_session_local:
-        # Настраиваем мок сессии
-        mock_session = AsyncMock()
-        mock_session_local.return_value.__aenter__.return_value = mock_session
-        
-        # Мокируем результат запроса программ
-        mock_program = MagicMock()
-        mock_program.name = "Прикладная информатика"
-        mock_program.cost = 250000
-        mock_program.description = "Описание программы"
-        
-        mock_result = AsyncMock()
-        mock_result.scalars.return_value.all.return_value = [mock_program]
-        mock_session.execute.return_value = mock_result
-        
+    # Мокируем программу из снимка справочников
+    mock_program = MagicMock()
+    mock_program.name = "Прикладная информатика"
+    mock_program.cost = 250000
+    mock_program.description = "Описание программы"
+
+    with patch('src.bot.handlers.menu_cache', make_menu_cache([mock_program])):
         await show_programs_handler(mock_callback_query)
         
         # Проверяем вызовы
@@ -87,28 +91,59 @@ async def test_show_programs_handler_success(mock_callback_query):
 @pytest.mark.asyncio
 async def test_show_programs_handler_empty(mock_callback_query):
     """Тестирует случай отсутствия программ."""
-    with patch('src.bot.handlers.AsyncSessionLocal') as mock_session_local:
-        mock_session = AsyncMock()
-        mock_session_local.return_value.__aenter__.return_value = mock_session
-        
-        # Возвращаем пустой список
-        mock_result = AsyncMock()
-        mock_result.scalars.return_value.all.return_value = []
-        mock_session.execute.return_value = mock_result
-        
+    with patch('src.bot.handlers.menu_cache', make_menu_cache([])):
         await show_programs_handler(mock_callback_query)
         
         call_args = mock_callback_query.message.answer.call_args
         assert "не добавлена" in call_args[0][0]
 
+@pytest.mark.asyncio
+async def test_menu_cache_served_without_db(mock_callback_query):
+    """Тестирует, что повторные нажатия не обращаются к БД, а сброс кэша перестраивает его."""
+    session = AsyncMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__.return_value = session
+    cache = make_menu_cache([], session_factory=session_factory)
+
+    with patch('src.bot.handlers.menu_cache', cache), \
+         patch('src.bot.menu_cache.load_catalog_snapshot', AsyncMock(return_value=CatalogSnapshot(version=2))) as mock_load:
+        await show_programs_handler(mock_callback_query)
+        await show_programs_handler(mock_callback_query)
+        mock_load.assert_not_called()
+
+        cache.invalidate()
+        await show_programs_handler(mock_callback_query)
+        mock_load.assert_called_once()
+        assert cache.snapshot.version == 2
+
+@pytest.mark.asyncio
+async def test_menu_cache_refresh_drops_answers_after_change_elsewhere():
+    """Тестирует сброс кэша ответов бота, когда справочники изменил другой процесс (API)."""
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__.return_value = AsyncMock()
+    cache = make_menu_cache([], session_factory=session_factory)
+    answer_cache.put("Сколько стоит обучение?", "250 000 рублей.")
+
+    with patch('src.bot.menu_cache.get_catalog_version', AsyncMock(return_value=0)):
+        assert not await cache.refresh_if_changed()
+    assert answer_cache.get("Сколько стоит обучение?") is not None
+
+    with patch('src.bot.menu_cache.get_catalog_version', AsyncMock(return_value=1)), \
+         patch('src.bot.menu_cache.load_catalog_snapshot', AsyncMock(return_value=CatalogSnapshot(version=1))):
+        assert await cache.refresh_if_changed()
+    assert cache.snapshot.version == 1
+    assert answer_cache.get("Сколько стоит обучение?") is None
+
 @pytest.mark.asyncio
 async def test_rag_answer_handler_success(mock_message):
     """Тестирует успешную обработку RAG запроса."""
     mock_message.text = "Сколько стоит обучение?"
     
     with patch('src.bot.handlers.retrieve_context') as mock_retrieve, \
+         patch('src.bot.handlers.embed_texts', return_value=[[0.1, 0.2, 0.3]]), \
          patch('src.bot.handlers.construct_prompt') as mock_construct, \
          patch('src.bot.handlers.llm_answer') as mock_llm, \
+         patch('src.bot.handlers.get_index_version', return_value="test"), \
          patch('src.bot.handlers.AsyncSessionLocal') as mock_session_local:
         
         # Настраиваем моки
@@ -132,19 +167,44 @@ async def test_rag_answer_handler_success(mock_message):
         await rag_answer_handler(mock_message)
         
         # Проверяем, что функции были вызваны
-        mock_retrieve.assert_called_once_with("Сколько стоит обучение?")
+        # Эмбеддинг запроса вычисляется один раз и передаётся в поиск
+        mock_retrieve.assert_called_once_with("Сколько стоит обучение?", [0.1, 0.2, 0.3])
         mock_construct.assert_called_once()
         mock_llm.assert_called_once()
         
         # Проверяем, что сообщение о поиске было удалено
         search_message.delete.assert_called_once()
 
+@pytest.mark.asyncio
+async def test_rag_answer_handler_served_from_shared_cache(mock_message):
+    """Тестирует ответ из кэша, заполненного /ask, без поиска и LLM."""
+    mock_message.text = "Сколько стоит обучение?"
+    cache = AnswerCache(maxsize=10, ttl_seconds=60)
+    cache.store("сколько стоит обучение", "250 000 рублей.", ["costs.txt"])
+
+    with patch('src.bot.handlers.answer_cache', cache), \
+         patch('src.bot.handlers.conversation_memory', ConversationMemory()), \
+         patch('src.bot.handlers.embed_texts') as mock_embed, \
+         patch('src.bot.handlers.llm_answer') as mock_llm, \
+         patch('src.bot.handlers.log_interaction') as mock_log:
+        search_message = AsyncMock()
+        mock_message.answer.return_value = search_message
+
+        await rag_answer_handler(mock_message)
+
+    mock_embed.assert_not_called()
+    mock_llm.assert_not_called()
+    search_message.delete.assert_called_once()
+    assert mock_message.answer.call_args.args[0] == "250 000 рублей."
+    assert [c.source for c in mock_log.call_args.args[2]] == ["costs.txt"]
+
 @pytest.mark.asyncio
 async def test_rag_answer_handler_error(mock_message):
     """Тестирует обработку ошибки в RAG handler."""
     mock_message.text = "Тестовый вопрос"
     
     with patch('src.bot.handlers.retrieve_context') as mock_retrieve, \
+         patch('src.bot.handlers.embed_texts', return_value=[]), \
          patch('src.bot.handlers.main_menu_keyboard') as mock_keyboard:
         
         # Симулируем ошибку
@@ -0,0 +1,114 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.app.main import app
+from app import models
+from app.answer_cache import answer_cache
+from app.catalog import CatalogSnapshot, notify_catalog_changed, on_catalog_change
+from app.catalog_http import CatalogResponseCache, catalog_responses
+
+client = TestClient(app)
+
+
+def make_snapshot(version=1):
+    return CatalogSnapshot(
+        version=version,
+        programs=[
+            models.Program(id=i, name=f"Программа {i}", description=None, cost=100 * i)
+            for i in (3, 1, 2, 5, 4)
+        ],
+        steps=[models.Step(id=1, step_number=2, description="Оплата"), models.Step(id=2, step_number=1, description="Заявка")],
+    )
+
+
+@pytest.fixture
+def catalog():
+    load = AsyncMock(return_value=make_snapshot())
+    with patch("app.catalog_http.load_catalog_snapshot", load):
+        catalog_responses.invalidate()
+        yield load
+    catalog_responses.invalidate()
+
+
+def test_catalog_is_served_from_memory_with_etag(catalog):
+    """Тестирует ответы из снимка, ETag и 304 при совпадающем If-None-Match."""
+    response = client.get("/programs/")
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [1, 2, 3, 4, 5]
+    assert response.headers["cache-control"] == "public, max-age=60"
+    etag = response.headers["etag"]
+
+    again = client.get("/programs/", headers={"If-None-Match": f'"other", {etag}'})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+    assert client.get("/programs/2").json()["name"] == "Программа 2"
+    assert client.get("/programs/42").status_code == 404
+    assert [s["step_number"] for s in client.get("/steps/").json()] == [1, 2]
+    assert catalog.await_count == 1
+
+
+def test_keyset_pagination_links_next_page(catalog):
+    first = client.get("/programs/", params={"limit": 2})
+    assert [p["id"] for p in first.json()] == [1, 2]
+    assert 'after=2' in first.headers["link"] and 'rel="next"' in first.headers["link"]
+
+    last = client.get("/programs/", params={"after": 4, "limit": 2})
+    assert [p["id"] for p in last.json()] == [5]
+    assert "link" not in last.headers
+    assert last.headers["etag"] != first.headers["etag"]
+
+    assert [p["id"] for p in client.get("/programs/", params={"skip": 3}).json()] == [4, 5]
+
+
+def test_steps_with_same_number_are_paginated_without_gaps(catalog):
+    """Тестирует, что шаги с одинаковым номером не теряются на границе страницы."""
+    catalog.return_value = CatalogSnapshot(version=1, steps=[
+        models.Step(id=i, step_number=number, description=f"Шаг {i}")
+        for i, number in ((1, 1), (2, 2), (3, 2), (4, 2), (5, 3))
+    ])
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/steps/", params=params)
+        seen += [(s["step_number"], s["id"]) for s in response.json()]
+        if "link" not in response.headers:
+            break
+        next_url = response.headers["link"].split(">")[0].lstrip("<")
+        params = dict(parse_qsl(urlsplit(next_url).query))
+    assert seen == [(1, 1), (2, 2), (2, 3), (2, 4), (3, 5)]
+
+    # Курсор только по номеру шага пропускает все шаги с этим номером
+    assert [s["id"] for s in client.get("/steps/", params={"after": 2}).json()] == [5]
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_rebuilt_after_catalog_change():
+    version = {"value": 1}
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    cache = CatalogResponseCache(session_factory=lambda: session)
+
+    with patch("app.catalog_http.load_catalog_snapshot", AsyncMock(side_effect=lambda s: make_snapshot(version["value"]))) as load, \
+         patch("app.catalog_http.get_catalog_version", AsyncMock(side_effect=lambda s: version["value"])):
+        on_catalog_change(cache.invalidate)
+        await cache.pages("programs")
+        notify_catalog_changed()
+        await cache.pages("programs")
+        assert load.await_count == 2
+
+        # Изменение в другом процессе замечается по версии в БД
+        answer_cache.put("Сколько стоит обучение?", "100 руб.")
+        assert not await cache.refresh_if_changed()
+        assert answer_cache.get("Сколько стоит обучение?") is not None
+        version["value"] = 2
+        assert await cache.refresh_if_changed()
+        assert (await cache.pages("programs")) and cache.version == 2
+        # Ответы, построенные по старым справочникам, сброшены вместе со снимком
+        assert answer_cache.get("Сколько стоит обучение?") is None
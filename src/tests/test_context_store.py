@@ -0,0 +1,64 @@
+import json
+from unittest.mock import MagicMock
+
+from src.app.context_store import decode_refs, encode_contexts, resolve_contexts
+from src.app.schemas import RAGContext
+
+CONTEXTS = [
+    RAGContext(source="faqs", text="Прием документов начинается 20 июня " * 20, score=0.91234, chunk_id="chunk_1"),
+    RAGContext(source="programs", text="Прикладная информатика стоит 250000 рублей", score=0.8, chunk_id="chunk_7"),
+]
+
+
+def make_collection(version="v1"):
+    collection = MagicMock()
+    collection.metadata = {"index_version": version}
+    collection.get.return_value = {
+        "ids": ["chunk_7", "chunk_1"],
+        "documents": [CONTEXTS[1].text, CONTEXTS[0].text],
+    }
+    return collection
+
+
+def test_refs_mode_stores_only_references():
+    """Тестирует, что в режиме refs тексты чанков не сохраняются."""
+    contexts_json, blob = encode_contexts(CONTEXTS, "v1", mode="refs")
+
+    assert blob is None
+    assert "20 июня" not in contexts_json
+    assert json.loads(contexts_json) == {"v": "v1", "c": [["chunk_1", 0.9123, "faqs"], ["chunk_7", 0.8, "programs"]]}
+    assert len(contexts_json) < len(encode_contexts(CONTEXTS, "v1", mode="full")[0]) / 5
+
+
+def test_resolve_refs_from_index():
+    """Тестирует восстановление текстов из индекса по ID чанков."""
+    contexts_json, blob = encode_contexts(CONTEXTS, "v1", mode="refs")
+    collection = make_collection()
+
+    resolved = resolve_contexts(contexts_json, blob, collection=collection)
+
+    assert [c.text for c in resolved] == [c.text for c in CONTEXTS]
+    assert [c.chunk_id for c in resolved] == ["chunk_1", "chunk_7"]
+    collection.get.assert_called_once()
+
+
+def test_zlib_mode_roundtrip_without_index():
+    """Тестирует сжатый режим: тексты восстанавливаются без обращения к индексу."""
+    contexts_json, blob = encode_contexts(CONTEXTS, "v1", mode="zlib")
+    collection = make_collection()
+
+    resolved = resolve_contexts(contexts_json, blob, collection=collection)
+
+    assert blob is not None
+    assert [c.text for c in resolved] == [c.text for c in CONTEXTS]
+    collection.get.assert_not_called()
+
+
+def test_legacy_full_format_is_resolved():
+    """Тестирует чтение взаимодействий, записанных в старом формате."""
+    legacy = json.dumps([{"source": "faqs", "text": "Текст", "score": 0.5}], ensure_ascii=False)
+
+    resolved = resolve_contexts(legacy)
+
+    assert resolved[0].text == "Текст"
+    assert decode_refs(legacy) == [(None, 0.5, "faqs")]
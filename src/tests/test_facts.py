@@ -0,0 +1,78 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app import models
+from src.app.catalog import CatalogSnapshot
+from src.bot.facts import FactIndex
+from src.bot.handlers import fact_filter
+
+
+@pytest.fixture
+def facts():
+    return FactIndex(CatalogSnapshot(
+        version=1,
+        programs=[
+            models.Program(id=1, name="Прикладная информатика", description="Разработка ПО", cost=250000),
+            models.Program(id=2, name="Бизнес-информатика", description=None, cost=230000),
+            models.Program(id=3, name="Лингвистика", description="Переводчики", cost=0),
+        ],
+        documents=[
+            models.Document(id=1, name="Паспорт", required=True),
+            models.Document(id=2, name="Аттестат о среднем образовании", required=True),
+            models.Document(id=3, name="Портфолио", required=False),
+        ],
+    ))
+
+
+def test_cost_question_answered_from_catalog(facts):
+    """Тестирует ответ о стоимости с разрешением программы по форме слова."""
+    answer = facts.answer("Сколько стоит обучение на прикладной информатике?")
+    assert "«Прикладная информатика»: 250 000 руб." in answer.text
+
+    # Неоднозначное название — стоимость всех подходящих программ
+    answer = facts.answer("сколько стоит информатика")
+    assert "Прикладная информатика** — 250 000 руб." in answer.text
+    assert "Бизнес-информатика** — 230 000 руб." in answer.text
+
+    assert "бесплатно" in facts.answer("цена лингвистики").text
+
+
+def test_program_and_document_answers(facts):
+    """Тестирует ответы о программе и документах."""
+    answer = facts.answer("Расскажи про программу Лингвистика")
+    assert "**Лингвистика**" in answer.text and "Переводчики" in answer.text
+
+    assert "Да, «Паспорт»" in facts.answer("Нужен ли паспорт?").text
+    assert "дополнительный" in facts.answer("нужно портфолио?").text
+    assert "Обязательные документы" in facts.answer("Какие документы нужны?").text
+
+
+def test_falls_back_to_rag_when_unsure(facts):
+    """Тестирует, что непонятые вопросы уходят в RAG."""
+    assert facts.answer("Сколько стоит общежитие?") is None
+    assert facts.answer("Сколько стоит обучение?") is None
+    assert facts.answer("Какие экзамены на прикладную информатику?") is None
+    assert facts.answer("Какие документы нужны иностранцам?") is None
+
+
+def test_follow_up_uses_previous_questions(facts):
+    """Тестирует уточняющий вопрос о стоимости программы из истории."""
+    answer = facts.answer("а сколько стоит?", previous=["Расскажи про лингвистику"])
+    assert "«Лингвистика»: бесплатно" in answer.text
+    assert facts.answer("а сколько стоит?") is None
+
+
+@pytest.mark.asyncio
+async def test_fact_filter_injects_answer(facts):
+    """Тестирует фильтр, передающий готовый ответ обработчику."""
+    message = MagicMock()
+    message.text = "Сколько стоит лингвистика?"
+    message.from_user.id = 777
+    with patch("src.bot.handlers.menu_cache") as cache:
+        cache.get_facts = AsyncMock(return_value=facts)
+        result = await fact_filter(message)
+        assert "бесплатно" in result["fact"].text
+
+        message.text = "Когда начинается приём документов?"
+        assert await fact_filter(message) is False
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+from app.metrics import UPSTREAM_ERRORS
+from benchmarks.fake_genai import fake_answer, hash_embedding, install
+from benchmarks.gemini_server import Scenario, serve_in_thread
+from src.rag import genai
+from src.rag.genai import ERROR_ANSWER, SYSTEM_PROMPT, embed_texts, llm_answer, llm_answer_stream
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    """Заглушка Gemini и настоящий клиент SDK, направленный на неё через GEMINI_BASE_URL."""
+    monkeypatch.setattr(genai.settings, "GEMINI_API_KEY", "local")
+    with serve_in_thread(Scenario(dim=16, answer_words=20, words_per_chunk=8)) as server:
+        monkeypatch.setattr(genai.settings, "GEMINI_BASE_URL", server.base_url)
+        with install(genai.create_client()):
+            yield server
+
+
+async def collect(prompt):
+    return [part async for part in llm_answer_stream(prompt)]
+
+
+def test_sdk_calls_go_through_stand_in(stand_in):
+    """Тестирует эмбеддинги, генерацию и поток SSE через настоящий SDK."""
+    assert embed_texts(["стоимость обучения", "общежитие"]) == [
+        pytest.approx(hash_embedding("стоимость обучения", 16)),
+        pytest.approx(hash_embedding("общежитие", 16)),
+    ]
+    expected = fake_answer(f"{SYSTEM_PROMPT}\n\nвопрос", 20)
+    assert llm_answer("вопрос") == expected
+
+    parts = asyncio.run(collect("вопрос"))
+    assert len(parts) == 3 and "".join(parts) == expected
+    assert stand_in.stats["batchEmbedContents"]["ok"] == 1
+    assert stand_in.stats["streamGenerateContent"]["ok"] == 1
+
+
+def test_throttling_and_errors_reach_fallbacks(stand_in):
+    """Тестирует, что 429 и 5xx превращаются в заглушки и считаются в метриках."""
+    stand_in.configure(rpm=1, burst=1)
+    errors_before = UPSTREAM_ERRORS.value(service="gemini_generate")
+    assert llm_answer("первый") != ERROR_ANSWER
+    assert llm_answer("второй") == ERROR_ANSWER
+    assert stand_in.stats["generateContent"]["throttled"] == 1
+
+    stand_in.configure(rpm=0, error_rate=1.0)
+    assert asyncio.run(collect("вопрос")) == [ERROR_ANSWER]
+    assert embed_texts(["вопрос"]) == []
+    assert UPSTREAM_ERRORS.value(service="gemini_generate") == errors_before + 2
+
+
+def test_broken_stream_raises_after_first_part(stand_in):
+    """Тестирует обрыв потока посреди ответа: часть отдана, затем исключение."""
+    stand_in.configure(stream_break_rate=1.0)
+    parts = []
+
+    async def consume():
+        async for part in llm_answer_stream("вопрос"):
+            parts.append(part)
+
+    with pytest.raises(Exception):
+        asyncio.run(consume())
+    assert len(parts) == 1
+    assert stand_in.stats["streamGenerateContent"]["broken"] == 1
+
+
+def test_client_timeout_on_hung_request(stand_in, monkeypatch):
+    """Тестирует, что GEMINI_TIMEOUT_SECONDS обрывает зависший запрос."""
+    stand_in.configure(hang_rate=1.0, hang_seconds=1.0)
+    monkeypatch.setattr(genai.settings, "GEMINI_TIMEOUT_SECONDS", 0.2)
+    with install(genai.create_client()):
+        started = time.perf_counter()
+        assert llm_answer("вопрос") == ERROR_ANSWER
+    assert time.perf_counter() - started < 0.9
@@ -0,0 +1,146 @@
+import datetime
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import update
+
+from app import models
+from src.app.answer_cache import AnswerCache
+from src.app.catalog import CatalogSnapshot, bump_catalog_version
+from src.app.text_index import TrigramIndex
+from src.bot.handlers import inline_query_handler
+from src.bot.inline import InlineIndex
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_snapshot(version=1, extra=0):
+    faqs = [
+        models.FAQ(id=1, question="Какова стоимость обучения?", answer="От 200 000 руб. в год."),
+        models.FAQ(id=2, question="Есть ли общежитие?", answer="Да, для иногородних студентов."),
+        models.FAQ(id=3, question="Когда начинается приём документов?", answer="20 июня."),
+    ]
+    faqs += [models.FAQ(id=10 + i, question=f"Вопрос номер {i} о поступлении", answer="Ответ") for i in range(extra)]
+    return CatalogSnapshot(version=version, faqs=faqs)
+
+
+def test_trigram_index_matches_prefixes_and_typos():
+    index = TrigramIndex()
+    index.add("cost", "Какова стоимость обучения?")
+    index.add("dorm", "Есть ли общежитие?")
+
+    assert index.search("стоим")[0][0] == "cost"
+    assert index.search("общежитие есть")[0][0] == "dorm"
+    assert index.search("общижитие")[0][0] == "dorm"
+    assert index.search("экзамены") == []
+
+    index.remove("dorm")
+    assert index.search("общежитие") == []
+
+
+def test_answer_cache_is_bounded_and_expires():
+    clock = FakeClock()
+    cache = AnswerCache(maxsize=2, ttl_seconds=60, clock=clock)
+    cache.put("Сколько стоит общежитие?", "5000 руб.", ["dorm.txt"])
+    cache.put("Где находится университет?", "В Москве.")
+    assert cache.get("сколько стоит  общежитие").answer == "5000 руб."
+
+    cache.put("Есть ли стипендия?", "Да.")
+    assert len(cache) == 2
+    assert cache.get("Где находится университет?") is None
+    assert [a.answer for a in cache.search("общежит")] == ["5000 руб."]
+
+    clock.now = 61
+    assert cache.search("стипенд") == []
+    assert cache.get("Есть ли стипендия?") is None
+
+
+@pytest.mark.asyncio
+async def test_answer_cache_shared_between_processes(session_factory):
+    """Тестирует общий кэш ответов: запись одного процесса читает другой до изменения справочников."""
+    api = AnswerCache(maxsize=10, ttl_seconds=60, session_factory=session_factory)
+    bot = AnswerCache(maxsize=10, ttl_seconds=60, session_factory=session_factory)
+    api.store("Сколько стоит общежитие?", "5000 руб.", ["dorm.txt"])
+    api.store("Есть ли стипендия?", "Да.")
+    # Запись в таблицу идёт в фоне одной пачкой
+    assert await bot.lookup("Есть ли стипендия?") is None
+    await api.flush()
+
+    cached = await bot.lookup("сколько стоит  общежитие")
+    assert (cached.answer, cached.sources) == ("5000 руб.", ["dorm.txt"])
+    # Прочитанный ответ попадает в память процесса и в inline-поиск
+    assert [a.answer for a in bot.search("общежит")] == ["5000 руб."]
+    assert await bot.lookup("Где находится университет?") is None
+
+    async with session_factory() as session:
+        await bump_catalog_version(session)
+        await session.commit()
+    assert await AnswerCache(session_factory=session_factory).lookup("Есть ли стипендия?") is None
+
+    # Ответ, ожидавший записи во время изменения справочников, в таблицу не попадает
+    bot.store("Где находится университет?", "В Москве.")
+    bot.clear()
+    await bot.flush()
+    assert await AnswerCache(session_factory=session_factory).lookup("Где находится университет?") is None
+
+
+@pytest.mark.asyncio
+async def test_answer_cache_expires_in_shared_table(session_factory):
+    """Тестирует TTL записей общей таблицы."""
+    cache = AnswerCache(maxsize=10, ttl_seconds=60, session_factory=session_factory)
+    cache.store("Есть ли стипендия?", "Да.")
+    await cache.flush()
+    async with session_factory() as session:
+        await session.execute(update(models.AnswerCacheEntry).values(
+            created_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=61)
+        ))
+        await session.commit()
+
+    assert await AnswerCache(ttl_seconds=60, session_factory=session_factory).lookup("Есть ли стипендия?") is None
+
+
+def test_inline_index_searches_faqs_and_cached_answers():
+    """Тестирует поиск по FAQ и кэшу ответов и его скорость."""
+    answers = AnswerCache(maxsize=100, ttl_seconds=60)
+    answers.put("Какие стипендии платят студентам?", "Академическая и социальная.")
+    index = InlineIndex(answers)
+    snapshot = make_snapshot(extra=2000)
+
+    results = index.search(snapshot, "стоимость обуч")
+    assert results[0].id == "faq:1"
+    assert "200 000" in results[0].input_message_content.message_text
+
+    assert index.search(snapshot, "стипенди")[0].id.startswith("answer:")
+    assert [r.id for r in index.search(snapshot, "", limit=2)] == ["faq:1", "faq:2"]
+
+    started = time.perf_counter()
+    for _ in range(10):
+        index.search(snapshot, "когда начинается приём")
+    assert (time.perf_counter() - started) / 10 < 0.1
+
+    # Новый снимок справочников перестраивает индекс FAQ
+    assert index.search(make_snapshot(version=2), "вопрос номер") == []
+
+
+@pytest.mark.asyncio
+async def test_inline_handler_answers_without_llm():
+    inline_query = MagicMock()
+    inline_query.query = "общежитие"
+    inline_query.answer = AsyncMock()
+
+    with patch("src.bot.handlers.menu_cache") as cache, \
+         patch("src.bot.handlers.llm_answer") as mock_llm:
+        cache.snapshot = make_snapshot()
+        await inline_query_handler(inline_query)
+
+    results = inline_query.answer.call_args[0][0]
+    assert [r.id for r in results] == ["faq:2"]
+    assert inline_query.answer.call_args[1]["cache_time"] == 300
+    mock_llm.assert_not_called()
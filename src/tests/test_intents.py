@@ -0,0 +1,92 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from src.bot.handlers import rag_answer_handler
+from src.bot.intents import IntentRouter, classify_lexical
+from src.bot.menus import MenuMessage
+
+EXAMPLES = {
+    "faq": ["частые вопросы", "популярные вопросы"],
+    "contacts": ["телефон комиссии", "адрес университета"],
+}
+# Игрушечные эмбеддинги: каждое намерение — своя ось
+VECTORS = {
+    "частые вопросы": [1.0, 0.1, 0.0],
+    "популярные вопросы": [0.9, 0.0, 0.1],
+    "телефон комиссии": [0.0, 1.0, 0.1],
+    "адрес университета": [0.1, 0.9, 0.0],
+}
+
+
+def fake_embed(texts):
+    return [VECTORS[t] for t in texts]
+
+
+def test_lexical_routing_for_short_requests():
+    """Тестирует распознавание коротких запросов экранов меню."""
+    assert classify_lexical("Контакты").intent == "contacts"
+    assert classify_lexical("покажи список документов").intent == "documents"
+    assert classify_lexical("FAQ").intent == "faq"
+    assert classify_lexical("Какие программы есть?").intent == "programs"
+    # Лишние слова или несколько намерений — не уверены
+    assert classify_lexical("документы для иностранцев") is None
+    assert classify_lexical("телефон и список программ") is None
+
+
+def test_centroids_are_cached_and_classify_confidently(tmp_path):
+    """Тестирует построение центроидов, их кэш и порог уверенности."""
+    cache_path = tmp_path / "centroids.npz"
+    embed = MagicMock(side_effect=fake_embed)
+    router = IntentRouter(EXAMPLES, threshold=0.9, margin=0.1, cache_path=str(cache_path), embed=embed)
+    assert router.build()
+    assert embed.call_count == 1
+    # Кэш записан через временный файл, который заменил итоговый
+    assert [p.name for p in tmp_path.iterdir()] == ["centroids.npz"]
+
+    assert router.classify_embedding([1.0, 0.0, 0.0]).intent == "faq"
+    assert router.classify_embedding(np.array([0.05, 1.0, 0.0])).intent == "contacts"
+    # Между намерениями и далеко от обоих — в RAG
+    assert router.classify_embedding([0.7, 0.7, 0.0]) is None
+    assert router.classify_embedding([0.0, 0.0, 1.0]) is None
+
+    # Повторный запуск читает центроиды из кэша без обращения к API
+    cached = IntentRouter(EXAMPLES, threshold=0.9, margin=0.1, cache_path=str(cache_path), embed=embed)
+    assert cached.build()
+    assert embed.call_count == 1
+    assert np.allclose(cached.centroids, router.centroids)
+
+
+def test_failed_embedding_leaves_lexical_only(tmp_path):
+    router = IntentRouter(EXAMPLES, cache_path=str(tmp_path / "c.npz"), embed=lambda texts: [])
+    assert not router.build()
+    assert router.classify_embedding([1.0, 0.0, 0.0]) is None
+
+
+@pytest.mark.asyncio
+async def test_rag_handler_routes_confident_intent_to_menu(tmp_path):
+    """Тестирует, что вопрос, близкий к экрану меню, не доходит до LLM."""
+    router = IntentRouter(EXAMPLES, threshold=0.9, margin=0.1, cache_path=str(tmp_path / "c.npz"), embed=fake_embed)
+    router.build()
+
+    message = MagicMock()
+    message.text = "Где найти ответы на самые популярные вопросы?"
+    message.from_user.id = 4242
+    search_message = AsyncMock()
+    message.answer = AsyncMock(return_value=search_message)
+
+    with patch("src.bot.handlers.intent_router", router), \
+         patch("src.bot.handlers.embed_texts", return_value=[[1.0, 0.05, 0.0]]), \
+         patch("src.bot.handlers.menu_cache") as cache, \
+         patch("src.bot.handlers.llm_answer") as mock_llm, \
+         patch("src.bot.handlers.retrieve_context") as mock_retrieve, \
+         patch("src.bot.handlers.log_interaction"):
+        cache.get = AsyncMock(return_value=MenuMessage("❓ FAQ"))
+        await rag_answer_handler(message)
+
+    cache.get.assert_awaited_once_with("faq")
+    message.answer.assert_awaited_with("❓ FAQ")
+    search_message.delete.assert_awaited_once()
+    mock_retrieve.assert_not_called()
+    mock_llm.assert_not_called()
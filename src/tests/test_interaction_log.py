@@ -0,0 +1,191 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app import models
+from src.app.candidates import CandidateCache, upsert_candidates
+from src.app.interaction_log import InteractionRecord, InteractionWriter
+
+
+def make_record(telegram_id: int, text: str = "Вопрос") -> InteractionRecord:
+    return InteractionRecord(
+        telegram_id=telegram_id,
+        full_name="Тест Пользователь",
+        user_message=text,
+        bot_response="Ответ",
+        contexts_json="[]",
+    )
+
+
+async def count_rows(session_factory, model) -> int:
+    async with session_factory() as session:
+        result = await session.execute(select(func.count()).select_from(model))
+        return result.scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_writer_flushes_batch_on_stop(session_factory, tmp_path):
+    """Тестирует пакетную запись и дренаж очереди при остановке."""
+    writer = InteractionWriter(
+        session_factory=session_factory, batch_size=10, flush_interval_ms=50,
+        spill_path=str(tmp_path / "spill.jsonl"),
+    )
+    await writer.start()
+    for i in range(25):
+        writer.submit(make_record(telegram_id=i % 3, text=f"Вопрос {i}"))
+    await writer.stop()
+
+    assert await count_rows(session_factory, models.Interaction) == 25
+    # Кандидаты создаются один раз на telegram_id
+    assert await count_rows(session_factory, models.Candidate) == 3
+
+
+@pytest.mark.asyncio
+async def test_writer_spills_to_disk_when_queue_full(session_factory, tmp_path):
+    """Тестирует сохранение на диск при переполнении очереди и последующую дозагрузку."""
+    writer = InteractionWriter(
+        session_factory=session_factory, batch_size=10, flush_interval_ms=50,
+        queue_size=2, spill_path=str(tmp_path / "spill.jsonl"),
+    )
+    spill_path = Path(writer.spill_path)
+    assert spill_path.name == f"spill.jsonl.{os.getpid()}"
+    for i in range(5):
+        writer.submit(make_record(telegram_id=42, text=f"Вопрос {i}"))
+
+    lines = spill_path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3
+    assert json.loads(lines[0])["user_message"] == "Вопрос 2"
+
+    await writer.start()
+    await writer.stop()
+
+    assert not spill_path.exists()
+    assert await count_rows(session_factory, models.Interaction) == 5
+
+
+@pytest.mark.asyncio
+async def test_writer_spills_batch_on_db_error(tmp_path):
+    """Тестирует, что записи не теряются при ошибке базы данных."""
+    def broken_session_factory():
+        raise RuntimeError("database is locked")
+
+    writer = InteractionWriter(session_factory=broken_session_factory, spill_path=str(tmp_path / "spill.jsonl"))
+    spill_path = Path(writer.spill_path)
+    writer.submit(make_record(telegram_id=1))
+    await writer.start()
+    await writer.stop()
+
+    assert len(spill_path.read_text(encoding="utf-8").splitlines()) == 1
+
+
+def write_spill(path: Path, *texts: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        for text in texts:
+            f.write(json.dumps(make_record(telegram_id=5, text=text).to_dict(), ensure_ascii=False) + "\n")
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_leftover_replay_files(session_factory, tmp_path):
+    """Тестирует, что оставшиеся после сбоя .replay-файлы дописываются, а не затираются."""
+    base = tmp_path / "spill.jsonl"
+    writer = InteractionWriter(session_factory=session_factory, flush_interval_ms=50, spill_path=str(base))
+    # pid завершившегося процесса
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+
+    write_spill(Path(f"{writer.spill_path}.replay"), "своя прерванная дозагрузка")
+    write_spill(Path(writer.spill_path), "своё переполнение")
+    write_spill(Path(f"{base}.{dead.pid}.replay"), "прерванная дозагрузка завершившегося воркера")
+    write_spill(Path(f"{base}.{dead.pid}"), "переполнение завершившегося воркера")
+    write_spill(Path(f"{base}.replay"), "файл старого формата")
+    # Файл работающего процесса не трогаем
+    alive = Path(f"{base}.{os.getppid()}")
+    write_spill(alive, "чужой живой процесс")
+
+    await writer.start()
+    await writer.stop()
+
+    async with session_factory() as session:
+        messages = (await session.execute(select(models.Interaction.user_message))).scalars().all()
+    assert sorted(messages) == sorted([
+        "своя прерванная дозагрузка", "своё переполнение", "прерванная дозагрузка завершившегося воркера",
+        "переполнение завершившегося воркера", "файл старого формата",
+    ])
+    assert sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("spill")) == [alive.name]
+
+
+@pytest.mark.asyncio
+async def test_replay_moves_failing_batch_to_dead_letter_file(tmp_path):
+    """Тестирует, что пачка, которая не загружается, не повторяется бесконечно."""
+    def broken_session_factory():
+        raise RuntimeError("CHECK constraint failed")
+
+    writer = InteractionWriter(
+        session_factory=broken_session_factory, spill_path=str(tmp_path / "spill.jsonl"), max_replay_attempts=2,
+    )
+    spill_path = Path(writer.spill_path)
+    dead_path = Path(writer.dead_letter_path)
+    write_spill(spill_path, "испорченная запись")
+
+    await writer._replay_spill()
+    assert json.loads(spill_path.read_text(encoding="utf-8"))["replay_attempts"] == 1
+    assert not dead_path.exists()
+
+    await writer._replay_spill()
+    assert not spill_path.exists()
+    [line] = dead_path.read_text(encoding="utf-8").splitlines()
+    assert json.loads(line)["user_message"] == "испорченная запись"
+    assert json.loads(line)["replay_attempts"] == 2
+
+    # Файл .dead не считается файлом переполнения завершившегося процесса
+    await writer._replay_spill()
+    assert dead_path.exists()
+    assert not spill_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_upsert_candidates_is_idempotent(session_factory):
+    """Тестирует, что повторный upsert возвращает те же ID и не создаёт дублей."""
+    async with session_factory() as session:
+        first = await upsert_candidates(session, {1: "Первый", 2: "Второй"})
+        await session.commit()
+    async with session_factory() as session:
+        second = await upsert_candidates(session, {2: "Другое имя", 3: "Третий"})
+        await session.commit()
+
+    assert second[2] == first[2]
+    assert set(second) == {2, 3}
+    assert await count_rows(session_factory, models.Candidate) == 3
+
+
+def test_candidate_cache_evicts_least_recently_used():
+    """Тестирует LRU-вытеснение в кэше кандидатов."""
+    cache = CandidateCache(maxsize=2)
+    cache.put(1, 10)
+    cache.put(2, 20)
+    cache.get(1)
+    cache.put(3, 30)
+
+    found, missing = cache.lookup([1, 2, 3])
+    assert found == {1: 10, 3: 30}
+    assert missing == {2}
+
+
+@pytest.mark.asyncio
+async def test_writer_fills_candidate_cache(session_factory, tmp_path):
+    """Тестирует, что после сброса повторные пользователи разрешаются из кэша."""
+    cache = CandidateCache(maxsize=100)
+    writer = InteractionWriter(
+        session_factory=session_factory, flush_interval_ms=50,
+        spill_path=str(tmp_path / "spill.jsonl"), candidates=cache,
+    )
+    writer.submit(make_record(telegram_id=777))
+    await writer.stop()
+
+    assert cache.get(777) is not None
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.loop_watchdog import LoopWatchdog
+from app.metrics import LOOP_LAG_SECONDS, LOOP_STALLS
+
+
+def blocking_gemini_call():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_logs_stack_of_blocking_call(caplog):
+    """Тестирует, что блокировка event loop попадает в метрики и лог со стеком."""
+    watchdog = LoopWatchdog(interval=0.01, threshold=0.1)
+    lag_before, stalls_before = LOOP_LAG_SECONDS.count(), LOOP_STALLS.value()
+    await watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        with caplog.at_level(logging.WARNING, logger="app.loop_watchdog"):
+            blocking_gemini_call()
+            await asyncio.sleep(0.05)
+    finally:
+        await watchdog.stop()
+
+    assert watchdog.stalls == 1 and LOOP_STALLS.value() == stalls_before + 1
+    assert LOOP_LAG_SECONDS.count() > lag_before
+    messages = [r.getMessage() for r in caplog.records if "Event loop заблокирован" in r.getMessage()]
+    assert len(messages) == 1
+    assert "blocking_gemini_call" in messages[0] and "time.sleep(0.3)" in messages[0]
+
+
+@pytest.mark.asyncio
+async def test_watchdog_quiet_without_blocking(caplog):
+    """Тестирует, что без блокировок сторож только пишет метрику."""
+    watchdog = LoopWatchdog(interval=0.01, threshold=0.1)
+    await watchdog.start()
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.loop_watchdog"):
+            await asyncio.sleep(0.2)
+    finally:
+        await watchdog.stop()
+    assert watchdog.stalls == 0 and not caplog.records
+
+
+@pytest.mark.asyncio
+async def test_watchdog_disabled_by_zero_interval():
+    watchdog = LoopWatchdog(interval=0, threshold=0.1)
+    await watchdog.start()
+    assert watchdog._task is None and watchdog._thread is None
+    await watchdog.stop()
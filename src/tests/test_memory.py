@@ -0,0 +1,66 @@
+from src.bot.memory import ConversationMemory, estimate_tokens
+from src.rag.retriever import construct_prompt
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ring_buffer_keeps_last_turns_and_expires():
+    """Тестирует кольцевой буфер реплик и TTL."""
+    clock = FakeClock()
+    memory = ConversationMemory(max_turns=2, ttl_seconds=60, max_users=10, history_tokens=500, clock=clock)
+
+    for i in range(3):
+        memory.add(1, f"вопрос {i}", "ответ " * 200)
+    turns = memory.recent(1)
+    assert [t.question for t in turns] == ["вопрос 1", "вопрос 2"]
+    assert all(len(t.answer) <= 300 for t in turns)
+
+    clock.now = 61
+    assert memory.recent(1) == []
+    assert len(memory) == 0
+
+
+def test_memory_is_bounded_by_users_and_ttl():
+    """Тестирует вытеснение давно писавших пользователей."""
+    clock = FakeClock()
+    memory = ConversationMemory(max_turns=3, ttl_seconds=100, max_users=3, history_tokens=500, clock=clock)
+
+    for user_id in range(5):
+        clock.now = user_id
+        memory.add(user_id, "вопрос", "ответ")
+    assert len(memory) == 3
+    assert memory.recent(0) == [] and memory.recent(1) == []
+
+    # Реплика продлевает жизнь пользователя, остальные устаревают
+    clock.now = 90
+    memory.add(2, "ещё вопрос", "ответ")
+    clock.now = 150
+    memory.add(5, "вопрос", "ответ")
+    assert len(memory) == 2
+    assert len(memory.recent(2)) == 2
+
+
+def test_summary_and_retrieval_query_fit_token_budget():
+    """Тестирует сводку истории и поисковый запрос для уточняющего вопроса."""
+    memory = ConversationMemory(max_turns=3, ttl_seconds=100, max_users=10, history_tokens=40, clock=FakeClock())
+    memory.add(1, "Расскажи про программу Прикладная информатика", "Программа готовит разработчиков. " * 5)
+    memory.add(1, "Какие экзамены?", "Математика, информатика и русский язык.")
+
+    summary = memory.summary(1)
+    assert estimate_tokens(summary) <= 40
+    assert summary.startswith("Абитуриент: Какие экзамены?")
+
+    query = memory.retrieval_query(1, "а сколько стоит?")
+    assert query == "Расскажи про программу Прикладная информатика\nКакие экзамены?\nа сколько стоит?"
+    assert memory.retrieval_query(2, "а сколько стоит?") == "а сколько стоит?"
+
+    prompt = construct_prompt("а сколько стоит?", [], summary)
+    assert "ПРЕДЫДУЩИЕ РЕПЛИКИ" in prompt
+    assert "Какие экзамены?" in prompt
+    assert "ПРЕДЫДУЩИЕ РЕПЛИКИ" not in construct_prompt("а сколько стоит?", [])
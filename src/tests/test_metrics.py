@@ -0,0 +1,76 @@
+import socket
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+from fastapi.testclient import TestClient
+
+from src.app.main import app
+from app.metrics import HANDLER_SECONDS, Counter, Histogram, Registry, STAGE_SECONDS, stage
+from src.bot.metrics import HandlerMetricsMiddleware, MetricsExporter
+
+client = TestClient(app)
+
+
+def test_registry_renders_prometheus_text():
+    """Тестирует формат exposition: HELP/TYPE, кумулятивные корзины, экранирование."""
+    registry = Registry()
+    errors = Counter("test_errors_total", "Ошибки", ["service"], registry=registry)
+    latency = Histogram("test_seconds", "Время", ["stage"], buckets=(0.1, 1.0), registry=registry)
+    errors.inc(service='gem"ini')
+    errors.inc(2, service='gem"ini')
+    for value in (0.05, 0.5, 3.0):
+        latency.observe(value, stage="llm")
+
+    text = registry.render()
+    assert "# TYPE test_errors_total counter" in text
+    assert 'test_errors_total{service="gem\\"ini"} 3' in text
+    assert 'test_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="llm",le="1"} 2' in text
+    assert 'test_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'test_seconds_count{stage="llm"} 3' in text
+    assert 'test_seconds_sum{stage="llm"} 3.55' in text
+
+    with pytest.raises(ValueError):
+        Counter("test_errors_total", "Дубликат", registry=registry)
+
+
+def test_api_exposes_stage_and_request_metrics():
+    before = STAGE_SECONDS.count(stage="unit_test")
+    with stage("unit_test"):
+        pass
+    assert STAGE_SECONDS.count(stage="unit_test") == before + 1
+
+    client.get("/healthz")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'admissions_stage_seconds_count{stage="unit_test"}' in response.text
+    assert 'admissions_http_request_seconds_count{method="GET",route="/healthz",status="200"}' in response.text
+
+
+@pytest.mark.asyncio
+async def test_bot_exporter_serves_handler_metrics():
+    """Тестирует время обработчиков бота и экспортёр /metrics."""
+    async def answer_question(event, data):
+        return "ok"
+
+    middleware = HandlerMetricsMiddleware()
+    before = HANDLER_SECONDS.count(handler="answer_question")
+    data = {"handler": SimpleNamespace(callback=answer_question)}
+    assert await middleware(answer_question, object(), data) == "ok"
+    assert HANDLER_SECONDS.count(handler="answer_question") == before + 1
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    exporter = MetricsExporter(port=port, host="127.0.0.1")
+    await exporter.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                text = await response.text()
+    finally:
+        await exporter.stop()
+    assert 'admissions_handler_seconds_count{handler="answer_question"}' in text
+    assert "admissions_rag_in_flight 0" in text
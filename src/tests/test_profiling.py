@@ -0,0 +1,133 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from aiogram.filters import CommandObject
+from aiogram.types import Message, User
+from fastapi.testclient import TestClient
+
+from app import profiling
+from app.config import settings
+from app.profiling import Profiler, collapse_stack, profiled
+from src.app.main import app
+from src.bot.handlers import profiling_handler
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    """Отдельный профилировщик во временном каталоге вместо общего."""
+    instance = Profiler(directory=str(tmp_path), sample_rate=0.0, interval=0.001)
+    monkeypatch.setattr(profiling, "profiler", instance)
+    monkeypatch.setattr("app.routers.profiling.profiler", instance)
+    monkeypatch.setattr("src.bot.handlers.profiler", instance)
+    return instance
+
+
+def busy_wait(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_disabled_profiler_does_not_start_thread(profiler):
+    """Тестирует, что при sample_rate=0 обёртка не запускает профилирование."""
+    calls = []
+
+    @profiled("work")
+    def work(x):
+        calls.append(x)
+        return x * 2
+
+    assert work(21) == 42 and calls == [21]
+    assert profiler.sessions == 0 and profiler._thread is None
+
+
+def test_sampled_requests_write_collapsed_stacks(profiler):
+    """Тестирует запись стеков выбранного запроса, включая работу в пуле потоков."""
+    profiler.configure(1.0)
+
+    @profiled("rag_answer_handler")
+    async def handler():
+        await asyncio.to_thread(busy_wait, 0.1)
+
+    asyncio.run(handler())
+    while profiler._wake.is_set() or profiler._stacks:
+        time.sleep(0.01)
+    profiler.flush()
+
+    with open(profiler.path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert profiler.sessions == 1 and profiler.samples > 0
+    assert lines and all(line.startswith("rag_answer_handler;") for line in lines)
+    assert any("busy_wait (tests/test_profiling.py" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profile_files_rotate_by_size(tmp_path):
+    """Тестирует ротацию файла профиля по размеру."""
+    profiler = Profiler(directory=str(tmp_path), max_bytes=200, backups=2)
+    for i in range(5):
+        profiler._stacks[f"root;thread;frame_{i} ({'x' * 150})"] = 1
+        profiler.flush()
+    name = f"profile-{os.getpid()}.collapsed"
+    assert sorted(p.name for p in tmp_path.iterdir()) == [name, f"{name}.1", f"{name}.2"]
+
+
+def test_idle_threads_are_skipped():
+    """Тестирует, что ожидающий поток не попадает в профиль."""
+    event = threading.Event()
+    thread = threading.Thread(target=event.wait)
+    thread.start()
+    try:
+        time.sleep(0.05)
+        frame = sys._current_frames()[thread.ident]
+        assert collapse_stack(frame) is None
+    finally:
+        event.set()
+        thread.join()
+
+
+def test_profiling_endpoint_requires_admin_token(profiler, monkeypatch):
+    """Тестирует включение профилирования через API только с административным токеном."""
+    monkeypatch.setattr(settings, "ADMIN_API_TOKEN", "secret")
+    client = TestClient(app)
+    headers = {"X-Admin-Token": "secret"}
+
+    assert client.put("/profiling/", json={"sample_rate": 0.5}).status_code == 403
+    assert client.put("/profiling/", json={"sample_rate": 2}, headers=headers).status_code == 422
+
+    response = client.put("/profiling/", json={"sample_rate": 0.25, "interval_ms": 10}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["sample_rate"] == 0.25 and response.json()["interval_ms"] == 10
+    assert profiler.sample_rate == 0.25
+    assert client.get("/profiling/", headers=headers).json()["path"] == profiler.path
+
+
+@pytest.mark.asyncio
+async def test_profiling_command_admin_only(profiler, monkeypatch):
+    """Тестирует команду /profiling: только администраторы, включение и выключение."""
+    monkeypatch.setattr(settings, "ADMIN_TELEGRAM_IDS", [1])
+    message = MagicMock(spec=Message)
+    message.answer = AsyncMock()
+
+    message.from_user = User(id=2, is_bot=False, first_name="Гость")
+    await profiling_handler(message, CommandObject(command="profiling", args="1"))
+    assert profiler.sample_rate == 0.0
+    assert "только администраторам" in message.answer.call_args.args[0]
+
+    message.from_user = User(id=1, is_bot=False, first_name="Админ")
+    await profiling_handler(message, CommandObject(command="profiling", args="0.1"))
+    assert profiler.sample_rate == 0.1
+    assert "доля вопросов 0.1" in message.answer.call_args.args[0]
+
+    await profiling_handler(message, CommandObject(command="profiling", args="5"))
+    assert profiler.sample_rate == 0.1
+    assert message.answer.call_args.args[0].startswith("Использование")
+
+    await profiling_handler(message, CommandObject(command="profiling", args="off"))
+    assert profiler.sample_rate == 0.0
+    assert "выключено" in message.answer.call_args.args[0]
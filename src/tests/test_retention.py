@@ -0,0 +1,108 @@
+import base64
+import datetime
+import gzip
+import json
+import zlib
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.future import select
+
+from app import models
+from app.catalog import bump_catalog_version
+from src.app.retention import archive_interactions, purge_answer_cache, table_sizes
+
+
+@pytest.mark.asyncio
+async def test_interaction_indexes_declared(engine):
+    """Тестирует наличие индексов по candidate_id и created_at."""
+    async with engine.connect() as conn:
+        indexes = await conn.run_sync(lambda c: inspect(c).get_indexes("interactions"))
+
+    columns = [tuple(ix["column_names"]) for ix in indexes]
+    assert ("candidate_id", "created_at") in columns
+    assert ("created_at",) in columns
+
+
+@pytest.mark.asyncio
+async def test_archive_moves_only_old_rows(session_factory, tmp_path):
+    """Тестирует перенос старых взаимодействий в сжатый архив."""
+    now = datetime.datetime.utcnow()
+    async with session_factory() as session:
+        session.add_all([
+            models.Interaction(candidate_id=1, user_message=f"Старый {i}", created_at=now - datetime.timedelta(days=200))
+            for i in range(3)
+        ])
+        session.add(models.Interaction(candidate_id=1, user_message="Свежий", created_at=now))
+        await session.commit()
+
+    report = await archive_interactions(
+        older_than_days=90, archive_dir=str(tmp_path / "archive"),
+        batch_size=2, session_factory=session_factory,
+    )
+
+    assert report["archived"] == 3
+    with gzip.open(report["archive_path"], "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert sorted(row["user_message"] for row in archived) == ["Старый 0", "Старый 1", "Старый 2"]
+
+    async with session_factory() as session:
+        result = await session.execute(select(models.Interaction.user_message))
+        assert result.scalars().all() == ["Свежий"]
+
+    sizes = await table_sizes(session_factory)
+    assert sizes["interactions"]["rows"] == 1
+
+
+@pytest.mark.asyncio
+async def test_archive_encodes_contexts_blob(session_factory, tmp_path):
+    """Тестирует архивацию строки со сжатыми текстами контекстов."""
+    blob = zlib.compress("Текст фрагмента".encode("utf-8"))
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=200)
+    async with session_factory() as session:
+        session.add(models.Interaction(candidate_id=1, user_message="Старый", contexts_blob=blob, created_at=old))
+        await session.commit()
+
+    report = await archive_interactions(
+        older_than_days=90, archive_dir=str(tmp_path / "archive"), session_factory=session_factory,
+    )
+
+    assert report["archived"] == 1
+    with gzip.open(report["archive_path"], "rt", encoding="utf-8") as f:
+        (row,) = [json.loads(line) for line in f]
+    assert base64.b64decode(row["contexts_blob"]) == blob
+
+
+@pytest.mark.asyncio
+async def test_archive_without_old_rows_creates_no_file(session_factory, tmp_path):
+    """Тестирует, что пустой запуск не оставляет файлов архива."""
+    report = await archive_interactions(
+        older_than_days=90, archive_dir=str(tmp_path / "archive"), session_factory=session_factory,
+    )
+
+    assert report["archived"] == 0
+    assert report["archive_path"] is None
+    assert list((tmp_path / "archive").iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_purge_answer_cache_drops_expired_and_stale_rows(session_factory):
+    """Тестирует удаление из общего кэша ответов записей с истёкшим TTL и прежней версии справочников."""
+    now = datetime.datetime.utcnow()
+    async with session_factory() as session:
+        await bump_catalog_version(session)
+        session.add_all([
+            models.AnswerCacheEntry(key="свежий", question="Свежий?", answer="Да.", catalog_version=1, created_at=now),
+            models.AnswerCacheEntry(
+                key="старый", question="Старый?", answer="Да.", catalog_version=1,
+                created_at=now - datetime.timedelta(hours=2),
+            ),
+            models.AnswerCacheEntry(key="прежний", question="Прежний?", answer="Да.", catalog_version=0, created_at=now),
+        ])
+        await session.commit()
+
+    assert await purge_answer_cache(ttl_seconds=3600, session_factory=session_factory) == 2
+
+    async with session_factory() as session:
+        result = await session.execute(select(models.AnswerCacheEntry.key))
+        assert result.scalars().all() == ["свежий"]
@@ -0,0 +1,85 @@
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.config import settings
+from app.db import get_db
+from src.app.context_store import encode_contexts
+from src.app.main import app
+from src.app.rollups import RollupRow, apply_rollups, get_stats, rebuild_rollups
+from src.app.schemas import RAGContext
+
+NOW = datetime.datetime(2025, 7, 1, 12, 30)
+
+
+def contexts_json(*sources: str) -> str:
+    contexts = [RAGContext(source=s, text="", score=0.9, chunk_id=f"chunk_{i}") for i, s in enumerate(sources)]
+    return encode_contexts(contexts, "v1", mode="refs")[0]
+
+
+ROWS = [
+    RollupRow(1, NOW, contexts_json("faqs", "programs")),
+    RollupRow(1, NOW - datetime.timedelta(hours=1), contexts_json("faqs")),
+    RollupRow(2, NOW, contexts_json()),
+    RollupRow(2, NOW - datetime.timedelta(days=1), contexts_json("faqs")),
+]
+
+
+@pytest.mark.asyncio
+async def test_rollups_are_incremental(session_factory):
+    """Тестирует, что агрегаты по двум пачкам совпадают с агрегатами по одной."""
+    async with session_factory() as session:
+        await apply_rollups(session, ROWS[:2])
+        await apply_rollups(session, ROWS[2:])
+        await session.commit()
+
+    async with session_factory() as session:
+        stats = await get_stats(session, now=NOW)
+
+    assert stats["today"]["messages"] == 3
+    assert stats["today"]["unique_candidates"] == 2
+    assert stats["today"]["no_context"] == 1
+    assert stats["hourly"][-1]["messages"] == 2
+    assert stats["hourly"][-1]["unique_candidates"] == 2
+    assert stats["daily"][-2]["messages"] == 1
+    assert stats["top_sources"] == [{"source": "faqs", "hits": 2}, {"source": "programs", "hits": 1}]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_incremental(session_factory):
+    """Тестирует пересчёт агрегатов с нуля по таблице взаимодействий."""
+    async with session_factory() as session:
+        session.add_all([
+            models.Interaction(candidate_id=r.candidate_id, created_at=r.created_at, contexts_json=r.contexts_json)
+            for r in ROWS
+        ])
+        await session.commit()
+
+    assert await rebuild_rollups(session_factory) == 4
+    async with session_factory() as session:
+        stats = await get_stats(session, now=NOW)
+
+    assert stats["today"]["messages"] == 3
+    assert stats["today"]["unique_candidates"] == 2
+
+
+def test_stats_endpoint_requires_admin_token(session_factory, monkeypatch):
+    """Тестирует доступ к /stats только с административным токеном."""
+    monkeypatch.setattr(settings, "ADMIN_API_TOKEN", "secret")
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        client = TestClient(app)
+        assert client.get("/stats/").status_code == 403
+        response = client.get("/stats/", headers={"X-Admin-Token": "secret"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert len(response.json()["hourly"]) == 24
@@ -0,0 +1,77 @@
+from unittest.mock import MagicMock, patch
+
+import chromadb
+import numpy as np
+from fastapi.testclient import TestClient
+
+from src.app.main import app
+from app.schemas import RAGContext
+from src.rag.retriever import retrieve_context, retrieve_contexts
+from src.rag.snapshot import SnapshotIndex, export_snapshot
+
+client = TestClient(app)
+
+# Вопросы и игрушечные эмбеддинги: каждый вопрос смотрит на «свой» чанк
+VECTORS = {
+    "стоимость": [1.0, 0.0, 0.0],
+    "общежитие": [0.0, 1.0, 0.0],
+    "документы": [0.0, 0.0, 1.0],
+}
+
+
+def make_collection(name):
+    collection = chromadb.EphemeralClient().get_or_create_collection(name, metadata={"hnsw:space": "cosine"})
+    collection.add(
+        ids=["cost", "dorm", "docs"],
+        embeddings=list(VECTORS.values()),
+        documents=["200 000 руб.", "Есть общежитие", "Паспорт, аттестат"],
+        metadatas=[{"source": "cost.txt"}, {"source": "dorm.txt"}, {"source": "docs.txt"}],
+    )
+    return collection
+
+
+def test_batch_retrieval_matches_single_queries():
+    """Тестирует, что пакетный поиск даёт те же контексты одним запросом к индексу."""
+    collection = make_collection("batch_test")
+    spy = MagicMock(wraps=collection)
+    embed = MagicMock(side_effect=lambda texts: [VECTORS[t] for t in texts])
+    queries = ["документы", "стоимость", "", "документы", "общежитие"]
+
+    with patch("src.rag.retriever.get_search_index", return_value=spy), \
+         patch("src.rag.retriever.embed_texts", embed), \
+         patch("src.rag.retriever.settings.RAG_RELEVANCE_THRESHOLD", 0.5):
+        batch = retrieve_contexts(queries, batch_size=2)
+        assert embed.call_count == 2  # три уникальных вопроса пачками по два
+        assert spy.query.call_count == 1
+        single = [retrieve_context(q) if q else [] for q in queries]
+
+    assert [[c.chunk_id for c in contexts] for contexts in batch] == [["docs"], ["cost"], [], ["docs"], ["dorm"]]
+    assert batch == single
+
+
+def test_snapshot_answers_many_queries_like_chroma(tmp_path):
+    collection = make_collection("batch_snapshot_test")
+    export_snapshot(collection, str(tmp_path))
+    index = SnapshotIndex.load(str(tmp_path))
+
+    queries = np.random.default_rng(1).normal(size=(4, 3)).tolist()
+    expected = collection.query(query_embeddings=queries, n_results=2, include=["documents", "metadatas", "distances"])
+    actual = index.query(queries, n_results=2)
+    assert actual["ids"] == expected["ids"]
+    assert np.allclose(actual["distances"], expected["distances"], rtol=1e-3, atol=1e-6)
+
+
+def test_batch_endpoint_keeps_order_and_limits_size():
+    contexts = [[RAGContext(source="cost.txt", text="200 000 руб.", score=0.9)], []]
+    with patch("app.routers.search.retrieve_contexts", return_value=contexts) as mock_batch:
+        response = client.post("/search/rag/batch", json={"queries": ["стоимость", "погода"]})
+
+    assert response.status_code == 200
+    mock_batch.assert_called_once_with(["стоимость", "погода"])
+    results = response.json()["results"]
+    assert [len(r["contexts"]) for r in results] == [1, 0]
+    assert results[0]["contexts"][0]["source"] == "cost.txt"
+
+    with patch("app.routers.search.settings.RAG_BATCH_MAX_QUERIES", 1):
+        assert client.post("/search/rag/batch", json={"queries": ["a", "b"]}).status_code == 413
+    assert client.post("/search/rag/batch", json={"queries": []}).status_code == 422
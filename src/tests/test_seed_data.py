@@ -0,0 +1,103 @@
+import json
+
+import pytest
+from sqlalchemy.future import select
+
+from app import models
+from app.catalog import get_catalog_version, on_catalog_change
+from src.app.seed_data import load_seed_data_to_db
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+async def program_costs(engine):
+    async with engine.connect() as conn:
+        result = await conn.execute(select(models.Program.name, models.Program.cost).order_by(models.Program.id))
+        return result.all()
+
+
+@pytest.mark.asyncio
+async def test_seed_is_idempotent_and_reapplies_changes(engine, tmp_path):
+    """Тестирует пропуск неизменённых файлов и upsert изменённых."""
+    write_json(tmp_path / "programs.json", [
+        {"id": 1, "name": "Прикладная информатика", "cost": 250000},
+        {"id": 2, "name": "Лингвистика", "cost": 220000},
+    ])
+    write_json(tmp_path / "documents.json", [{"name": "Паспорт"}, {"name": "Фото", "required": False}])
+
+    applied = await load_seed_data_to_db(str(tmp_path), engine=engine)
+    assert applied == {"programs.json": 2, "documents.json": 2}
+
+    # Повторная загрузка без изменений ничего не применяет
+    assert await load_seed_data_to_db(str(tmp_path), engine=engine) == {}
+
+    write_json(tmp_path / "programs.json", [
+        {"id": 1, "name": "Прикладная информатика", "cost": 270000},
+        {"id": 2, "name": "Лингвистика", "cost": 220000},
+        {"id": 3, "name": "Дизайн", "cost": 200000},
+    ])
+    assert await load_seed_data_to_db(str(tmp_path), engine=engine) == {"programs.json": 3}
+
+    assert await program_costs(engine) == [
+        ("Прикладная информатика", 270000), ("Лингвистика", 220000), ("Дизайн", 200000),
+    ]
+    async with engine.connect() as conn:
+        result = await conn.execute(select(models.Document.id, models.Document.required).order_by(models.Document.id))
+        assert result.all() == [(1, True), (2, False)]
+
+
+@pytest.mark.asyncio
+async def test_seed_matches_rows_by_natural_key(engine, tmp_path):
+    """Тестирует сохранение id при перестановке строк и удаление исчезнувших из файла."""
+    write_json(tmp_path / "faqs.json", [
+        {"question": "Сколько стоит обучение?", "answer": "250 000 ₽."},
+        {"question": "Есть ли общежитие?", "answer": "Да."},
+        {"question": "Когда приём документов?", "answer": "С 20 июня."},
+    ])
+    write_json(tmp_path / "steps.json", [
+        {"step_number": 1, "description": "Подать заявление"},
+        {"step_number": 2, "description": "Сдать экзамены"},
+    ])
+    await load_seed_data_to_db(str(tmp_path), engine=engine)
+
+    # Вставка в начало, перестановка, удаление и правка ответа
+    write_json(tmp_path / "faqs.json", [
+        {"question": "Есть ли бюджетные места?", "answer": "Есть."},
+        {"question": "Когда приём документов?", "answer": "С 20 июня по 25 июля."},
+        {"question": "Сколько стоит обучение?", "answer": "250 000 ₽."},
+    ])
+    write_json(tmp_path / "steps.json", [{"step_number": 2, "description": "Сдать вступительные испытания"}])
+    assert await load_seed_data_to_db(str(tmp_path), engine=engine) == {"faqs.json": 3, "steps.json": 1}
+
+    async with engine.connect() as conn:
+        faqs = (await conn.execute(select(models.FAQ.id, models.FAQ.question, models.FAQ.answer).order_by(models.FAQ.id))).all()
+        steps = (await conn.execute(select(models.Step.id, models.Step.step_number, models.Step.description))).all()
+    assert faqs == [
+        (1, "Сколько стоит обучение?", "250 000 ₽."),
+        (3, "Когда приём документов?", "С 20 июня по 25 июля."),
+        (4, "Есть ли бюджетные места?", "Есть."),
+    ]
+    assert steps == [(2, 2, "Сдать вступительные испытания")]
+
+
+@pytest.mark.asyncio
+async def test_catalog_version_bumped_by_seed_and_orm_edits(engine, session_factory, tmp_path):
+    """Тестирует сигнал об изменении справочников при загрузке и правке через ORM."""
+    notifications = []
+    on_catalog_change(lambda: notifications.append(True))
+
+    write_json(tmp_path / "faqs.json", [{"id": 1, "question": "Вопрос?", "answer": "Ответ."}])
+    await load_seed_data_to_db(str(tmp_path), engine=engine)
+    async with session_factory() as session:
+        assert await get_catalog_version(session) == 1
+
+    async with session_factory() as session:
+        faq = await session.get(models.FAQ, 1)
+        faq.answer = "Новый ответ."
+        await session.commit()
+    async with session_factory() as session:
+        assert await get_catalog_version(session) == 2
+
+    assert len(notifications) == 2
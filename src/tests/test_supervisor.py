@@ -0,0 +1,193 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+
+import chromadb
+import numpy as np
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.config import settings
+from src.bot.supervisor import Supervisor, affinity_key
+from src.rag.snapshot import SnapshotIndex, export_snapshot
+
+SECRET = "s3cret"
+
+
+def make_update(update_id, chat_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Тест"},
+        },
+    }
+
+
+def test_snapshot_matches_chroma_results(tmp_path):
+    """Тестирует, что снимок возвращает те же чанки и расстояния, что и ChromaDB."""
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(40, 16)).astype(np.float32)
+    collection = chromadb.EphemeralClient().get_or_create_collection("snapshot_test")
+    collection.add(
+        ids=[f"chunk_{i}" for i in range(40)],
+        embeddings=embeddings.tolist(),
+        documents=[f"текст {i}" for i in range(40)],
+        metadatas=[{"source": f"doc_{i % 3}.txt"} for i in range(40)],
+    )
+    collection.modify(metadata={"index_version": "v1"})
+
+    export_snapshot(collection, str(tmp_path))
+    index = SnapshotIndex.load(str(tmp_path))
+    assert index.count() == 40
+    assert index.metadata == {"index_version": "v1"}
+
+    query = rng.normal(size=16).astype(np.float32).tolist()
+    expected = collection.query(query_embeddings=query, n_results=5, include=["documents", "metadatas", "distances"])
+    actual = index.query(query, n_results=5)
+    assert actual["ids"] == expected["ids"]
+    assert actual["documents"] == expected["documents"]
+    assert actual["metadatas"] == expected["metadatas"]
+    assert np.allclose(actual["distances"][0], expected["distances"][0], rtol=1e-3)
+
+
+def test_affinity_key_uses_chat_then_user():
+    assert affinity_key(make_update(1, 777, "hi")) == 777
+    callback = {"update_id": 2, "callback_query": {
+        "id": "1", "from": {"id": 5}, "chat_instance": "x", "message": {"chat": {"id": 777}},
+    }}
+    assert affinity_key(callback) == 777
+    assert affinity_key({"update_id": 3, "inline_query": {"id": "1", "from": {"id": 5}}}) == 5
+
+
+def test_supervisor_routes_updates_with_chat_affinity():
+    """Тестирует распределение по воркерам с сохранением порядка внутри чата."""
+    results = multiprocessing.get_context("fork").Queue()
+
+    def dispatcher_factory():
+        router = Router()
+
+        @router.message(F.text)
+        async def record(message: Message):
+            # Первое сообщение чата обрабатывается дольше остальных
+            if message.text.endswith(":0"):
+                await asyncio.sleep(0.1)
+            results.put((os.getpid(), message.chat.id, message.text))
+
+        dp = Dispatcher()
+        dp.include_router(router)
+        return dp
+
+    supervisor = Supervisor(
+        workers=2, bot_factory=lambda: Bot("42:TEST"), dispatcher_factory=dispatcher_factory,
+        path="/hook", secret=SECRET,
+    )
+
+    async def post_updates():
+        client = TestClient(TestServer(supervisor.build_app()))
+        await client.start_server()
+        try:
+            response = await client.post("/hook", json=make_update(0, 1, "x"))
+            assert response.status == 401
+            update_id = 0
+            for n in range(5):
+                for chat_id in (1, 2, 3):
+                    update_id += 1
+                    response = await client.post(
+                        "/hook", json=make_update(update_id, chat_id, f"{chat_id}:{n}"),
+                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                    )
+                    assert response.status == 200
+        finally:
+            await client.close()
+
+    supervisor.start_workers()
+    try:
+        asyncio.run(post_updates())
+    finally:
+        supervisor.stop_workers()
+
+    # Воркеры завершаются только после обработки всех принятых обновлений
+    received = [results.get(timeout=5) for _ in range(15)]
+    with pytest.raises(queue.Empty):
+        results.get(timeout=0.1)
+
+    by_chat = {}
+    for pid, chat_id, text in received:
+        by_chat.setdefault(chat_id, []).append((pid, text))
+    for chat_id, items in by_chat.items():
+        assert [text for _, text in items] == [f"{chat_id}:{n}" for n in range(5)]
+        assert len({pid for pid, _ in items}) == 1
+    # Чаты 1 и 3 попадают в один воркер, чат 2 — в другой
+    assert by_chat[1][0][0] == by_chat[3][0][0] != by_chat[2][0][0]
+
+
+class FakePipe:
+    """Конец pipe воркера: отправка ждёт ``release`` или падает, как при завершённом воркере."""
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.release = threading.Event()
+        self.sent = []
+
+    def send_bytes(self, body):
+        if self.broken:
+            raise BrokenPipeError(32, "Broken pipe")
+        self.release.wait(5)
+        self.sent.append(body)
+
+    def close(self):
+        self.release.set()
+
+
+async def post(client, update):
+    return await client.post("/hook", json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+
+
+def test_supervisor_rejects_updates_when_worker_queue_is_full(monkeypatch):
+    """Тестирует 503 при заполненной очереди воркера вместо неограниченного роста."""
+    monkeypatch.setattr(settings, "SUPERVISOR_QUEUE_SIZE", 2)
+    supervisor = Supervisor(workers=1, path="/hook", secret=SECRET)
+    pipe = FakePipe()
+    supervisor._writers = [pipe]
+
+    async def scenario():
+        client = TestClient(TestServer(supervisor.build_app()))
+        await client.start_server()
+        try:
+            statuses = []
+            for update_id in range(4):
+                statuses.append((await post(client, make_update(update_id, 1, "x"))).status)
+                await asyncio.sleep(0.05)
+            assert statuses == [200, 200, 200, 503]
+        finally:
+            pipe.release.set()
+            await client.close()
+
+    asyncio.run(scenario())
+    # Принятые обновления дописаны в pipe до остановки
+    assert len(pipe.sent) == 3
+
+
+def test_supervisor_stops_without_hanging_when_worker_pipe_breaks():
+    """Тестирует, что упавший воркер не подвешивает остановку, а его обновления получают 503."""
+    supervisor = Supervisor(workers=1, path="/hook", secret=SECRET)
+    supervisor._writers = [FakePipe(broken=True)]
+
+    async def scenario():
+        client = TestClient(TestServer(supervisor.build_app()))
+        await client.start_server()
+        try:
+            assert (await post(client, make_update(1, 1, "x"))).status == 200
+            await asyncio.wait_for(supervisor._stopped.wait(), 5)
+            assert (await post(client, make_update(2, 1, "x"))).status == 503
+        finally:
+            await asyncio.wait_for(client.close(), 5)
+
+    asyncio.run(scenario())
+    assert supervisor._dead == {0}
@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiogram.types import Message, User
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+
+from app import models
+from app.metrics import record_cache, stage
+from app.trace import CACHE_FLAGS, current_trace, end_trace, start_trace
+from src.app.db import init_db
+from src.app.interaction_log import InteractionRecord, InteractionWriter
+from src.bot.handlers import rag_answer_handler
+from src.bot.memory import ConversationMemory
+from src.rag.genai import llm_answer
+
+
+def fake_client(text="Ответ"):
+    client = MagicMock()
+    client.models.generate_content.return_value = SimpleNamespace(
+        text=text, usage_metadata=SimpleNamespace(prompt_token_count=812, candidates_token_count=95),
+    )
+    return client
+
+
+@pytest.mark.asyncio
+async def test_trace_collects_stages_tokens_and_cache_hits():
+    """Тестирует сбор трассы, в том числе из пула потоков."""
+    assert current_trace() is None
+    token = start_trace()
+    try:
+        def search():
+            with stage("search"):
+                pass
+
+        await asyncio.to_thread(search)
+        with stage("embed"):
+            pass
+        record_cache("menu", True)
+        record_cache("answer", False)
+        with patch("src.rag.genai.client", fake_client()):
+            assert await asyncio.to_thread(llm_answer, "промпт", "gemini-test") == "Ответ"
+
+        columns = current_trace().columns()
+    finally:
+        end_trace(token)
+
+    assert current_trace() is None
+    assert columns["model"] == "gemini-test"
+    assert (columns["prompt_tokens"], columns["response_tokens"]) == (812, 95)
+    assert columns["cache_flags"] == CACHE_FLAGS["menu"]
+    assert all(isinstance(columns[f"{name}_ms"], int) for name in ("embed", "search", "llm"))
+    assert columns["total_ms"] >= columns["llm_ms"]
+
+
+@pytest.mark.asyncio
+async def test_trace_columns_are_added_and_written(tmp_path):
+    """Тестирует добавление колонок трассы в существующую таблицу и их запись."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    async with engine.begin() as conn:
+        # Таблица взаимодействий в виде до появления трассы
+        await conn.execute(text(
+            "CREATE TABLE interactions (id INTEGER PRIMARY KEY, candidate_id INTEGER, user_message TEXT, "
+            "bot_response TEXT, contexts_json TEXT, contexts_blob BLOB, created_at DATETIME)"
+        ))
+    await init_db(engine)
+    async with engine.connect() as conn:
+        columns = await conn.run_sync(lambda c: {col["name"] for col in inspect(c).get_columns("interactions")})
+    assert {"total_ms", "llm_ms", "model", "prompt_tokens", "cache_flags"} <= columns
+
+    session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    writer = InteractionWriter(
+        session_factory=session_factory, batch_size=10, flush_interval_ms=50,
+        spill_path=str(tmp_path / "spill.jsonl"),
+    )
+    await writer.start()
+    writer.submit(InteractionRecord(
+        telegram_id=1, full_name="Тест", user_message="Вопрос", bot_response="Ответ", contexts_json="[]",
+        trace={"total_ms": 4200, "llm_ms": 3900, "model": "gemini-test", "prompt_tokens": 812, "cache_flags": 0},
+    ))
+    writer.submit(InteractionRecord(
+        telegram_id=2, full_name="Тест", user_message="Меню", bot_response="Ответ", contexts_json="[]",
+    ))
+    await writer.stop()
+
+    async with session_factory() as session:
+        rows = (await session.execute(select(models.Interaction).order_by(models.Interaction.id))).scalars().all()
+    await engine.dispose()
+
+    assert (rows[0].total_ms, rows[0].llm_ms, rows[0].model, rows[0].prompt_tokens) == (4200, 3900, "gemini-test", 812)
+    assert rows[0].embed_ms is None
+    assert rows[1].total_ms is None
+
+
+@pytest.mark.asyncio
+async def test_rag_trace_includes_telegram_send():
+    """Тестирует, что взаимодействие логируется после отправки ответа и total_ms её учитывает."""
+    message = MagicMock(spec=Message)
+    message.text = "Сколько стоит обучение?"
+    message.from_user = User(id=1, is_bot=False, first_name="Тест")
+    search_message = MagicMock()
+    search_message.delete = AsyncMock()
+
+    async def answer(text, **kwargs):
+        if text != "Ищу информацию... 🧠":
+            await asyncio.sleep(0.2)  # Медленный ответ Telegram
+        return search_message
+
+    message.answer = AsyncMock(side_effect=answer)
+    writer = MagicMock()
+    token = start_trace()
+    try:
+        with patch("src.bot.handlers.interaction_writer", writer), \
+             patch("src.bot.handlers.conversation_memory", ConversationMemory()), \
+             patch("src.bot.handlers.embed_texts", return_value=[]), \
+             patch("src.bot.handlers.retrieve_context", return_value=[]), \
+             patch("src.bot.handlers.get_index_version", return_value="test"), \
+             patch("src.bot.handlers.llm_answer", return_value="Ответ"):
+            await rag_answer_handler(message)
+    finally:
+        end_trace(token)
+
+    record = writer.submit.call_args.args[0]
+    assert record.bot_response == "Ответ"
+    assert record.trace["total_ms"] >= 200
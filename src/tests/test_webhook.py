@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.filters import Command
+from aiogram.types import Message
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.bot.handlers import start_handler
+from src.bot.webhook import build_webhook_app
+
+TOKEN = "42:TEST"
+SECRET = "s3cret"
+
+
+class FakeTelegram:
+    """Локальный сервер Bot API, запоминающий вызванные методы."""
+
+    def __init__(self):
+        self.calls = []
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        self.calls.append((method, data))
+        if method == "sendMessage":
+            result = {
+                "message_id": len(self.calls), "date": 0,
+                "chat": {"id": int(data["chat_id"]), "type": "private"}, "text": data["text"],
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def methods(self):
+        return [method for method, _ in self.calls]
+
+
+def make_update(update_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": 12345, "type": "private"},
+            "from": {"id": 12345, "is_bot": False, "first_name": "Тест"},
+        },
+    }
+
+
+@pytest_asyncio.fixture
+async def telegram():
+    fake = FakeTelegram()
+    server = TestServer(fake.app)
+    await server.start_server()
+    fake.url = str(server.make_url("")).rstrip("/")
+    yield fake
+    await server.close()
+
+
+async def start_webhook(telegram, router):
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(telegram.url)))
+    dp = Dispatcher()
+    dp.include_router(router)
+    app = build_webhook_app(dp, bot, base_url="https://bot.example.com", path="/hook", secret=SECRET)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    return client
+
+
+async def wait_for(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_webhook_registers_and_answers_updates(telegram):
+    """Тестирует регистрацию webhook, проверку секрета и ответ на /start."""
+    router = Router()
+    router.message.register(start_handler, Command("start"))
+    client = await start_webhook(telegram, router)
+    try:
+        assert telegram.calls[0][0] == "setWebhook"
+        assert telegram.calls[0][1]["url"] == "https://bot.example.com/hook"
+        assert telegram.calls[0][1]["secret_token"] == SECRET
+
+        response = await client.post("/hook", json=make_update(1, "/start"))
+        assert response.status == 401
+
+        response = await client.post(
+            "/hook", json=make_update(1, "/start"), headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        )
+        assert response.status == 200
+        await wait_for(lambda: "sendMessage" in telegram.methods())
+        assert "Здравствуйте" in telegram.calls[-1][1]["text"]
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_acknowledges_before_handling(telegram):
+    """Тестирует, что обновления подтверждаются сразу и обрабатываются параллельно."""
+    release = asyncio.Event()
+    started = []
+    router = Router()
+
+    @router.message(F.text)
+    async def slow_handler(message: Message):
+        started.append(message.text)
+        await release.wait()
+        await message.answer(f"ok {message.text}")
+
+    client = await start_webhook(telegram, router)
+    try:
+        for i in range(3):
+            response = await client.post(
+                "/hook", json=make_update(i + 1, f"q{i}"), headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+            )
+            assert response.status == 200
+
+        # Все три обработчика запущены одновременно, ответов ещё нет
+        await wait_for(lambda: len(started) == 3)
+        assert "sendMessage" not in telegram.methods()
+
+        release.set()
+        await wait_for(lambda: telegram.methods().count("sendMessage") == 3)
+    finally:
+        await client.close()